@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'spend_smart.settings')
@@ -17,15 +18,73 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
-# Configure the Celery beat schedule
+# Requests a user is waiting on, batch receipt processing, and periodic
+# maintenance each get their own queue, so a backfill never delays an
+# interactive upload. Run a dedicated worker for each, e.g.
+#   celery -A spend_smart worker -Q interactive
+#   celery -A spend_smart worker -Q batch
+#   celery -A spend_smart worker -Q maintenance
+# A worker started without -Q consumes all three.
+app.conf.task_queues = (
+    Queue('interactive'),
+    Queue('batch'),
+    Queue('maintenance'),
+)
+app.conf.task_default_queue = 'interactive'
+app.conf.task_routes = {
+    'tracker.tasks.process_receipt_upload': {'queue': 'interactive'},
+    'tracker.tasks.generate_shopping_list': {'queue': 'interactive'},
+    # Quick, and on the interactive queue so dispatching never waits behind batch work
+    'tracker.tasks.dispatch_batch_receipts': {'queue': 'interactive'},
+    'tracker.tasks.process_batch_receipt': {'queue': 'batch'},
+    'tracker.tasks.check_budget_thresholds': {'queue': 'maintenance'},
+    'tracker.tasks.rebuild_purchase_history_features': {'queue': 'maintenance'},
+    'tracker.tasks.refresh_category_index': {'queue': 'maintenance'},
+    'tracker.tasks.compact_sync_changes': {'queue': 'maintenance'},
+    'tracker.tasks.log_llm_cache_metrics': {'queue': 'maintenance'},
+}
+
+# Configure the Celery beat schedule. Periodic tasks hold a lease while they
+# run (tracker/features/leases), so several beat and worker nodes can run
+# without overlapping; see the TaskRun table for run history.
 app.conf.beat_schedule = {
     'check-budget-thresholds': {
         'task': 'tracker.tasks.check_budget_thresholds',
         # Run every hour
         'schedule': crontab(minute='*'),
+        # Runs queued while workers were down are dropped instead of piling up
+        'options': {'expires': 55},
         # Alternatively, run daily at midnight
         # 'schedule': crontab(minute=0, hour=0),
         # Or run every 30 minutes
         # 'schedule': crontab(minute='*/30'),
     },
+    'rebuild-purchase-history-features': {
+        'task': 'tracker.tasks.rebuild_purchase_history_features',
+        # Run nightly at 02:00
+        'schedule': crontab(minute=0, hour=2),
+    },
+    'refresh-category-index': {
+        'task': 'tracker.tasks.refresh_category_index',
+        'schedule': crontab(minute='*/10'),
+    },
+    'dispatch-batch-receipts': {
+        'task': 'tracker.tasks.dispatch_batch_receipts',
+        # Batch tasks dispatch the next receipts themselves; this recovers stalls
+        'schedule': crontab(minute='*'),
+    },
+    'rebuild-category-index': {
+        'task': 'tracker.tasks.refresh_category_index',
+        # Nightly full rebuild picks up renamed and deleted items
+        'schedule': crontab(minute=30, hour=2),
+        'kwargs': {'full': True},
+    },
+    'compact-sync-changes': {
+        'task': 'tracker.tasks.compact_sync_changes',
+        'schedule': crontab(minute=0, hour=3),
+    },
+    'log-llm-cache-metrics': {
+        'task': 'tracker.tasks.log_llm_cache_metrics',
+        'schedule': crontab(minute=0),
+    },
 }
\ No newline at end of file
@@ -168,12 +168,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'tracker.features.auth.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Per-user limits of the endpoints that call the model (see tracker/features/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'receipt_upload': os.getenv('RECEIPT_UPLOAD_RATE', '10/min'),
+        'receipt_upload_sustained': os.getenv('RECEIPT_UPLOAD_SUSTAINED_RATE', '200/day'),
+        'receipt_batch': os.getenv('RECEIPT_BATCH_RATE', '10/hour'),
+        'list_generation': os.getenv('LIST_GENERATION_RATE', '5/min'),
+        'list_generation_sustained': os.getenv('LIST_GENERATION_SUSTAINED_RATE', '50/day'),
+    },
 }
 
 # JWT Settings
@@ -210,6 +218,97 @@ CORS_ALLOWED_ORIGINS = [
 
 # OpenAI settings
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Upper bound on prompt tokens sent for smart shopping list generation, counted
+# with a rough estimate of 4 characters per token rather than the model's tokenizer
+SHOPPING_LIST_PROMPT_TOKEN_BUDGET = int(os.getenv('SHOPPING_LIST_PROMPT_TOKEN_BUDGET', '3000'))
+
+# LLM response cache: 'db' (size-capped table, run `manage.py createcachetable`)
+# or 'redis' (evicted by the server's maxmemory policy)
+LLM_CACHE_ALIAS = 'llm'
+LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'db')
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(60 * 60 * 24)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+LLM_CACHE_MAX_RESPONSE_BYTES = int(os.getenv('LLM_CACHE_MAX_RESPONSE_BYTES', str(64 * 1024)))
+
+# Async views: concurrent model calls per process, and threads for blocking work
+LLM_MAX_CONCURRENT_REQUESTS = int(os.getenv('LLM_MAX_CONCURRENT_REQUESTS', '500'))
+LLM_REQUEST_TIMEOUT = int(os.getenv('LLM_REQUEST_TIMEOUT', '120'))
+ASYNC_BLOCKING_WORKERS = int(os.getenv('ASYNC_BLOCKING_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Category suggestion index files, memory-mapped by every web and Celery process
+CATEGORY_INDEX_DIR = os.getenv('CATEGORY_INDEX_DIR', os.path.join(BASE_DIR, 'var', 'category_index'))
+
+# Per-user data versions behind the API ETags. They must be shared by the web
+# and Celery processes, so ETags are only sent with DATA_VERSION_CACHE_BACKEND=redis.
+DATA_VERSION_CACHE_BACKEND = os.getenv('DATA_VERSION_CACHE_BACKEND', 'default')
+DATA_VERSION_CACHE_ALIAS = 'data_versions' if DATA_VERSION_CACHE_BACKEND == 'redis' else 'default'
+
+# Users resolved from JWTs are cached in the shared cache and briefly in each
+# process; the process copy can outlive a deactivation by this many seconds
+AUTH_USER_CACHE_BACKEND = os.getenv('AUTH_USER_CACHE_BACKEND', DATA_VERSION_CACHE_BACKEND)
+AUTH_USER_CACHE_ALIAS = 'auth_users' if AUTH_USER_CACHE_BACKEND == 'redis' else 'default'
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '300'))
+AUTH_USER_LOCAL_CACHE_TTL = int(os.getenv('AUTH_USER_LOCAL_CACHE_TTL', '5'))
+AUTH_USER_LOCAL_CACHE_SIZE = 10000
+
+# Throttle counters and in-flight job slots, in Redis shared by the web and
+# Celery processes. While Redis is unreachable, or with 'default', rates are
+# counted per process and job slots are not enforced: the worker that
+# releases a slot could not see it.
+THROTTLE_CACHE_BACKEND = os.getenv('THROTTLE_CACHE_BACKEND', 'redis')
+THROTTLE_CACHE_ALIAS = 'throttle' if THROTTLE_CACHE_BACKEND == 'redis' else 'default'
+# Model-backed jobs a user can have running at once, per endpoint
+JOB_CONCURRENCY_LIMITS = {
+    'receipt_upload': int(os.getenv('RECEIPT_UPLOAD_CONCURRENCY', '2')),
+    'list_generation': int(os.getenv('LIST_GENERATION_CONCURRENCY', '1')),
+}
+# A slot left behind by a crashed worker is freed after this many seconds
+JOB_SLOT_TTL = int(os.getenv('JOB_SLOT_TTL', '600'))
+JOB_SLOT_RETRY_AFTER = 5
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    LLM_CACHE_ALIAS: {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'llm_response_cache',
+        'TIMEOUT': LLM_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': LLM_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': 4,
+        },
+    } if LLM_CACHE_BACKEND == 'db' else {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('LLM_CACHE_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/1')),
+        'TIMEOUT': LLM_CACHE_TTL,
+        'KEY_PREFIX': 'llm',
+    },
+}
+
+# Shared caches opted into with the *_CACHE_BACKEND=redis settings above
+if DATA_VERSION_CACHE_BACKEND == 'redis':
+    CACHES[DATA_VERSION_CACHE_ALIAS] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('DATA_VERSION_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')),
+        'TIMEOUT': None,
+        'KEY_PREFIX': 'dv',
+    }
+if AUTH_USER_CACHE_BACKEND == 'redis':
+    CACHES[AUTH_USER_CACHE_ALIAS] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('AUTH_USER_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')),
+        'TIMEOUT': AUTH_USER_CACHE_TTL,
+        'KEY_PREFIX': 'au',
+    }
+if THROTTLE_CACHE_BACKEND == 'redis':
+    CACHES[THROTTLE_CACHE_ALIAS] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('THROTTLE_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')),
+        'KEY_PREFIX': 'th',
+        # Fail fast, so requests fall back to per-process limits
+        'OPTIONS': {'socket_connect_timeout': 1, 'socket_timeout': 1},
+    }
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST')
@@ -226,6 +325,30 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'  # Use your preferred timezone
+# Queues and routing are configured in spend_smart/celery.py
+
+# Periodic tasks run under a lease so runs never overlap across workers:
+# 'redis' (SET NX PX, falling back to the database if Redis is unreachable)
+# or 'db'. Leases are renewed every third of LEASE_TTL while a run is alive.
+LEASE_BACKEND = os.getenv('LEASE_BACKEND', 'redis' if DATA_VERSION_CACHE_BACKEND == 'redis' else 'db')
+LEASE_REDIS_URL = os.getenv('LEASE_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+LEASE_TTL = int(os.getenv('LEASE_TTL', '60'))
+TASK_RUN_RETENTION_DAYS = 14
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Batch receipt uploads: files per request, receipts processed at once across
+# all users, and seconds after which a receipt stuck in flight is retried
+RECEIPT_BATCH_MAX_FILES = int(os.getenv('RECEIPT_BATCH_MAX_FILES', '100'))
+RECEIPT_BATCH_QUEUE_DEPTH = int(os.getenv('RECEIPT_BATCH_QUEUE_DEPTH', '8'))
+RECEIPT_BATCH_STALE_SECONDS = int(os.getenv('RECEIPT_BATCH_STALE_SECONDS', str(30 * 60)))
+# Seconds after which an interactive upload still pending or processing is sent again
+RECEIPT_INTERACTIVE_STALE_SECONDS = int(os.getenv('RECEIPT_INTERACTIVE_STALE_SECONDS', str(10 * 60)))
+
+# Delta sync: seconds a change log entry waits before it is served, which must
+# exceed the longest transaction that logs changes, and days entries are kept
+# before compaction. Clients with a token older than that must resync.
+SYNC_COMMIT_LAG_SECONDS = int(os.getenv('SYNC_COMMIT_LAG_SECONDS', '5'))
+SYNC_CHANGE_RETENTION_DAYS = int(os.getenv('SYNC_CHANGE_RETENTION_DAYS', '30'))
 
 # Redis Configuration (used by Celery)
 REDIS_HOST = os.getenv('REDIS_HOST','localhost')
@@ -265,6 +388,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'tracker.features': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
@@ -35,6 +35,8 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('tracker.features.auth.urls')),
+    # Async views for I/O-bound endpoints, served without a thread per request under ASGI
+    path('api/async/', include('tracker.features.async_api.urls')),
     path('api/', include('tracker.urls')),
     path('api-auth/', include('rest_framework.urls')),
     # Swagger documentation URLs
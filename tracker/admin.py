@@ -2,6 +2,7 @@ from django.contrib import admin
 from .features.category.models import GroceryCategory
 from .features.receipt.models import Receipt, GroceryItem
 from .features.budget.models import Budget
+from .features.leases.models import TaskLease, TaskRun
 
 @admin.register(GroceryCategory)
 class GroceryCategoryAdmin(admin.ModelAdmin):
@@ -33,3 +34,13 @@ class BudgetAdmin(admin.ModelAdmin):
     def formatted_threshold(self, obj):
         return f"{obj.currency_symbol}{obj.notification_threshold}"
     formatted_threshold.short_description = 'Notification Threshold'
+
+@admin.register(TaskLease)
+class TaskLeaseAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'acquired_at', 'expires_at')
+
+@admin.register(TaskRun)
+class TaskRunAdmin(admin.ModelAdmin):
+    list_display = ('task_name', 'status', 'owner', 'backend', 'started_at', 'duration')
+    list_filter = ('task_name', 'status', 'backend')
+    search_fields = ('task_name', 'owner', 'task_id')
@@ -0,0 +1,3 @@
+"""
+Async API Feature Package
+"""
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('auth/login/', views.login, name='async-login'),
+    path('receipts/', views.upload_receipt, name='async-receipt-upload'),
+    path('shopping-lists/generate/', views.generate_shopping_list, name='async-shopping-list-generate'),
+    path('budgets/analytics/', views.analytics, name='async-budget-analytics'),
+]
@@ -0,0 +1,197 @@
+import json
+import logging
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import authenticate
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..auth.authentication import CachedJWTAuthentication
+from ..budget.analytics import budget_analytics
+from ..executors import run_blocking
+from ..receipt.serializers import ReceiptSerializer
+from ..shopping_list.models import ShoppingList
+from ..shopping_list.serializers import ShoppingListSerializer
+from ..shopping_list.services import SmartShoppingListGenerator
+from ..shopping_list.views import GENERATION_MODES
+from ..throttling import check_throttles, job_throttles, release_job_slot
+from ...tasks import process_receipt_upload
+
+logger = logging.getLogger(__name__)
+
+_authentication = CachedJWTAuthentication()
+
+def _response(data, status_code=status.HTTP_200_OK):
+    # DRF's encoder, so payloads match the sync endpoints
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+def async_api_view(methods, authenticated=True):
+    """
+    Minimal async counterpart of DRF's ``api_view``: checks the method and
+    authenticates the JWT, leaving everything else to the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return _response({'detail': f'Method "{request.method}" not allowed.'},
+                                 status.HTTP_405_METHOD_NOT_ALLOWED)
+            if authenticated:
+                try:
+                    result = await sync_to_async(_authentication.authenticate)(request)
+                except (AuthenticationFailed, InvalidToken) as e:
+                    return _response(e.detail, status.HTTP_401_UNAUTHORIZED)
+                if result is None:
+                    return _response({'detail': 'Authentication credentials were not provided.'},
+                                     status.HTTP_401_UNAUTHORIZED)
+                request.user = result[0]
+            return await view(request, *args, **kwargs)
+        # Token-authenticated like the DRF views, so no CSRF check
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+async def _throttle(request, scope):
+    """Return a 429 response if the request is throttled, else None."""
+    wait = await sync_to_async(check_throttles)(request, job_throttles(scope))
+    if wait is None:
+        return None
+    response = _response({'detail': f'Request was throttled. Expected available in {wait} seconds.'},
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(wait)
+    return response
+
+async def _release_slot(request):
+    await sync_to_async(release_job_slot)(getattr(request, 'job_slot', None))
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+@async_api_view(['POST'], authenticated=False)
+async def login(request):
+    """Exchange a username and password for JWTs, hashing off the event loop."""
+    data = _json_body(request)
+    if data is None:
+        return _response({'error': 'Invalid request format. Expected JSON object.'}, status.HTTP_400_BAD_REQUEST)
+    username = data.get('username')
+    password = data.get('password')
+
+    if not username or not password:
+        return _response({'error': 'Please provide both username and password'}, status.HTTP_400_BAD_REQUEST)
+
+    # PBKDF2 takes tens of milliseconds of CPU
+    user = await run_blocking(authenticate, username=username, password=password)
+
+    if not user:
+        return _response({'error': 'Invalid credentials'}, status.HTTP_401_UNAUTHORIZED)
+
+    refresh = RefreshToken.for_user(user)
+    return _response({
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+    })
+
+def _create_receipt(request):
+    serializer = ReceiptSerializer(data={**request.POST.dict(), **request.FILES.dict()},
+                                   context={'request': request})
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.save(user=request.user), None
+
+def _queue_processing(receipt, job_slot):
+    """Queue the receipt like the sync upload does. Returns whether the task took the job slot."""
+    try:
+        process_receipt_upload.delay(receipt.id, job_slot=job_slot)
+        return True
+    except Exception as e:
+        logger.exception(f"Failed to queue receipt processing: {str(e)}")
+        receipt.status = 'failed'
+        receipt.processed_data = {'error': f'Failed to queue processing: {str(e)}'}
+        receipt.save()
+        return False
+
+@async_api_view(['POST'])
+async def upload_receipt(request):
+    """
+    Upload a receipt image. It is processed on the interactive queue, like
+    the sync upload, so the same queues, job slots and ordering apply.
+    """
+    throttled = await _throttle(request, 'receipt_upload')
+    if throttled:
+        await _release_slot(request)
+        return throttled
+    try:
+        # Image validation decodes the file, so it runs in the blocking pool
+        receipt, errors = await run_blocking(_create_receipt, request)
+        if errors:
+            return _response(errors, status.HTTP_400_BAD_REQUEST)
+
+        # The upload's job slot is released by the task when it finishes
+        if await sync_to_async(_queue_processing)(receipt, getattr(request, 'job_slot', None)):
+            request.job_slot = None
+    finally:
+        await _release_slot(request)
+
+    data = await sync_to_async(lambda: ReceiptSerializer(receipt, context={'request': request}).data)()
+    return _response(data, status.HTTP_201_CREATED)
+
+def _serialize_list(shopping_list_id, request):
+    shopping_list = ShoppingList.objects.select_related('generation_job').prefetch_related(
+        'items__category'
+    ).get(pk=shopping_list_id)
+    return ShoppingListSerializer(shopping_list, context={'request': request}).data
+
+@async_api_view(['POST'])
+async def generate_shopping_list(request):
+    """
+    Generate a smart shopping list. In 'llm' mode the model call is awaited
+    in the request instead of being queued, and the complete list is returned.
+    """
+    data = _json_body(request)
+    if data is None:
+        return _response({'error': 'Invalid request format. Expected JSON object.'}, status.HTTP_400_BAD_REQUEST)
+
+    name = data.get('name', '')
+    if name and not isinstance(name, str):
+        return _response({'error': 'Invalid name parameter. Expected string.'}, status.HTTP_400_BAD_REQUEST)
+
+    mode = data.get('mode', 'llm')
+    if mode not in GENERATION_MODES:
+        return _response({'error': f"Invalid mode parameter. Expected one of: {', '.join(GENERATION_MODES)}."},
+                         status.HTTP_400_BAD_REQUEST)
+
+    generator = SmartShoppingListGenerator(request.user)
+    if mode == 'local':
+        shopping_list = await sync_to_async(generator.generate_local_list)(name=name)
+    else:
+        throttled = await _throttle(request, 'list_generation')
+        if throttled:
+            await _release_slot(request)
+            return throttled
+        try:
+            shopping_list = await generator.agenerate_list(name=name)
+        except Exception as e:
+            logger.exception(f"Shopping list generation failed: {str(e)}")
+            return _response({'error': str(e)}, status.HTTP_502_BAD_GATEWAY)
+        finally:
+            await _release_slot(request)
+
+    data = await sync_to_async(_serialize_list)(shopping_list.pk, request)
+    return _response(data, status.HTTP_201_CREATED)
+
+@async_api_view(['GET'])
+async def analytics(request):
+    """Budget analytics for the weekly and monthly periods."""
+    data = await sync_to_async(budget_analytics)(request.user)
+    if data is None:
+        return _response({'error': 'No budgets found. Please set at least one budget first.'},
+                         status.HTTP_404_NOT_FOUND)
+    return _response(data)
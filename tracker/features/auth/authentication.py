@@ -0,0 +1,157 @@
+import copy
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+def _cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+def _get_cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+class _LocalUserCache:
+    """Per-process ``{user_id: (expires_at, user)}`` with a short TTL"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def get(self, user_id):
+        entry = self._users.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id, user):
+        with self._lock:
+            if len(self._users) >= settings.AUTH_USER_LOCAL_CACHE_SIZE:
+                now = time.monotonic()
+                self._users = {key: entry for key, entry in self._users.items() if entry[0] >= now}
+                if len(self._users) >= settings.AUTH_USER_LOCAL_CACHE_SIZE:
+                    self._users.clear()
+            self._users[user_id] = (time.monotonic() + self.ttl, user)
+
+    def delete(self, user_id):
+        self._users.pop(user_id, None)
+
+_local_users = _LocalUserCache(settings.AUTH_USER_LOCAL_CACHE_TTL)
+
+def invalidate_cached_user(user_id):
+    """
+    Drop a user from the shared cache and this process's cache. Other
+    processes keep their copy for at most AUTH_USER_LOCAL_CACHE_TTL seconds.
+    """
+    _local_users.delete(user_id)
+    try:
+        _get_cache().delete(_cache_key(user_id))
+    except Exception as e:
+        logger.error(f"Failed to invalidate cached user {user_id}: {str(e)}")
+
+def load_user(user_id):
+    """
+    Return the user from the process cache, the shared cache or the database.
+    Each call gets its own copy, so changes made while serving one request
+    never show up in another.
+    """
+    user = _local_users.get(user_id)
+    if user is not None:
+        return copy.copy(user)
+
+    cache = _get_cache()
+    try:
+        user = cache.get(_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"Failed to read cached user {user_id}: {str(e)}")
+        cache = None
+    if user is None:
+        User = get_user_model()
+        try:
+            # The password hash is not needed to serve requests and is kept out of the cache
+            user = User.objects.defer('password').get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if cache is not None:
+            try:
+                cache.set(_cache_key(user_id), user, timeout=settings.AUTH_USER_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"Failed to cache user {user_id}: {str(e)}")
+    _local_users.set(user_id, user)
+    return copy.copy(user)
+
+def _active_user(user_id):
+    user = load_user(user_id)
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return user
+
+class CachedUser(SimpleLazyObject):
+    """
+    The authenticated user, loaded only when more than its id is needed.
+
+    ``pk``, ``id`` and ``is_authenticated`` come from the token, so permission
+    checks and ETag revalidation do not touch the user at all. Anything else,
+    including passing it to a queryset filter, loads it through ``load_user``.
+    """
+
+    def __init__(self, user_id):
+        super().__init__(lambda: _active_user(user_id))
+        self.__dict__['_user_id'] = user_id
+
+    @property
+    def pk(self):
+        return self.__dict__['_user_id']
+
+    id = pk
+
+    def __bool__(self):
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through a short-lived
+    process cache and a shared cache instead of querying the user table on
+    every request. Cached users are invalidated whenever a user is saved or
+    deleted.
+    """
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def get_user(self, validated_token):
+        return _active_user(self.get_user_id(validated_token))
+
+class LazyJWTAuthentication(CachedJWTAuthentication):
+    """
+    CachedJWTAuthentication that defers loading the user for views that
+    usually only need its id, such as conditional requests answered with
+    304 Not Modified.
+
+    The active check happens when the user is loaded, so a deactivated user
+    can still get 304s until their access token expires.
+    """
+
+    def get_user(self, validated_token):
+        return CachedUser(self.get_user_id(validated_token))
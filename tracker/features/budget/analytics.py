@@ -0,0 +1,90 @@
+from django.db.models import Sum
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+
+from .models import Budget
+from .forecasting import forecast_budgets
+from ..utils import send_budget_notification, date_range_bounds
+from ..receipt.models import GroceryItem
+
+def budget_analytics(user, today=None):
+    """
+    Spending, projections and category breakdown for the user's latest
+    weekly and monthly budgets. Returns None if the user has no budget.
+    """
+    today = today or timezone.now().date()
+
+    # Get both weekly and monthly budgets for the user
+    weekly_budget = Budget.objects.filter(user=user, period='weekly').order_by('-created_at').first()
+    monthly_budget = Budget.objects.filter(user=user, period='monthly').order_by('-created_at').first()
+
+    if not weekly_budget and not monthly_budget:
+        return None
+
+    # Spent so far and end-of-period projections for both budgets in one batch
+    forecasts = forecast_budgets(
+        [budget for budget in (weekly_budget, monthly_budget) if budget],
+        today=today
+    )
+
+    def get_period_analytics(budget, start_date):
+        if not budget:
+            return None
+
+        range_start, range_end = date_range_bounds(start_date, today)
+        forecast = forecasts[budget.id]
+        spent = forecast.spent
+
+        # Check if we need to send a notification
+        if budget.should_send_notification(spent, forecast.projected_spent):
+            try:
+                send_budget_notification(user, budget, spent, forecast)
+                budget.notification_sent = True
+                budget.save()
+            except Exception as e:
+                print(f"Failed to send budget notification: {e}")
+
+        # Get spending by category for the period
+        category_spending = GroceryItem.objects.filter(
+            user=user,
+            created_at__gte=range_start,
+            created_at__lt=range_end
+        ).values('category__name').annotate(
+            total=Sum('price')
+        ).order_by('-total')
+
+        remaining = budget.amount - spent
+
+        return {
+            'period': budget.period,
+            'budget_amount': budget.amount,
+            'spent_amount': spent,
+            'remaining_amount': remaining,
+            'notification_threshold': budget.notification_threshold,
+            'notification_sent': budget.notification_sent,
+            'projected_spent': forecast.projected_spent,
+            'projected_breach_date': forecast.projected_breach_date,
+            'start_date': start_date,
+            'end_date': today,
+            'category_breakdown': [
+                {
+                    'category_name': item['category__name'],
+                    'spent_amount': item['total'],
+                    'percentage_of_total': (item['total'] / spent * 100) if spent > 0 else Decimal('0')
+                } for item in category_spending
+            ]
+        }
+
+    # Calculate start dates for both periods
+    weekly_start = today - timedelta(days=today.weekday()) if weekly_budget else None
+    monthly_start = today.replace(day=1) if monthly_budget else None
+
+    # Get analytics for both periods
+    weekly_analytics = get_period_analytics(weekly_budget, weekly_start) if weekly_budget else None
+    monthly_analytics = get_period_analytics(monthly_budget, monthly_start) if monthly_budget else None
+
+    return {
+        'weekly': weekly_analytics,
+        'monthly': monthly_analytics
+    }
@@ -0,0 +1,186 @@
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..receipt.models import GroceryItem
+from ..utils import date_range_bounds
+
+# Days of daily spend history used to fit seasonality and trend (8 full weeks)
+HISTORY_DAYS = 56
+
+# Users per query, so the IN clause stays small however many budgets there are
+USER_FILTER_LIMIT = 500
+
+@dataclass
+class BudgetForecast:
+    budget_id: int
+    period_start: date
+    period_end: date
+    spent: Decimal
+    projected_spent: Decimal
+    projected_breach_date: Optional[date]
+
+def period_bounds(period, today):
+    """
+    Return the first and last day of the budget period containing ``today``.
+    """
+    if period == 'weekly':
+        start = today - timedelta(days=today.weekday())
+        return start, start + timedelta(days=6)
+    start = today.replace(day=1)
+    last_day = calendar.monthrange(today.year, today.month)[1]
+    return start, today.replace(day=last_day)
+
+def _user_chunks(user_ids):
+    for i in range(0, len(user_ids), USER_FILTER_LIMIT):
+        yield user_ids[i:i + USER_FILTER_LIMIT]
+
+def load_daily_spend(user_ids, today, days=HISTORY_DAYS):
+    """
+    Load a ``(len(user_ids), days)`` matrix of daily spend ending at ``today``.
+
+    ``user_ids`` must be sorted. Users are loaded USER_FILTER_LIMIT at a
+    time, one GROUP BY query each.
+    """
+    matrix = np.zeros((len(user_ids), days), dtype=np.float64)
+    if not user_ids:
+        return matrix
+
+    first_day = today - timedelta(days=days - 1)
+    range_start, range_end = date_range_bounds(first_day, today)
+    rows = []
+    for chunk in _user_chunks(user_ids):
+        rows += GroceryItem.objects.filter(
+            user_id__in=chunk,
+            created_at__gte=range_start,
+            created_at__lt=range_end
+        ).annotate(day=TruncDate('created_at')).values('user_id', 'day').annotate(
+            total=Sum('price')
+        ).values_list('user_id', 'day', 'total').order_by()
+    if not rows:
+        return matrix
+
+    row_users, row_days, row_totals = zip(*rows)
+    row_users = np.asarray(row_users, dtype=np.int64)
+    cols = (np.asarray(row_days, dtype='datetime64[D]') - np.datetime64(first_day, 'D')).astype(np.int64)
+    totals = np.asarray(row_totals, dtype=np.float64)
+
+    rows_idx = np.searchsorted(np.asarray(user_ids, dtype=np.int64), row_users)
+    keep = (cols >= 0) & (cols < days)
+    np.add.at(matrix, (rows_idx[keep], cols[keep]), totals[keep])
+    return matrix
+
+def load_period_spend(user_ids, start, today):
+    """Exact spend of each user from ``start`` through ``today``, as Decimals."""
+    range_start, range_end = date_range_bounds(start, today)
+    spend = {}
+    for chunk in _user_chunks(user_ids):
+        spend.update(
+            GroceryItem.objects.filter(
+                user_id__in=chunk,
+                created_at__gte=range_start,
+                created_at__lt=range_end
+            ).values('user_id').annotate(total=Sum('price')).values_list('user_id', 'total').order_by()
+        )
+    return spend
+
+def forecast_daily_spend(history, first_day, horizon):
+    """
+    Project daily spend for the ``horizon`` days following the history window.
+
+    Each row is modelled as level + linear trend + additive day-of-week
+    seasonality, fitted for all rows at once. Returns a ``(rows, horizon)``
+    matrix of non-negative daily projections.
+    """
+    n_rows, n_days = history.shape
+    if horizon <= 0 or n_rows == 0:
+        return np.zeros((n_rows, max(horizon, 0)), dtype=np.float64)
+
+    weekdays = (np.arange(n_days) + first_day.weekday()) % 7
+    row_mean = history.mean(axis=1)
+
+    seasonal = np.zeros((n_rows, 7), dtype=np.float64)
+    for weekday in range(7):
+        columns = weekdays == weekday
+        if columns.any():
+            seasonal[:, weekday] = history[:, columns].mean(axis=1) - row_mean
+
+    deseasonalized = history - seasonal[:, weekdays]
+    t = np.arange(n_days, dtype=np.float64)
+    t_centered = t - t.mean()
+    slope = deseasonalized @ t_centered / (t_centered @ t_centered)
+    level = deseasonalized.mean(axis=1)
+
+    future_t = np.arange(n_days, n_days + horizon, dtype=np.float64) - t.mean()
+    future_weekdays = (np.arange(n_days, n_days + horizon) + first_day.weekday()) % 7
+    projection = level[:, None] + slope[:, None] * future_t[None, :] + seasonal[:, future_weekdays]
+    return np.clip(projection, 0, None)
+
+def forecast_budgets(budgets, today=None, history_days=HISTORY_DAYS):
+    """
+    Forecast end-of-period spend for every budget in ``budgets`` in one batch.
+
+    Spend so far is summed exactly; floats are only used for the projection.
+    Returns a dict mapping budget id to :class:`BudgetForecast`.
+    """
+    today = today or timezone.now().date()
+    budgets = list(budgets)
+    if not budgets:
+        return {}
+
+    user_ids = sorted({budget.user_id for budget in budgets})
+    history = load_daily_spend(user_ids, today, days=history_days)
+    first_day = today - timedelta(days=history_days - 1)
+
+    bounds = [period_bounds(budget.period, today) for budget in budgets]
+    budget_rows = np.searchsorted(np.asarray(user_ids, dtype=np.int64),
+                                  np.asarray([budget.user_id for budget in budgets], dtype=np.int64))
+    remaining = np.asarray([(end - today).days for _, end in bounds], dtype=np.int64)
+    amounts = np.asarray([budget.amount for budget in budgets], dtype=np.float64)
+
+    # Weekly and monthly budgets share at most two period starts
+    period_spend = {}
+    for start in {start for start, _ in bounds}:
+        period_users = sorted({budget.user_id for budget, (budget_start, _) in zip(budgets, bounds)
+                               if budget_start == start})
+        period_spend[start] = load_period_spend(period_users, start, today)
+    exact_spent = [period_spend[bounds[i][0]].get(budget.user_id) or Decimal('0')
+                   for i, budget in enumerate(budgets)]
+    spent = np.asarray(exact_spent, dtype=np.float64)
+
+    horizon = int(remaining.max())
+    projection = forecast_daily_spend(history, first_day, horizon)[budget_rows]
+    projection *= np.arange(horizon)[None, :] < remaining[:, None]
+    projected_path = spent[:, None] + projection.cumsum(axis=1)
+    projected_total = spent + projection.sum(axis=1)
+
+    breached_now = np.asarray([exact_spent[i] >= budget.amount for i, budget in enumerate(budgets)])
+    crosses = projected_path >= amounts[:, None]
+    will_breach = breached_now | crosses.any(axis=1)
+    breach_offset = np.zeros(len(budgets), dtype=np.int64)
+    if horizon:
+        breach_offset = crosses.argmax(axis=1) + 1
+    breach_offset[breached_now] = 0
+
+    cents = Decimal('0.01')
+    forecasts = {}
+    for i, budget in enumerate(budgets):
+        breach_date = None
+        if will_breach[i]:
+            breach_date = today + timedelta(days=int(breach_offset[i]))
+        forecasts[budget.id] = BudgetForecast(
+            budget_id=budget.id,
+            period_start=bounds[i][0],
+            period_end=bounds[i][1],
+            spent=exact_spent[i].quantize(cents),
+            projected_spent=Decimal(str(projected_total[i])).quantize(cents),
+            projected_breach_date=breach_date,
+        )
+    return forecasts
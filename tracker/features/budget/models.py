@@ -46,17 +46,24 @@ class Budget(models.Model):
 
     class Meta:
         unique_together = ['user', 'period']
+        indexes = [
+            models.Index(fields=['notification_sent', 'period'], name='budget_notif_period_idx'),
+        ]
 
     def __str__(self):
         currency_symbol = self.CURRENCY_SYMBOLS.get(self.currency, self.currency)
         return f"Grocery Budget - {currency_symbol}{self.amount} ({self.period})"
 
-    def should_send_notification(self, current_spent):
+    def should_send_notification(self, current_spent, projected_spent=None):
         """
-        Check if notification should be sent based on current spent amount
+        Check if notification should be sent based on current spent amount,
+        or on the projected end-of-period spend exceeding the budget
         """
-        return (not self.notification_sent and 
-                current_spent >= self.notification_threshold)
+        if self.notification_sent:
+            return False
+        if current_spent >= self.notification_threshold:
+            return True
+        return projected_spent is not None and projected_spent >= self.amount
 
     @property
     def currency_symbol(self):
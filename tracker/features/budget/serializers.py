@@ -20,4 +20,6 @@ class BudgetAnalyticsSerializer(serializers.Serializer):
     currency_symbol = serializers.CharField()
     notification_threshold = serializers.DecimalField(max_digits=10, decimal_places=2)
     notification_sent = serializers.BooleanField()
+    projected_spent = serializers.DecimalField(max_digits=10, decimal_places=2)
+    projected_breach_date = serializers.DateField(allow_null=True)
     category_breakdown = serializers.ListField(child=serializers.DictField()) 
\ No newline at end of file
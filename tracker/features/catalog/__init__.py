@@ -0,0 +1,3 @@
+"""
+Catalog Feature Package
+"""
\ No newline at end of file
@@ -0,0 +1,191 @@
+import math
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Product
+from .normalizer import NormalizedName, normalize_name
+
+# An item name resolves to an existing product only when both hold: Jaccard
+# keeps "Toned Milk" from merging into "Amul Taaza Toned Milk", containment
+# keeps a size-less name from matching a much longer one
+JACCARD_THRESHOLD = 0.6
+CONTAINMENT_THRESHOLD = 0.75
+# Most candidates scored per lookup, taken by shared rare tokens
+MAX_CANDIDATES = 200
+
+class ProductMatcher:
+    """
+    In-memory index of the product catalog.
+
+    Products are indexed by normalized key for exact hits and by token and
+    token count for fuzzy candidates. Only a name's rarest tokens are looked
+    up: a product that reaches JACCARD_THRESHOLD must share at least one of
+    them, so frequent tokens like "milk" or "rice" rarely widen the search.
+    The index loads incrementally: on a miss, products added by other
+    processes since the last load are fetched before a new product is created.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key = {}
+        # token -> number of tokens in the product -> product ids
+        self._by_token = defaultdict(lambda: defaultdict(set))
+        self._token_counts = defaultdict(int)
+        self._products = {}
+        self._token_sets = {}
+        self._last_id = 0
+
+    def _add(self, product_id, normalized):
+        if product_id in self._products:
+            return
+        self._by_key[normalized.key] = product_id
+        self._products[product_id] = normalized
+        self._token_sets[product_id] = frozenset(normalized.tokens)
+        length = len(normalized.tokens)
+        for token in normalized.tokens:
+            self._by_token[token][length].add(product_id)
+            self._token_counts[token] += 1
+        self._last_id = max(self._last_id, product_id)
+
+    def refresh(self):
+        """Load products created since the last refresh."""
+        rows = Product.objects.filter(id__gt=self._last_id).order_by('id').values_list(
+            'id', 'normalized_key'
+        )
+        for product_id, key in rows.iterator(chunk_size=2000):
+            self._add(product_id, NormalizedName.from_key(key))
+
+    def _score(self, normalized, tokens, candidate_id):
+        """Score a candidate, or return 0.0 when it fails either threshold."""
+        candidate = self._products[candidate_id]
+        if (normalized.size_unit and candidate.size_unit
+                and (normalized.size_unit, normalized.size_value) != (candidate.size_unit, candidate.size_value)):
+            return 0.0
+        other = self._token_sets[candidate_id]
+        shared = len(tokens & other)
+        containment = shared / min(len(tokens), len(other))
+        jaccard = shared / (len(tokens) + len(other) - shared)
+        if jaccard < JACCARD_THRESHOLD or containment < CONTAINMENT_THRESHOLD:
+            return 0.0
+        return (containment + jaccard) / 2
+
+    def _candidates(self, tokens):
+        """Ids of the products that can reach JACCARD_THRESHOLD against ``tokens``."""
+        size = len(tokens)
+        # Jaccard bounds both the token count and the overlap of a match
+        min_length = math.ceil(size * JACCARD_THRESHOLD)
+        max_length = math.floor(size / JACCARD_THRESHOLD)
+        rare = sorted(tokens, key=lambda token: (self._token_counts.get(token, 0), token))
+        prefix = rare[:size - min_length + 1]
+        shared = defaultdict(int)
+        for token in prefix:
+            by_length = self._by_token.get(token)
+            if not by_length:
+                continue
+            for length in range(min_length, max_length + 1):
+                for product_id in by_length.get(length, ()):
+                    shared[product_id] += 1
+        if len(shared) <= MAX_CANDIDATES:
+            return shared
+        return sorted(shared, key=lambda product_id: (-shared[product_id], product_id))[:MAX_CANDIDATES]
+
+    def match(self, normalized):
+        """Return the id of the best matching known product, or None."""
+        product_id = self._by_key.get(normalized.key)
+        if product_id is not None:
+            return product_id
+        tokens = frozenset(normalized.tokens)
+        if not tokens:
+            return None
+        best_id, best_score = None, 0.0
+        for candidate_id in self._candidates(tokens):
+            score = self._score(normalized, tokens, candidate_id)
+            # Prefer the older product on ties so results stay stable
+            if score > best_score or (score and score == best_score and candidate_id < best_id):
+                best_id, best_score = candidate_id, score
+        return best_id
+
+    def resolve_many(self, items):
+        """
+        Map ``(name, category_id)`` pairs to product ids, creating products
+        for names that match nothing. Returns ``{name: product_id}``.
+        """
+        with self._lock:
+            resolved = {}
+            pending = {}
+            for name, category_id in items:
+                if not name or name in resolved or name in pending:
+                    continue
+                normalized = normalize_name(name)
+                if not normalized.tokens:
+                    continue
+                product_id = self.match(normalized)
+                if product_id is None:
+                    pending[name] = (normalized, category_id)
+                else:
+                    resolved[name] = product_id
+            if not pending:
+                return resolved
+
+            self.refresh()
+            new_products = {}
+            for name, (normalized, category_id) in pending.items():
+                product_id = self.match(normalized)
+                if product_id is not None:
+                    resolved[name] = product_id
+                elif normalized.key not in new_products:
+                    new_products[normalized.key] = Product(
+                        name=name[:200],
+                        normalized_key=normalized.key,
+                        size_value=normalized.size_value,
+                        size_unit=normalized.size_unit,
+                        category_id=category_id,
+                    )
+            if new_products:
+                # Another process may create the same keys concurrently
+                with transaction.atomic():
+                    Product.objects.bulk_create(new_products.values(), ignore_conflicts=True)
+                self.refresh()
+                missing = [normalized.key for normalized, _ in pending.values()
+                           if normalized.key not in self._by_key]
+                if missing:
+                    # Committed by another process with an id below the last one loaded
+                    for product_id, key in Product.objects.filter(normalized_key__in=missing).values_list(
+                        'id', 'normalized_key'
+                    ):
+                        self._add(product_id, NormalizedName.from_key(key))
+                for name, (normalized, _) in pending.items():
+                    if name not in resolved:
+                        resolved[name] = self._by_key.get(normalized.key)
+            return resolved
+
+    def lookup(self, names):
+        """
+        Map names to the ids of matching known products without creating any.
+        Returns ``{name: product_id}`` for the names that matched.
+        """
+        with self._lock:
+            normalized = {name: normalize_name(name) for name in set(names) if name}
+            found = {name: self.match(value) for name, value in normalized.items() if value.tokens}
+            if None in found.values():
+                # Products may have been created by another process since the last load
+                self.refresh()
+                found = {name: self.match(normalized[name]) for name in found}
+            return {name: product_id for name, product_id in found.items() if product_id is not None}
+
+    def resolve(self, name, category_id=None):
+        """Return the product id for one item name, creating the product if needed."""
+        return self.resolve_many([(name, category_id)]).get(name)
+
+_matcher = None
+
+def get_matcher():
+    """Process-wide ProductMatcher, loaded on first use."""
+    global _matcher
+    if _matcher is None:
+        matcher = ProductMatcher()
+        matcher.refresh()
+        _matcher = matcher
+    return _matcher
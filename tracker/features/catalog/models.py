@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.db import models
+
+from ..category.models import GroceryCategory
+
+class Product(models.Model):
+    """
+    Canonical product that differently worded grocery item names resolve to.
+    """
+    name = models.CharField(max_length=200)  # Display name, from the first item seen
+    normalized_key = models.CharField(max_length=255, unique=True)
+    size_value = models.DecimalField(max_digits=12, decimal_places=3, null=True, blank=True)
+    size_unit = models.CharField(max_length=10, blank=True)  # Base unit: g, ml or pc
+    category = models.ForeignKey(GroceryCategory, on_delete=models.SET_NULL, null=True, related_name='products')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+class DailyPrice(models.Model):
+    """
+    One user's price observations for a product on one platform and day,
+    maintained incrementally from their grocery items.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_prices')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_prices')
+    platform = models.CharField(max_length=100)
+    date = models.DateField()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+    price_total = models.DecimalField(max_digits=14, decimal_places=2)  # Sum of observed prices
+    observations = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Leads with date after product so history ranges are index scans
+            models.UniqueConstraint(fields=['user', 'product', 'date', 'platform'], name='dailyprice_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.platform} ({self.date})"
+
+    @property
+    def avg_price(self):
+        return self.price_total / self.observations if self.observations else None
+
+class LatestPrice(models.Model):
+    """
+    The most recent price a user paid for a product in a given unit, used to
+    estimate shopping list prices with one lookup per list.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='latest_prices')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='latest_prices')
+    unit = models.CharField(max_length=50)  # Lower-cased GroceryItem.unit
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    platform = models.CharField(max_length=100)
+    observed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product', 'unit'], name='latestprice_unique_unit'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} per {self.unit}: {self.price}"
@@ -0,0 +1,99 @@
+import re
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Tuple
+
+# Unit spellings mapped to (base unit, multiplier)
+UNIT_ALIASES = {
+    'g': ('g', 1), 'gm': ('g', 1), 'gms': ('g', 1), 'gram': ('g', 1), 'grams': ('g', 1),
+    'kg': ('g', 1000), 'kgs': ('g', 1000), 'kilo': ('g', 1000), 'kilogram': ('g', 1000),
+    'ml': ('ml', 1), 'millilitre': ('ml', 1), 'milliliter': ('ml', 1),
+    'l': ('ml', 1000), 'lt': ('ml', 1000), 'ltr': ('ml', 1000), 'litre': ('ml', 1000),
+    'liter': ('ml', 1000), 'litres': ('ml', 1000), 'liters': ('ml', 1000),
+    'pc': ('pc', 1), 'pcs': ('pc', 1), 'piece': ('pc', 1), 'pieces': ('pc', 1),
+    'dozen': ('pc', 12),
+}
+
+_UNIT_PATTERN = '|'.join(sorted(UNIT_ALIASES, key=len, reverse=True))
+# "2 x 500 ml", "500ml", "1.5 L"
+_SIZE_RE = re.compile(
+    rf'(?:(\d+)\s*[x×*]\s*)?(\d+(?:\.\d+)?)\s*({_UNIT_PATTERN})\b', re.IGNORECASE
+)
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Words that do not tell products apart
+STOPWORDS = {'a', 'an', 'and', 'the', 'of', 'with', 'for', 'in', 'pack', 'packet', 'pouch', 'combo'}
+
+# Common alternative spellings
+TOKEN_SYNONYMS = {
+    'curd': 'dahi',
+    'yoghurt': 'yogurt',
+    'chilli': 'chili',
+    'chillies': 'chili',
+    'flour': 'atta',
+}
+
+@dataclass(frozen=True)
+class NormalizedName:
+    tokens: Tuple[str, ...]
+    size_value: Optional[Decimal] = None
+    size_unit: str = ''
+
+    @property
+    def size(self):
+        if self.size_value is None:
+            return ''
+        return f'{self.size_value.normalize():f}{self.size_unit}'
+
+    @property
+    def key(self):
+        """Identity of the product: sorted distinct tokens plus the size"""
+        return f"{' '.join(self.tokens)}|{self.size}"[:255]
+
+    @classmethod
+    def from_key(cls, key):
+        tokens, _, size = key.partition('|')
+        size_value, size_unit = None, ''
+        for unit in ('ml', 'g', 'pc'):
+            if size.endswith(unit) and size[:-len(unit)]:
+                size_value, size_unit = Decimal(size[:-len(unit)]), unit
+                break
+        return cls(tuple(tokens.split()), size_value, size_unit)
+
+def _singular(token):
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith('ies'):
+        return token[:-3] + 'y'
+    if token.endswith('oes'):
+        return token[:-2]
+    if token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def _parse_size(text):
+    match = _SIZE_RE.search(text)
+    if not match:
+        return None, '', text
+    count, amount, unit = match.groups()
+    base_unit, multiplier = UNIT_ALIASES[unit.lower()]
+    try:
+        value = Decimal(amount) * multiplier * (int(count) if count else 1)
+    except InvalidOperation:
+        return None, '', text
+    return value, base_unit, text[:match.start()] + ' ' + text[match.end():]
+
+def normalize_name(name):
+    """
+    Split a free-text item name into canonical tokens and a size in base units,
+    so "Amul Taaza Toned Milk 500 ml" and "amul taaza toned milk 0.5L" agree.
+    """
+    text = (name or '').lower()
+    size_value, size_unit, text = _parse_size(text)
+    tokens = set()
+    for token in _TOKEN_RE.findall(text):
+        if token in STOPWORDS:
+            continue
+        token = _singular(TOKEN_SYNONYMS.get(token, token))
+        tokens.add(TOKEN_SYNONYMS.get(token, token))
+    return NormalizedName(tuple(sorted(tokens)), size_value, size_unit)
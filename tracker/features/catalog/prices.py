@@ -0,0 +1,270 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .matcher import get_matcher
+from .models import DailyPrice, LatestPrice
+from ..receipt.models import GroceryItem
+
+PRICE_HISTORY_DAYS = 30
+MAX_PRICE_HISTORY_DAYS = 365
+
+def _observations(rows):
+    """Group ``(user_id, product_id, platform, created_at, price)`` rows by day."""
+    grouped = {}
+    for user_id, product_id, platform, created_at, price in rows:
+        if product_id is None:
+            continue
+        # Items saved before a refresh_from_db() may still hold a float price
+        price = Decimal(str(price))
+        key = (user_id, product_id, timezone.localdate(created_at), platform)
+        if key in grouped:
+            low, high, total, count = grouped[key]
+            grouped[key] = (min(low, price), max(high, price), total + price, count + 1)
+        else:
+            grouped[key] = (price, price, price, 1)
+    return grouped
+
+def _merge(grouped):
+    user_ids = {key[0] for key in grouped}
+    product_ids = {key[1] for key in grouped}
+    dates = {key[2] for key in grouped}
+    with transaction.atomic():
+        existing = {
+            (row.user_id, row.product_id, row.date, row.platform): row
+            for row in DailyPrice.objects.select_for_update().filter(
+                user_id__in=user_ids, product_id__in=product_ids, date__in=dates
+            )
+        }
+        updated, created = [], []
+        for key, (low, high, total, count) in grouped.items():
+            row = existing.get(key)
+            if row is None:
+                user_id, product_id, date, platform = key
+                created.append(DailyPrice(
+                    user_id=user_id, product_id=product_id, date=date, platform=platform,
+                    min_price=low, max_price=high, price_total=total, observations=count
+                ))
+                continue
+            row.min_price = min(row.min_price, low)
+            row.max_price = max(row.max_price, high)
+            row.price_total += total
+            row.observations += count
+            updated.append(row)
+        DailyPrice.objects.bulk_update(updated, ['min_price', 'max_price', 'price_total', 'observations'])
+        DailyPrice.objects.bulk_create(created)
+
+def record_prices(rows):
+    """
+    Fold new ``(user_id, product_id, platform, created_at, price)`` observations
+    into the daily price series.
+    """
+    grouped = _observations(rows)
+    if not grouped:
+        return
+    try:
+        _merge(grouped)
+    except IntegrityError:
+        # A concurrent writer created one of the days first; it is an update now
+        _merge(grouped)
+
+def record_item_prices(item_ids):
+    """Fold the prices of bulk-created grocery items into the series and the latest prices."""
+    rows = list(GroceryItem.objects.filter(id__in=item_ids, product__isnull=False).values_list(
+        'user_id', 'product_id', 'platform', 'created_at', 'price', 'unit'
+    ))
+    record_prices(row[:5] for row in rows)
+    record_latest_prices(rows)
+
+def refresh_day(user_id, product_id, date):
+    """
+    Recompute one product's series for one day from the grocery items, after
+    an item was edited or deleted.
+    """
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    rows = GroceryItem.objects.filter(
+        user_id=user_id, product_id=product_id,
+        created_at__gte=start, created_at__lt=start + timedelta(days=1)
+    ).values_list('user_id', 'product_id', 'platform', 'created_at', 'price')
+    with transaction.atomic():
+        DailyPrice.objects.filter(user_id=user_id, product_id=product_id, date=date).delete()
+        record_prices(rows)
+
+def rebuild_daily_prices(user_ids):
+    """
+    Recompute the series of ``user_ids`` with one GROUP BY query. Returns the
+    number of rows written.
+    """
+    rows = GroceryItem.objects.filter(user_id__in=user_ids, product__isnull=False).annotate(
+        date=TruncDate('created_at')
+    ).values('user_id', 'product_id', 'date', 'platform').annotate(
+        min_price=Min('price'),
+        max_price=Max('price'),
+        price_total=Sum('price'),
+        observations=Count('id')
+    ).order_by()
+    with transaction.atomic():
+        DailyPrice.objects.filter(user_id__in=user_ids).delete()
+        created = DailyPrice.objects.bulk_create((DailyPrice(**row) for row in rows), batch_size=1000)
+    return len(created)
+
+def _unit_key(unit):
+    return (unit or '').strip().lower()[:50]
+
+def _latest(rows):
+    """Newest ``(user_id, product_id, platform, created_at, price, unit)`` row per key."""
+    latest = {}
+    for user_id, product_id, platform, created_at, price, unit in rows:
+        if product_id is None:
+            continue
+        key = (user_id, product_id, _unit_key(unit))
+        if key not in latest or created_at >= latest[key][2]:
+            latest[key] = (price, platform, created_at)
+    return latest
+
+def record_latest_prices(rows):
+    """Keep the latest price per (user, product, unit) up to date with new items."""
+    latest = _latest(rows)
+    if not latest:
+        return
+    with transaction.atomic():
+        existing = {
+            (row.user_id, row.product_id, row.unit): row
+            for row in LatestPrice.objects.select_for_update().filter(
+                user_id__in={key[0] for key in latest},
+                product_id__in={key[1] for key in latest},
+            )
+        }
+        updated, created = [], []
+        for key, (price, platform, observed_at) in latest.items():
+            row = existing.get(key)
+            if row is None:
+                user_id, product_id, unit = key
+                created.append(LatestPrice(user_id=user_id, product_id=product_id, unit=unit,
+                                           price=price, platform=platform, observed_at=observed_at))
+            elif observed_at >= row.observed_at:
+                # Older imported purchases do not replace a newer price
+                row.price, row.platform, row.observed_at = price, platform, observed_at
+                updated.append(row)
+        LatestPrice.objects.bulk_update(updated, ['price', 'platform', 'observed_at'])
+        # A concurrent insert of the same key keeps its own value
+        LatestPrice.objects.bulk_create(created, ignore_conflicts=True)
+
+def refresh_latest_prices(user_id, product_id):
+    """Recompute a product's latest prices after an item was edited or deleted."""
+    rows = GroceryItem.objects.filter(user_id=user_id, product_id=product_id).values_list(
+        'user_id', 'product_id', 'platform', 'created_at', 'price', 'unit'
+    )
+    with transaction.atomic():
+        LatestPrice.objects.filter(user_id=user_id, product_id=product_id).delete()
+        record_latest_prices(rows)
+
+def rebuild_latest_prices(user_ids):
+    """Recompute the latest prices of ``user_ids``. Returns the number of rows written."""
+    rows = GroceryItem.objects.filter(user_id__in=user_ids, product__isnull=False).values_list(
+        'user_id', 'product_id', 'platform', 'created_at', 'price', 'unit'
+    ).iterator(chunk_size=2000)
+    latest = _latest(rows)
+    with transaction.atomic():
+        LatestPrice.objects.filter(user_id__in=user_ids).delete()
+        LatestPrice.objects.bulk_create((
+            LatestPrice(user_id=user_id, product_id=product_id, unit=unit,
+                        price=price, platform=platform, observed_at=observed_at)
+            for (user_id, product_id, unit), (price, platform, observed_at) in latest.items()
+        ), batch_size=1000)
+    return len(latest)
+
+def fill_estimated_prices(user_id, items, overwrite=False):
+    """
+    Set ``estimated_price`` on shopping list items from the latest price the
+    user paid for the same product, preferring the same unit. Items are not
+    saved. Only items without a price are filled unless ``overwrite`` is set.
+    """
+    items = [item for item in items if overwrite or item.estimated_price is None]
+    products = get_matcher().lookup(item.name for item in items)
+    if not products:
+        return
+    prices = {}
+    newest = {}
+    for product_id, unit, price, observed_at in LatestPrice.objects.filter(
+        user_id=user_id, product_id__in=set(products.values())
+    ).values_list('product_id', 'unit', 'price', 'observed_at'):
+        prices[product_id, unit] = price
+        if product_id not in newest or observed_at > newest[product_id][1]:
+            newest[product_id] = (price, observed_at)
+    for item in items:
+        product_id = products.get(item.name)
+        price = prices.get((product_id, _unit_key(item.unit)))
+        if price is None and product_id in newest:
+            # The product already fixes the pack size, so another unit's price is still close
+            price = newest[product_id][0]
+        if price is not None:
+            item.estimated_price = price
+
+def price_history(user, product_id, days=PRICE_HISTORY_DAYS, platform=None):
+    """Daily min/avg/max rows for one product, oldest first."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    queryset = DailyPrice.objects.filter(user=user, product_id=product_id, date__gte=since)
+    if platform:
+        queryset = queryset.filter(platform__iexact=platform)
+    return list(queryset.order_by('date', 'platform'))
+
+def platform_prices(user, product_ids, days=PRICE_HISTORY_DAYS):
+    """
+    Return ``{product_id: {platform: (lowest price, average price)}}`` over
+    the last ``days`` days.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = DailyPrice.objects.filter(
+        user=user, product_id__in=product_ids, date__gte=since
+    ).values('product_id', 'platform').annotate(
+        lowest=Min('min_price'),
+        total=Sum('price_total'),
+        count=Sum('observations')
+    ).order_by()
+    prices = defaultdict(dict)
+    for row in rows:
+        prices[row['product_id']][row['platform']] = (row['lowest'], row['total'] / row['count'])
+    return prices
+
+def compare_platforms(user, items, days=PRICE_HISTORY_DAYS):
+    """
+    Price each shopping list item on every platform the user bought its
+    product on, and total the list per platform.
+    """
+    products = get_matcher().lookup(item.name for item in items)
+    prices = platform_prices(user, set(products.values()), days)
+    cents = Decimal('0.01')
+
+    totals = defaultdict(lambda: [0, Decimal('0')])
+    compared = []
+    for item in items:
+        product_id = products.get(item.name)
+        item_prices = sorted(prices.get(product_id, {}).items(), key=lambda entry: entry[1][1])
+        for platform, (_, average) in item_prices:
+            totals[platform][0] += 1
+            totals[platform][1] += average * item.quantity
+        compared.append({
+            'id': item.pk,
+            'name': item.name,
+            'quantity': item.quantity,
+            'product': product_id,
+            'best_platform': item_prices[0][0] if item_prices else None,
+            'prices': [
+                {'platform': platform, 'lowest_price': lowest, 'avg_price': average.quantize(cents)}
+                for platform, (lowest, average) in item_prices
+            ],
+        })
+
+    platforms = [
+        {'platform': platform, 'items_priced': count, 'estimated_total': total.quantize(cents)}
+        for platform, (count, total) in totals.items()
+    ]
+    # Platforms covering more of the list first, then the cheapest
+    platforms.sort(key=lambda entry: (-entry['items_priced'], entry['estimated_total']))
+    return {'items': compared, 'platforms': platforms}
@@ -0,0 +1,16 @@
+from rest_framework import serializers
+from .models import Product, DailyPrice
+
+class ProductSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Product
+        fields = ('id', 'name', 'size_value', 'size_unit', 'category', 'created_at')
+        read_only_fields = fields
+
+class DailyPriceSerializer(serializers.ModelSerializer):
+    avg_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = DailyPrice
+        fields = ('date', 'platform', 'min_price', 'avg_price', 'max_price', 'observations')
+        read_only_fields = fields
@@ -0,0 +1,68 @@
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+
+from .models import Product
+from .prices import price_history, PRICE_HISTORY_DAYS, MAX_PRICE_HISTORY_DAYS
+from .serializers import ProductSerializer, DailyPriceSerializer
+from ..conditional import ConditionalGetViewMixin
+from ..receipt.models import GroceryItem
+
+def parse_days(request):
+    """Return the ``days`` query parameter, or None when it is invalid."""
+    try:
+        days = int(request.query_params.get('days', PRICE_HISTORY_DAYS))
+    except (TypeError, ValueError):
+        return None
+    return days if 1 <= days <= MAX_PRICE_HISTORY_DAYS else None
+
+class ProductViewSet(ConditionalGetViewMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for the canonical products the user has bought.
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Product.objects.filter(
+            id__in=GroceryItem.objects.filter(user=self.request.user).values('product_id')
+        )
+
+    @swagger_auto_schema(
+        operation_description="Daily lowest, average and highest price the user paid for a product, "
+                              "per platform, oldest first.",
+        manual_parameters=[
+            openapi.Parameter('days', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'Days of history (default {PRICE_HISTORY_DAYS}, '
+                                          f'max {MAX_PRICE_HISTORY_DAYS})'),
+            openapi.Parameter('platform', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Only this platform'),
+        ],
+        responses={200: 'Price history', 400: 'Bad Request'}
+    )
+    @action(detail=True, methods=['get'])
+    def prices(self, request, pk=None):
+        """Return the product's precomputed daily price series."""
+        days = parse_days(request)
+        if days is None:
+            return Response(
+                {'error': f'Invalid days parameter. Expected an integer from 1 to {MAX_PRICE_HISTORY_DAYS}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            product_id = int(pk)
+        except ValueError:
+            return Response({'error': 'Invalid product ID'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = price_history(request.user, product_id, days, request.query_params.get('platform'))
+        cheapest = min(rows, key=lambda row: (row.min_price, row.date), default=None)
+        return Response({
+            'product': product_id,
+            'days': days,
+            'best_platform': cheapest.platform if cheapest else None,
+            'lowest_price': cheapest.min_price if cheapest else None,
+            'history': DailyPriceSerializer(rows, many=True).data,
+        })
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import GroceryCategory
+from ..receipt.models import GroceryItem
+from ..shopping_list.models import ShoppingListItem
+
+logger = logging.getLogger(__name__)
+
+# Hashed feature space; collisions are rare for short item names
+INDEX_DIMENSIONS = 2 ** 14
+NGRAM_SIZE = 3
+SUGGESTION_LIMIT = 3
+MAX_SUGGESTION_LIMIT = 10
+# Cosine similarity below which a match is hash collisions rather than shared n-grams
+MIN_SUGGESTION_SCORE = 0.05
+# How often a process checks whether a newer index was written
+RELOAD_CHECK_SECONDS = 10
+
+META_FILE = 'meta.json'
+ARRAYS = ('counts', 'df', 'weights')
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+def _bucket(feature):
+    # crc32 rather than hash(), which differs between processes
+    return zlib.crc32(feature.encode('utf-8')) % INDEX_DIMENSIONS
+
+def name_features(name):
+    """Character n-grams of each word plus the words themselves, as ``{bucket: count}``."""
+    features = Counter()
+    for word in _WORD_RE.findall((name or '').lower()):
+        features[_bucket(f'w:{word}')] += 1
+        padded = f'<{word}>'
+        for i in range(max(len(padded) - NGRAM_SIZE + 1, 1)):
+            features[_bucket(padded[i:i + NGRAM_SIZE])] += 1
+    return features
+
+class CategoryIndex:
+    """
+    TF-IDF centroids of the item names filed under each category.
+
+    ``weights`` holds one L2-normalized row per category; a query only reads
+    the columns of its own n-grams. Arrays are memory-mapped, so loading the
+    index in a new process costs no more than opening the files.
+    """
+
+    def __init__(self, path, meta, mmap_mode='r'):
+        self.path = path
+        self.meta = meta
+        self.category_ids = meta['categories']
+        self.rows = {category_id: row for row, category_id in enumerate(self.category_ids)}
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode))
+
+    def idf(self, buckets):
+        return np.log((1 + self.meta['documents']) / (1 + self.df[buckets])) + 1
+
+    def suggest(self, name, limit=SUGGESTION_LIMIT):
+        """Return up to ``limit`` ``(category_id, score)`` pairs, best first."""
+        features = name_features(name)
+        if not features or not self.category_ids:
+            return []
+        buckets = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        query = np.fromiter(features.values(), dtype=np.float32, count=len(features)) * self.idf(buckets)
+        query /= np.linalg.norm(query)
+        scores = self.weights[:, buckets] @ query
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(self.category_ids[row], float(scores[row])) for row in top if scores[row] >= MIN_SUGGESTION_SCORE]
+
+def _index_dir():
+    return settings.CATEGORY_INDEX_DIR
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def load_index(directory=None):
+    directory = directory or _index_dir()
+    meta = _read_meta(directory)
+    if meta is None:
+        return None
+    return CategoryIndex(os.path.join(directory, meta['build']), meta)
+
+def _add_documents(counts, df, rows, documents):
+    """Add ``(name, category_id, occurrences)`` documents to the raw counts."""
+    added = 0
+    for name, category_id, occurrences in documents:
+        row = rows.get(category_id)
+        features = name_features(name)
+        if row is None or not features:
+            continue
+        buckets = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        counts[row, buckets] += np.fromiter(features.values(), dtype=np.float32, count=len(features)) * occurrences
+        df[buckets] += occurrences
+        added += occurrences
+    return added
+
+def _item_documents(model, after_id, last_id):
+    return model.objects.filter(category__isnull=False, id__gt=after_id, id__lte=last_id).values_list(
+        'name', 'category_id'
+    ).annotate(occurrences=Count('id')).order_by().iterator(chunk_size=5000)
+
+def build_index(full=False, directory=None, lease=None):
+    """
+    Write a new index and return it. Unless ``full`` is set, the previous
+    index is extended with the items and categories added since it was built.
+
+    If ``lease`` is lost while the items are read, nothing is written and
+    None is returned, so a build from another node is never replaced by
+    this one.
+    """
+    directory = directory or _index_dir()
+    os.makedirs(directory, exist_ok=True)
+    current = _read_meta(directory)
+    previous = load_index(directory) if current and not full else None
+    started = time.perf_counter()
+
+    # Items inserted while the index is built are picked up by the next build
+    last_ids = {
+        'grocery_item': GroceryItem.objects.aggregate(last=Max('id'))['last'] or 0,
+        'shopping_list_item': ShoppingListItem.objects.aggregate(last=Max('id'))['last'] or 0,
+    }
+    categories = list(GroceryCategory.objects.order_by('id').values_list('id', 'name'))
+
+    if previous is None:
+        category_ids, documents = [], 0
+        counts = np.zeros((0, INDEX_DIMENSIONS), dtype=np.float32)
+        df = np.zeros(INDEX_DIMENSIONS, dtype=np.float32)
+        after = {'grocery_item': 0, 'shopping_list_item': 0}
+    else:
+        category_ids, documents = list(previous.category_ids), previous.meta['documents']
+        counts, df = np.array(previous.counts), np.array(previous.df)
+        after = previous.meta['last_ids']
+
+    known = set(category_ids)
+    new_categories = [(category_id, name) for category_id, name in categories if category_id not in known]
+    category_ids += [category_id for category_id, _ in new_categories]
+    counts = np.vstack([counts, np.zeros((len(new_categories), INDEX_DIMENSIONS), dtype=np.float32)])
+    rows = {category_id: row for row, category_id in enumerate(category_ids)}
+
+    # Category names seed categories that have no items yet
+    documents += _add_documents(counts, df, rows, ((name, category_id, 1) for category_id, name in new_categories))
+    for model, key in ((GroceryItem, 'grocery_item'), (ShoppingListItem, 'shopping_list_item')):
+        if lease and lease.lost:
+            break
+        documents += _add_documents(counts, df, rows, _item_documents(model, after[key], last_ids[key]))
+    if lease and lease.lost:
+        logger.warning("Lost the lease while building the category index; not writing it")
+        return None
+
+    idf = np.log((1 + documents) / (1 + df)) + 1
+    weights = counts * idf
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    weights = np.divide(weights, norms, out=np.zeros_like(weights), where=norms > 0).astype(np.float32)
+
+    build = f'build-{time.time_ns()}'
+    path = os.path.join(directory, build)
+    os.makedirs(path)
+    for name, array in (('counts', counts), ('df', df), ('weights', weights)):
+        np.save(os.path.join(path, f'{name}.npy'), array)
+    meta = {
+        'build': build,
+        'categories': category_ids,
+        'documents': documents,
+        'last_ids': last_ids,
+        'dimensions': INDEX_DIMENSIONS,
+    }
+    # Readers only follow meta.json, so the swap is atomic
+    temp_meta = os.path.join(directory, f'.{META_FILE}.{build}')
+    with open(temp_meta, 'w') as f:
+        json.dump(meta, f)
+    os.replace(temp_meta, os.path.join(directory, META_FILE))
+
+    # Keep the previous build for processes that still have it mapped
+    keep = {build, current['build'] if current else None}
+    for entry in os.listdir(directory):
+        if entry.startswith('build-') and entry not in keep:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+    logger.info(f"Built category index {build} ({len(category_ids)} categories, {documents} documents, "
+                f"{'full' if previous is None else 'incremental'}) in {time.perf_counter() - started:.2f}s")
+    return CategoryIndex(path, meta)
+
+_index = None
+_checked_at = float('-inf')
+_lock = threading.Lock()
+
+def _queue_build():
+    # tasks imports this module
+    from ...tasks import refresh_category_index
+    try:
+        refresh_category_index.delay(full=True)
+    except Exception:
+        logger.error("Failed to queue the category index build", exc_info=True)
+
+def get_category_index():
+    """
+    Process-wide index, or None if none has been built yet. A newer build
+    written by another process is picked up within RELOAD_CHECK_SECONDS.
+    A missing index is queued for building rather than built in the caller,
+    at most once per RELOAD_CHECK_SECONDS.
+    """
+    global _index, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < RELOAD_CHECK_SECONDS:
+        return _index
+    with _lock:
+        _checked_at = now
+        meta = _read_meta(_index_dir())
+        if meta is None:
+            _queue_build()
+        elif _index is None or meta['build'] != _index.meta['build']:
+            _index = load_index()
+        return _index
+
+def suggest_categories(name, limit=SUGGESTION_LIMIT):
+    """
+    Return ``[(category, score)]`` for an item name, best first. Empty until
+    the first index build has finished.
+    """
+    index = get_category_index()
+    if index is None:
+        return []
+    suggestions = index.suggest(name, limit)
+    categories = GroceryCategory.objects.in_bulk([category_id for category_id, _ in suggestions])
+    # Categories deleted since the last build are skipped
+    return [(categories[category_id], score) for category_id, score in suggestions if category_id in categories]
@@ -1,13 +1,60 @@
-from rest_framework import viewsets
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
 
 from .models import GroceryCategory
 from .serializers import GroceryCategorySerializer
+from .suggest import suggest_categories, SUGGESTION_LIMIT, MAX_SUGGESTION_LIMIT
+from ..conditional import ConditionalGetViewMixin
 
-class GroceryCategoryViewSet(viewsets.ModelViewSet):
+class GroceryCategoryViewSet(ConditionalGetViewMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing grocery categories.
     """
     queryset = GroceryCategory.objects.all()
     serializer_class = GroceryCategorySerializer
-    permission_classes = [IsAuthenticated] 
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+    data_version_per_user = False
+
+    @swagger_auto_schema(
+        operation_description="Suggest categories for an item name from the names of already "
+                              "categorized items, best match first.",
+        manual_parameters=[
+            openapi.Parameter('name', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Item name'),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'Number of suggestions (default {SUGGESTION_LIMIT}, '
+                                          f'max {MAX_SUGGESTION_LIMIT})'),
+        ],
+        responses={200: 'Suggested categories', 400: 'Bad Request'}
+    )
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Suggest categories for an item name."""
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return Response(
+                {'error': "The 'name' parameter is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', SUGGESTION_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_SUGGESTION_LIMIT:
+            return Response(
+                {'error': f'Invalid limit parameter. Expected an integer from 1 to {MAX_SUGGESTION_LIMIT}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        suggestions = suggest_categories(name, limit)
+        return Response({
+            'name': name,
+            'suggestions': [
+                {'id': category.pk, 'name': category.name, 'score': round(score, 4)}
+                for category, score in suggestions
+            ],
+        })
@@ -0,0 +1,66 @@
+import hashlib
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .auth.authentication import CachedJWTAuthentication, LazyJWTAuthentication
+from .data_versions import get_versions
+
+class ConditionalGetViewMixin:
+    """
+    ViewSet mixin adding strong ETags and ``If-None-Match`` handling to
+    ``list`` and ``retrieve``.
+
+    The ETag is derived from the data versions in the cache and the request
+    URL, so a matching ``If-None-Match`` is answered with 304 before the
+    queryset is evaluated. Set ``data_version_per_user = False`` for
+    endpoints that only serve shared data. Without a shared data version
+    cache no ETag is sent, since versions bumped by Celery workers would
+    not be seen.
+    """
+    data_version_per_user = True
+
+    def get_authenticators(self):
+        # Answering with 304 only needs the user id from the token
+        return [
+            LazyJWTAuthentication() if type(authenticator) is CachedJWTAuthentication else authenticator
+            for authenticator in super().get_authenticators()
+        ]
+
+    def get_etag(self, request):
+        versions = get_versions(request.user.pk if self.data_version_per_user else None)
+        if versions is None:
+            return None
+        user_version, global_version = versions
+        representation = hashlib.sha256(
+            f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}".encode('utf-8')
+        ).hexdigest()[:16]
+        return f'"{user_version or 0}.{global_version}.{representation}"'
+
+    def _conditional_response(self, request, handler, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag is not None:
+            # If-None-Match uses the weak comparison
+            client_etags = [
+                tag[2:] if tag.startswith('W/') else tag
+                for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+            ]
+            if etag in client_etags:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = handler(request, *args, **kwargs)
+            if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+                response['ETag'] = etag
+        else:
+            response = handler(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(request, super().retrieve, *args, **kwargs)
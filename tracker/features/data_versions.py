@@ -0,0 +1,71 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_VERSION_KEY = 'data-version:global'
+
+def _user_key(user_id):
+    return f'data-version:user:{user_id}'
+
+def _get_cache():
+    return caches[settings.DATA_VERSION_CACHE_ALIAS]
+
+def versions_shared():
+    """
+    Whether versions are kept in a cache shared by every process. Celery
+    workers bump versions too, so per-process versions would go stale.
+    """
+    return settings.DATA_VERSION_CACHE_BACKEND == 'redis'
+
+def _initial_version():
+    # Seeded from the clock so a version evicted from the cache never comes back lower
+    return time.time_ns() // 1000
+
+def _bump(key):
+    cache = _get_cache()
+    try:
+        if not cache.add(key, _initial_version(), timeout=None):
+            cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, _initial_version(), timeout=None)
+    except Exception as e:
+        logger.error(f"Failed to bump data version {key}: {str(e)}")
+
+def bump_user_version(user_id):
+    """Bump the user's data version once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(_user_key(user_id)))
+
+def bump_global_version():
+    """Bump the version of data shared by all users (categories)."""
+    transaction.on_commit(lambda: _bump(GLOBAL_VERSION_KEY))
+
+def get_versions(user_id=None):
+    """
+    Return ``(user_version, global_version)`` from the cache, seeding missing
+    keys. Returns None if the cache is unavailable or not shared.
+    """
+    if not versions_shared():
+        return None
+    cache = _get_cache()
+    keys = [GLOBAL_VERSION_KEY] if user_id is None else [_user_key(user_id), GLOBAL_VERSION_KEY]
+    try:
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                cache.add(key, _initial_version(), timeout=None)
+                versions[key] = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Failed to read data versions: {str(e)}")
+        return None
+    if any(versions.get(key) is None for key in keys):
+        return None
+    return (
+        None if user_id is None else versions[_user_key(user_id)],
+        versions[GLOBAL_VERSION_KEY],
+    )
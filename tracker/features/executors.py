@@ -0,0 +1,50 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+_executor = None
+_lock = threading.Lock()
+
+def get_blocking_executor():
+    """
+    Bounded pool for CPU-heavy or blocking work started from async views,
+    such as password hashing and image encoding. Work beyond
+    ASYNC_BLOCKING_WORKERS waits in the queue instead of adding threads.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ASYNC_BLOCKING_WORKERS,
+                    thread_name_prefix='blocking'
+                )
+    return _executor
+
+def _call(func, *args, **kwargs):
+    # Pool threads live across requests, so apply CONN_MAX_AGE like a request would
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+async def run_blocking(func, *args, **kwargs):
+    """Run ``func`` in the blocking-work pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_blocking_executor(), functools.partial(_call, func, *args, **kwargs)
+    )
+
+async def release_connection():
+    """
+    Close this request's database connection before a long await, so that
+    requests waiting on the model do not each hold one open. Django reopens
+    it on the next query.
+    """
+    await sync_to_async(connections.close_all)()
@@ -0,0 +1,3 @@
+"""
+Leases Feature Package
+"""
\ No newline at end of file
@@ -0,0 +1,233 @@
+import functools
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import TaskLease, TaskRun
+
+logger = logging.getLogger(__name__)
+
+# Compare-and-act, so a node never extends or drops a lease another node has taken over
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_client = None
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.LEASE_REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+    return _client
+
+class RedisLeaseBackend:
+    """Leases as ``SET NX PX`` keys holding the owner"""
+    name = 'redis'
+
+    def _key(self, name):
+        return f'lease:{name}'
+
+    def acquire(self, name, owner, ttl):
+        return bool(_redis().set(self._key(name), owner, nx=True, px=int(ttl * 1000)))
+
+    def renew(self, name, owner, ttl):
+        return bool(_redis().eval(_RENEW_SCRIPT, 1, self._key(name), owner, int(ttl * 1000)))
+
+    def release(self, name, owner):
+        _redis().eval(_RELEASE_SCRIPT, 1, self._key(name), owner)
+
+    def holder(self, name):
+        owner = _redis().get(self._key(name))
+        return owner.decode('utf-8') if owner else None
+
+class DatabaseLeaseBackend:
+    """Leases as TaskLease rows, taken over with conditional updates once expired"""
+    name = 'db'
+
+    def acquire(self, name, owner, ttl):
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl)
+        if TaskLease.objects.filter(name=name, expires_at__lt=now).update(
+            owner=owner, acquired_at=now, expires_at=expires_at
+        ):
+            return True
+        try:
+            with transaction.atomic():
+                TaskLease.objects.create(name=name, owner=owner, acquired_at=now, expires_at=expires_at)
+        except IntegrityError:
+            # Held, or another node created the row first
+            return False
+        return True
+
+    def renew(self, name, owner, ttl):
+        return bool(TaskLease.objects.filter(name=name, owner=owner).update(
+            expires_at=timezone.now() + timedelta(seconds=ttl)
+        ))
+
+    def release(self, name, owner):
+        # The row is kept, so the next run only needs an update
+        TaskLease.objects.filter(name=name, owner=owner).update(expires_at=timezone.now())
+
+    def holder(self, name):
+        return TaskLease.objects.filter(name=name, expires_at__gte=timezone.now()).values_list(
+            'owner', flat=True
+        ).first()
+
+def _backends():
+    if settings.LEASE_BACKEND == 'redis':
+        return [RedisLeaseBackend(), DatabaseLeaseBackend()]
+    return [DatabaseLeaseBackend()]
+
+class Lease:
+    """
+    Exclusive, expiring ownership of ``name`` across processes and nodes.
+
+    While held, the lease is renewed every third of its TTL from a background
+    thread, so it only expires if the holder dies or hangs. ``lost`` is set
+    when a renewal finds the lease taken over, or none succeeds for a whole
+    TTL; the holder should then stop doing work another node may repeat.
+
+    Redis is used when configured. If Redis cannot be reached the database
+    is used instead; a node that still holds the Redis lease can overlap with
+    it until Redis is back, which is preferred to not running at all.
+    """
+
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.ttl = ttl or settings.LEASE_TTL
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.backend = None
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._renewed_at = None
+
+    def acquire(self):
+        """Take the lease if it is free. Returns whether it is now held."""
+        for backend in _backends():
+            try:
+                acquired = backend.acquire(self.name, self.owner, self.ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Redis lease backend unavailable for {self.name}, using the database: {str(e)}")
+                continue
+            self.backend = backend
+            if acquired:
+                self._renewed_at = time.monotonic()
+                self._thread = threading.Thread(target=self._keep_alive, name=f'lease-{self.name}', daemon=True)
+                self._thread.start()
+            return acquired
+        return False
+
+    def holder(self):
+        """Owner of the lease as last seen by the backend used to acquire it."""
+        try:
+            return self.backend.holder(self.name) if self.backend else None
+        except Exception:
+            return None
+
+    def _keep_alive(self):
+        try:
+            while not self._stop.wait(self.ttl / 3):
+                try:
+                    renewed = self.backend.renew(self.name, self.owner, self.ttl)
+                except Exception as e:
+                    logger.warning(f"Failed to renew lease {self.name}: {str(e)}")
+                    renewed = None
+                if renewed:
+                    self._renewed_at = time.monotonic()
+                elif renewed is False or time.monotonic() - self._renewed_at > self.ttl:
+                    logger.error(f"Lost lease {self.name} held by {self.owner}")
+                    self.lost = True
+                    return
+        finally:
+            # The database backend opened a connection for this thread
+            connection.close()
+
+    def release(self):
+        """Stop renewing and free the lease, unless another node has taken it over."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.backend.release(self.name, self.owner)
+        except Exception as e:
+            # It expires on its own after the TTL
+            logger.warning(f"Failed to release lease {self.name}: {str(e)}")
+
+def _record_run(lease, task_id, status, started_at, duration=None, error=''):
+    try:
+        TaskRun.objects.create(
+            task_name=lease.name,
+            task_id=task_id or '',
+            owner=lease.owner if status != 'skipped' else (lease.holder() or ''),
+            backend=lease.backend.name if lease.backend else '',
+            status=status,
+            error=error,
+            started_at=started_at,
+            finished_at=timezone.now() if status != 'skipped' else None,
+            duration=duration,
+        )
+    except Exception as e:
+        logger.error(f"Failed to record run of {lease.name}: {str(e)}")
+
+def leased_task(name=None, ttl=None):
+    """
+    Run a bound Celery task under a lease named after the task, so that at
+    most one invocation runs at a time across all workers. Invocations that
+    find the lease held return immediately. Every invocation is recorded as
+    a TaskRun; runs older than TASK_RUN_RETENTION_DAYS are pruned.
+
+    The lease is available to the task as ``self.request.lease``. Apply it
+    below ``@shared_task(bind=True)``.
+    """
+    def decorator(func):
+        lease_name = name or f'{func.__module__}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            lease = Lease(lease_name, ttl)
+            started_at = timezone.now()
+            if not lease.acquire():
+                logger.info(f"Skipping {lease_name} (task_id: {self.request.id}); "
+                            f"the previous run is still in progress")
+                _record_run(lease, self.request.id, 'skipped', started_at)
+                return {'task_id': self.request.id, 'skipped': True}
+
+            self.request.lease = lease
+            started = time.perf_counter()
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as e:
+                lease.release()
+                _record_run(lease, self.request.id, 'failed', started_at, time.perf_counter() - started, str(e))
+                raise
+            lease.release()
+            _record_run(lease, self.request.id, 'lost' if lease.lost else 'completed',
+                        started_at, time.perf_counter() - started)
+            TaskRun.objects.filter(
+                task_name=lease_name,
+                started_at__lt=started_at - timedelta(days=settings.TASK_RUN_RETENTION_DAYS)
+            ).delete()
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,46 @@
+from django.db import models
+
+class TaskLease(models.Model):
+    """
+    Database lease on a periodic task, used when Redis is not configured or
+    unreachable. A lease past ``expires_at`` is free to take over.
+    """
+    name = models.CharField(max_length=200, unique=True)
+    owner = models.CharField(max_length=255)
+    acquired_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} held by {self.owner} until {self.expires_at}"
+
+class TaskRun(models.Model):
+    """One invocation of a leased task: who ran it, how long it took, or why it was skipped."""
+    STATUS_CHOICES = [
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+        ('lost', 'Lease Lost')
+    ]
+    BACKEND_CHOICES = [
+        ('redis', 'Redis'),
+        ('db', 'Database')
+    ]
+
+    task_name = models.CharField(max_length=200)
+    task_id = models.CharField(max_length=255, blank=True)
+    owner = models.CharField(max_length=255)
+    backend = models.CharField(max_length=10, choices=BACKEND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)  # Seconds, for runs that held the lease
+
+    def __str__(self):
+        return f"{self.task_name} {self.status} ({self.owner})"
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['task_name', 'started_at'], name='taskrun_task_started_idx'),
+        ]
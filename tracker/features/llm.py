@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+import aiohttp
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .executors import release_connection
+
+logger = logging.getLogger(__name__)
+
+METRIC_KEYS = {
+    'hits': 'llm:metrics:hits',
+    'misses': 'llm:metrics:misses',
+}
+
+def _normalize_text(text):
+    # Collapse indentation and blank-line differences that do not change the prompt
+    return ' '.join(text.split())
+
+def _normalize_content(content):
+    if isinstance(content, str):
+        return _normalize_text(content)
+    if isinstance(content, list):
+        return [
+            {**part, 'text': _normalize_text(part['text'])}
+            if isinstance(part, dict) and part.get('type') == 'text' else part
+            for part in content
+        ]
+    return content
+
+def make_cache_key(model, messages, params, prompt_version):
+    """
+    Hash of the model, normalized messages, call parameters and prompt version.
+    """
+    payload = json.dumps({
+        'model': model,
+        'messages': [
+            {'role': message['role'], 'content': _normalize_content(message['content'])}
+            for message in messages
+        ],
+        'params': params,
+        'prompt_version': prompt_version,
+    }, sort_keys=True, default=str)
+    return f"llm:response:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+def _get_cache():
+    return caches[settings.LLM_CACHE_ALIAS]
+
+def _record(metric):
+    cache = _get_cache()
+    key = METRIC_KEYS[metric]
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception as e:
+        logger.warning(f"Failed to record LLM cache {metric}: {str(e)}")
+
+def cache_metrics():
+    """Return the LLM response cache hit/miss counters."""
+    cache = _get_cache()
+    hits = cache.get(METRIC_KEYS['hits'], 0)
+    misses = cache.get(METRIC_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+def _cached_response(cache, key, prompt_version):
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {str(e)}")
+        cached = None
+    if cached is not None:
+        _record('hits')
+        logger.info(f"LLM cache hit ({prompt_version})")
+        return cached
+    _record('misses')
+    return None
+
+def _store_response(cache, key, content, validate=None):
+    if validate is not None and not validate(content):
+        logger.warning("Not caching an LLM response that failed validation")
+        return
+    if len(content.encode('utf-8')) <= settings.LLM_CACHE_MAX_RESPONSE_BYTES:
+        try:
+            cache.set(key, content, timeout=settings.LLM_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"LLM cache store failed: {str(e)}")
+
+def chat_completion(model, messages, prompt_version, use_cache=True, validate=None, **params):
+    """
+    Call the chat completion API and return the message content.
+
+    Responses are cached by model, normalized messages, parameters and
+    ``prompt_version`` for ``LLM_CACHE_TTL`` seconds. Pass ``use_cache=False``
+    to always call the model (the fresh response still replaces the cached one).
+    If given, ``validate(content)`` must be true for the response to be
+    cached, so a malformed response is not served again.
+    """
+    cache = _get_cache()
+    key = make_cache_key(model, messages, params, prompt_version)
+
+    if use_cache:
+        cached = _cached_response(cache, key, prompt_version)
+        if cached is not None:
+            return cached
+
+    openai.api_key = settings.OPENAI_API_KEY
+    response = openai.ChatCompletion.create(model=model, messages=messages, **params)
+    content = response.choices[0].message.content
+
+    _store_response(cache, key, content, validate)
+    return content
+
+_aiosessions = {}
+
+def _get_aiosession():
+    """
+    One aiohttp session per event loop, so concurrent model calls share a
+    connection pool instead of opening a session each.
+    """
+    loop = asyncio.get_running_loop()
+    session = _aiosessions.get(loop)
+    if session is None or session.closed:
+        for other_loop in [other for other in _aiosessions if other.is_closed()]:
+            del _aiosessions[other_loop]
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.LLM_MAX_CONCURRENT_REQUESTS),
+            timeout=aiohttp.ClientTimeout(total=settings.LLM_REQUEST_TIMEOUT),
+        )
+        _aiosessions[loop] = session
+    return session
+
+async def achat_completion(model, messages, prompt_version, use_cache=True, validate=None, **params):
+    """
+    ``chat_completion`` for async views: the model call is awaited on the
+    event loop, and the cache is read and written from a sync thread.
+    """
+    cache = _get_cache()
+    key = make_cache_key(model, messages, params, prompt_version)
+
+    if use_cache:
+        cached = await sync_to_async(_cached_response)(cache, key, prompt_version)
+        if cached is not None:
+            return cached
+
+    # Do not hold a database connection while waiting on the model
+    await release_connection()
+    openai.api_key = settings.OPENAI_API_KEY
+    token = openai.aiosession.set(_get_aiosession())
+    try:
+        response = await openai.ChatCompletion.acreate(model=model, messages=messages, **params)
+    finally:
+        openai.aiosession.reset(token)
+    content = response.choices[0].message.content
+
+    await sync_to_async(_store_response)(cache, key, content, validate)
+    return content
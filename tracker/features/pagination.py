@@ -0,0 +1,114 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over ``(created_at, id)``, newest first.
+
+    Each page is fetched with a range condition on the ``(user, created_at, id)``
+    indexes, so deep pages cost the same as the first one, unlike OFFSET.
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, instance, reverse):
+        payload = json.dumps({
+            't': instance.created_at.isoformat(),
+            'i': instance.pk,
+            'r': int(reverse),
+        }, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            created_at = parse_datetime(payload['t'])
+            pk = int(payload['i'])
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk, reverse
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        if cursor is None:
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            created_at, pk, _ = cursor
+            if reverse:
+                # Previous page: the rows just newer than the cursor, read oldest first
+                queryset = queryset.filter(created_at__gte=created_at).exclude(
+                    created_at=created_at, id__lte=pk
+                ).order_by('created_at', 'id')
+            else:
+                queryset = queryset.filter(created_at__lte=created_at).exclude(
+                    created_at=created_at, id__gte=pk
+                ).order_by('-created_at', '-id')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,106 @@
+import csv
+import json
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer
+
+from .models import GroceryItem
+
+EXPORT_CHUNK_SIZE = 2000
+LINES_PER_WRITE = 500
+
+# (column name, values_list lookup)
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('name', 'name'),
+    ('category', 'category__name'),
+    ('price', 'price'),
+    ('quantity', 'quantity'),
+    ('unit', 'unit'),
+    ('platform', 'platform'),
+    ('created_at', 'created_at'),
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Leading characters that make spreadsheet applications evaluate a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+class _PassthroughRenderer(BaseRenderer):
+    """Lets DRF negotiate ?format= for views that stream their own body"""
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only error responses reach the renderer; exports are streamed by the view
+        return json.dumps(data) if data is not None else ''
+
+class CSVRenderer(_PassthroughRenderer):
+    media_type = EXPORT_FORMATS['csv']
+    format = 'csv'
+
+class NDJSONRenderer(_PassthroughRenderer):
+    media_type = EXPORT_FORMATS['ndjson']
+    format = 'ndjson'
+
+class _LineBuffer:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+def _export_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return _export_value(value)
+
+def export_queryset(user=None):
+    """Grocery item rows to export, in the order of the (user, created_at, id) index."""
+    queryset = GroceryItem.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    return queryset.order_by('created_at', 'id').values_list(
+        *[lookup for _, lookup in EXPORT_COLUMNS]
+    )
+
+def _batched(lines):
+    # Join lines into larger writes instead of one write per row
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= LINES_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+def iter_csv(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the CSV export, starting with the header line."""
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow([column for column, _ in EXPORT_COLUMNS])
+    yield from _batched(
+        writer.writerow([_csv_cell(value) for value in row])
+        for row in rows.iterator(chunk_size=chunk_size)
+    )
+
+def iter_ndjson(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export as one JSON object per line."""
+    columns = [column for column, _ in EXPORT_COLUMNS]
+    yield from _batched(
+        json.dumps(dict(zip(columns, map(_export_value, row))), separators=(',', ':')) + '\n'
+        for row in rows.iterator(chunk_size=chunk_size)
+    )
+
+EXPORTERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
@@ -0,0 +1,239 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+
+from .models import GroceryItem
+from .signals import grocery_items_bulk_created
+from ..category.models import GroceryCategory
+from ..catalog.matcher import get_matcher
+from ..data_versions import bump_global_version
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_ROWS = 100000
+# Only the first errors are reported back; the rest are counted
+MAX_REPORTED_ERRORS = 200
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+MIN_AMOUNT = Decimal('0.01')
+MAX_AMOUNT = Decimal('99999999.99')
+
+class ImportFormatError(Exception):
+    """The upload cannot be read as the requested format"""
+
+def detect_format(filename, requested=None):
+    """Return the import format from the explicit choice or the file extension."""
+    if requested:
+        if requested not in IMPORT_FORMATS:
+            raise ImportFormatError(f"Unsupported format '{requested}'. Expected one of: {', '.join(IMPORT_FORMATS)}.")
+        return requested
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    raise ImportFormatError("Cannot tell the file format; upload a .csv or .ndjson file or pass 'format'.")
+
+def _lines(uploaded_file):
+    # Decode chunk by chunk so the upload is never read into memory at once
+    return codecs.iterdecode(uploaded_file, 'utf-8-sig')
+
+def iter_rows(uploaded_file, import_format):
+    """Yield ``(row_number, row_dict)`` pairs, or a string error instead of the dict."""
+    if import_format == 'csv':
+        reader = csv.DictReader(_lines(uploaded_file))
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, row
+        return
+    for row_number, line in enumerate(_lines(uploaded_file), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, f'Invalid JSON: {str(e)}'
+            continue
+        yield row_number, row if isinstance(row, dict) else 'Expected a JSON object'
+
+def _text(row, field, errors, max_length, required=True, default=''):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if not value:
+        if required:
+            errors[field] = 'This field is required.'
+        return default
+    if len(value) > max_length:
+        errors[field] = f'Ensure this field has no more than {max_length} characters.'
+    return value
+
+def _amount(row, field, errors):
+    value = row.get(field)
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError, ValueError):
+        errors[field] = 'A valid number is required.'
+        return None
+    if not amount.is_finite() or not MIN_AMOUNT <= amount <= MAX_AMOUNT:
+        errors[field] = f'Ensure this value is between {MIN_AMOUNT} and {MAX_AMOUNT}.'
+        return None
+    if amount.as_tuple().exponent < -2:
+        errors[field] = 'Ensure that there are no more than 2 decimal places.'
+        return None
+    return amount
+
+def _timestamp(row, errors):
+    value = row.get('created_at')
+    if value in (None, ''):
+        return None
+    value = str(value).strip()
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            parsed = datetime(date.year, date.month, date.day) if date else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        errors['created_at'] = 'Expected an ISO 8601 date or datetime.'
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def validate_row(row):
+    """
+    Return ``(values, errors)`` for one imported row. Mirrors the
+    GroceryItemSerializer rules without building a serializer per row.
+    """
+    errors = {}
+    values = {
+        'name': _text(row, 'name', errors, 200),
+        'price': _amount(row, 'price', errors),
+        'quantity': _amount(row, 'quantity', errors),
+        'unit': _text(row, 'unit', errors, 50, required=False, default='piece'),
+        'platform': _text(row, 'platform', errors, 100),
+        'category': _text(row, 'category', errors, 100, required=False) or None,
+        'created_at': _timestamp(row, errors),
+    }
+    return values, errors
+
+class CategoryLookup:
+    """Case-insensitive category name to id map, creating missing categories in bulk"""
+
+    def __init__(self):
+        self.ids = {}
+        for category_id, name in GroceryCategory.objects.order_by('-id').values_list('id', 'name'):
+            # Iterating newest first leaves the oldest category for duplicated names
+            self.ids[name.lower()] = category_id
+
+    def resolve(self, names):
+        missing = {}
+        for name in names:
+            if name and name.lower() not in self.ids:
+                missing.setdefault(name.lower(), name)
+        if missing:
+            created = GroceryCategory.objects.bulk_create([
+                GroceryCategory(name=name, description=f'Category for {name} items')
+                for name in missing.values()
+            ])
+            for category in created:
+                self.ids.setdefault(category.name.lower(), category.pk)
+            bump_global_version()
+
+    def get(self, name):
+        return self.ids.get(name.lower()) if name else None
+
+class GroceryItemImporter:
+    """
+    Import grocery items from a CSV or NDJSON upload.
+
+    Rows are validated as they are read and inserted ``batch_size`` at a time,
+    each batch in its own transaction. Invalid rows are skipped and reported.
+    ``grocery_items_bulk_created`` is sent as each batch commits, so batches
+    already imported are fully processed even if a later one fails.
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, max_rows=IMPORT_MAX_ROWS):
+        self.user = user
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def _error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def _insert(self, batch, categories):
+        categories.resolve(values['category'] for values in batch)
+        products = get_matcher().resolve_many(
+            (values['name'], categories.get(values['category'])) for values in batch
+        )
+        now = timezone.now()
+        items = [
+            GroceryItem(
+                user=self.user,
+                name=values['name'],
+                category_id=categories.get(values['category']),
+                product_id=products.get(values['name']),
+                price=values['price'],
+                quantity=values['quantity'],
+                unit=values['unit'],
+                platform=values['platform'],
+                created_at=values['created_at'] or now,
+            )
+            for values in batch
+        ]
+        with transaction.atomic():
+            items = GroceryItem.objects.bulk_create(items)
+            item_ids = [item.pk for item in items]
+            transaction.on_commit(lambda: grocery_items_bulk_created.send(
+                sender=GroceryItem, user=self.user, item_ids=item_ids
+            ))
+        self.imported += len(items)
+
+    def run(self, uploaded_file, import_format):
+        """Import the upload and return the report."""
+        categories = CategoryLookup()
+        batch = []
+        row_number = 0
+        rows = iter_rows(uploaded_file, import_format)
+        while True:
+            try:
+                row_number, row = next(rows)
+            except StopIteration:
+                break
+            except (csv.Error, UnicodeDecodeError) as e:
+                # The rest of the file cannot be read reliably
+                self._error(row_number + 1, {'non_field_errors': f'Unreadable file: {str(e)}'})
+                break
+            if row_number > self.max_rows:
+                self._error(row_number, {'non_field_errors': f'Imports are limited to {self.max_rows} rows.'})
+                break
+            if isinstance(row, str):
+                self._error(row_number, {'non_field_errors': row})
+                continue
+            values, errors = validate_row(row)
+            if errors:
+                self._error(row_number, errors)
+                continue
+            batch.append(values)
+            if len(batch) >= self.batch_size:
+                self._insert(batch, categories)
+                batch = []
+        if batch:
+            self._insert(batch, categories)
+
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
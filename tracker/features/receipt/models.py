@@ -5,6 +5,7 @@ from django.utils import timezone
 from decimal import Decimal
 
 from ..category.models import GroceryCategory
+from ..catalog.models import Product
 
 def receipt_image_path(instance, filename):
     # Generate path like: receipts/user_1/2024/03/receipt_123.jpg
@@ -15,10 +16,17 @@ def receipt_image_path(instance, filename):
 class Receipt(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('queued', 'Queued'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
     ]
+    # Interactive uploads are processed right away; batch uploads are
+    # dispatched a few at a time, taking turns between users
+    PRIORITY_CHOICES = [
+        ('interactive', 'Interactive'),
+        ('batch', 'Batch'),
+    ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='receipts')
     image = models.ImageField(
@@ -33,9 +41,13 @@ class Receipt(models.Model):
         help_text='Name of the platform (e.g., Zepto, Blinkit)'
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='interactive')
     processed_text = models.TextField(blank=True)
     processed_data = models.JSONField(null=True, blank=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Bumped by each processing run that claims the receipt; a run only saves
+    # its result while the attempt is still its own
+    claim_attempt = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -44,18 +56,32 @@ class Receipt(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='receipt_user_created_idx'),
+            models.Index(fields=['status'], name='receipt_status_idx'),
+            models.Index(fields=['priority', 'status', 'user', 'id'], name='receipt_dispatch_idx'),
+        ]
 
 class GroceryItem(models.Model):
     name = models.CharField(max_length=200)
     category = models.ForeignKey(GroceryCategory, on_delete=models.SET_NULL, null=True, related_name='items')
+    # Canonical product, linked on insert by the catalog matcher
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='items')
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
     quantity = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
     unit = models.CharField(max_length=50, default='piece')  # e.g., kg, piece, packet
     platform = models.CharField(max_length=100)  # e.g., Zepto, Blinkit, Swiggy
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grocery_items')
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default instead of auto_now_add so bulk imports can keep historical purchase dates
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='groceryitem_user_created_idx'),
+            models.Index(fields=['user', 'product'], name='groceryitem_user_product_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.quantity} {self.unit})"
 
@@ -0,0 +1,205 @@
+import base64
+import json
+import logging
+
+from django.db import transaction
+
+from .models import Receipt, GroceryItem
+from ..category.models import GroceryCategory
+from ..llm import chat_completion
+
+logger = logging.getLogger(__name__)
+
+# Bump when the receipt prompt changes so cached model responses are not reused
+RECEIPT_PROMPT_VERSION = 'receipt-v1'
+
+# Completed and processing receipts are never picked up again; failed ones
+# are retried by moving them back to pending
+CLAIMABLE_STATUSES = ('pending', 'queued')
+
+def _encode_image(path):
+    # Read the image file and encode it as base64
+    with open(path, 'rb') as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+def _completion_kwargs(category_names, encoded_image):
+    # Use OpenAI Vision API to analyze the receipt
+    prompt = f"""
+            You are a receipt analyzer. Look at this receipt image and extract the following information:
+            1. Store/Platform name (if visible)
+            2. Total amount
+            3. List of items with:
+               - Item name
+               - Quantity
+               - Unit price
+               - Total price
+            
+            Also categorize each item into one of these categories: {', '.join(category_names)}
+            
+            Return the data in this exact JSON format:
+            {{
+                "platform": "store name",
+                "total_amount": "numeric total",
+                "items": [
+                    {{
+                        "name": "item name",
+                        "quantity": "numeric quantity",
+                        "unit_price": "numeric price",
+                        "total_price": "numeric total",
+                        "category": "one of the provided category names"
+                    }}
+                ]
+            }}
+
+            Make sure to:
+            1. Return ONLY the JSON, no other text
+            2. Use numeric values without currency symbols
+            3. Assign each item to the most appropriate category
+            4. If unsure about category, use "Others"
+            """
+    return {
+        'model': "gpt-4o",
+        'prompt_version': RECEIPT_PROMPT_VERSION,
+        'messages': [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{encoded_image}",
+                            "detail": "high"
+                        }
+                    }
+                ]
+            }
+        ],
+        'max_tokens': 4096,
+    }
+
+def _clean_response(structured_data):
+    # Clean the response from markdown formatting
+    if structured_data.startswith('```'):
+        # Remove the first line (```json) and the last line (```)
+        structured_data = '\n'.join(structured_data.split('\n')[1:-1])
+    return structured_data
+
+def _is_receipt_data(structured_data):
+    """Whether a model response parses as receipt data, so it may be cached."""
+    try:
+        data = json.loads(_clean_response(structured_data))
+    except ValueError:
+        return False
+    return isinstance(data, dict) and 'items' in data and 'total_amount' in data
+
+def _claim(receipt_id):
+    """
+    Mark the receipt processing, unless it is already being processed or
+    done. Returns the receipt, or None if there is nothing to do.
+    """
+    with transaction.atomic():
+        receipt = Receipt.objects.select_for_update().filter(
+            id=receipt_id, status__in=CLAIMABLE_STATUSES
+        ).select_related('user').first()
+        if receipt is None:
+            return None
+        receipt.status = 'processing'
+        receipt.claim_attempt += 1
+        receipt.save()
+    return receipt
+
+def _owns(receipt, attempt):
+    """
+    Whether claim ``attempt`` still stands. A stale receipt requeued and
+    claimed again by another run has a newer one; other saves to the receipt
+    leave it alone. Call inside a transaction, so the row stays locked until
+    the result is saved.
+    """
+    return Receipt.objects.select_for_update().filter(
+        id=receipt.id, status='processing', claim_attempt=attempt
+    ).exists()
+
+def _fail(receipt, attempt, error):
+    with transaction.atomic():
+        if _owns(receipt, attempt):
+            receipt.status = 'failed'
+            receipt.processed_data = {'error': error}
+            receipt.save()
+
+def _save_result(receipt, attempt, structured_data, category_dict):
+    """
+    Store the model response on the receipt and create its grocery items,
+    all or nothing, unless another run has claimed the receipt since.
+    """
+    print(f"Structured data: {structured_data}")
+    structured_data = _clean_response(structured_data)
+
+    with transaction.atomic():
+        if not _owns(receipt, attempt):
+            logger.warning(f"Receipt {receipt.id} was claimed by another run; discarding this result")
+            return
+
+        receipt.processed_data = structured_data
+        receipt.status = 'completed'
+
+        # Create GroceryItems from the processed data
+        try:
+            with transaction.atomic():
+                data = json.loads(structured_data)
+                receipt.total_amount = float(data['total_amount'])
+                receipt.save()
+
+                # Create grocery items with categories
+                for item in data['items']:
+                    category = category_dict.get(item['category'], category_dict['Others'])
+                    GroceryItem.objects.create(
+                        user=receipt.user,
+                        name=item['name'],
+                        quantity=float(item['quantity']),
+                        price=float(item['unit_price']),
+                        platform=data['platform'],
+                        category=category
+                    )
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error: {e}")
+            print(f"Received data: {structured_data}")
+            receipt.status = 'failed'
+            receipt.processed_data = {'error': f'Invalid JSON format: {str(e)}'}
+            receipt.save()
+        except Exception as e:
+            receipt.status = 'failed'
+            receipt.processed_data = {'error': str(e)}
+            print(f"Error in processing receipt: {e}")
+            receipt.save()
+
+def process_receipt(receipt_id):
+    """
+    Extract the receipt's items with the vision model and save them. Does
+    nothing if the receipt is already processing or done, so a receipt
+    delivered twice never creates its items twice.
+    """
+    receipt = _claim(receipt_id)
+    if receipt is None:
+        logger.info(f"Receipt {receipt_id} is already processed or in progress; skipping")
+        return
+    attempt = receipt.claim_attempt
+
+    try:
+        encoded_image = _encode_image(receipt.image.path)
+
+        # Get all available categories
+        categories = GroceryCategory.objects.all()
+        category_dict = {cat.name: cat for cat in categories}
+
+        structured_data = chat_completion(
+            **_completion_kwargs(list(category_dict), encoded_image),
+            # A receipt processed again (requeued, or failed and retried) gets a fresh response
+            use_cache=attempt == 1,
+            validate=_is_receipt_data,
+        )
+        _save_result(receipt, attempt, structured_data, category_dict)
+
+    except Exception as e:
+        print(f"Error in processing receipt: {e}")
+        _fail(receipt, attempt, str(e))
@@ -0,0 +1,90 @@
+import logging
+from datetime import timedelta
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import Receipt
+from ..data_versions import bump_user_version
+from ..sync.changelog import record_changes
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT_STATUSES = ('queued', 'processing')
+
+def _set_status(receipt_ids, from_status, to_status):
+    """Move receipts still in ``from_status`` to ``to_status``; returns the ids moved."""
+    moved = []
+    now = timezone.now()
+    for receipt_id in receipt_ids:
+        # Conditional per row, so concurrent dispatchers never claim the same receipt
+        if Receipt.objects.filter(id=receipt_id, status=from_status).update(status=to_status, updated_at=now):
+            moved.append(receipt_id)
+    return moved
+
+def _notify(receipt_ids):
+    # update() sends no signals
+    by_user = {}
+    for receipt_id, user_id in Receipt.objects.filter(id__in=receipt_ids).values_list('id', 'user_id'):
+        by_user.setdefault(user_id, []).append(receipt_id)
+    for user_id, ids in by_user.items():
+        bump_user_version(user_id)
+        record_changes(user_id, 'receipt', ids)
+
+def requeue_stale_receipts(stale_after, priority='batch'):
+    """
+    Return receipts of ``priority`` stuck in flight for ``stale_after``
+    seconds, e.g. after a worker crash or a lost message, to pending. Batch
+    receipts wait for the next dispatch; interactive ones, including uploads
+    whose task never arrived, must be sent again by the caller. If the old
+    run is in fact still going, its result is discarded once the receipt is
+    claimed again, so items are never created twice. Returns the ids requeued.
+    """
+    # Pending interactive receipts are waiting on a task of their own; they
+    # come first so receipts moved to pending below are not counted twice
+    statuses = (('pending',) if priority == 'interactive' else ()) + IN_FLIGHT_STATUSES
+    stale_ids = list(Receipt.objects.filter(
+        priority=priority, status__in=statuses,
+        updated_at__lt=timezone.now() - timedelta(seconds=stale_after)
+    ).values_list('id', flat=True))
+    requeued = [
+        receipt_id
+        for from_status in statuses
+        for receipt_id in _set_status(stale_ids, from_status, 'pending')
+    ]
+    if requeued:
+        logger.warning(f"Requeued {len(requeued)} stale {priority} receipts")
+        _notify(requeued)
+    return requeued
+
+def claim_batch_receipts(queue_depth):
+    """
+    Pick pending batch receipts to fill the batch queue up to ``queue_depth``
+    receipts in flight, and mark them queued. Returns their ids in dispatch
+    order.
+
+    Users take turns: each round gives every user with pending receipts one
+    slot, oldest receipt first. Receipts a user already has in flight count
+    as rounds taken, so a user who just had a share waits for the others.
+    """
+    in_flight = dict(
+        Receipt.objects.filter(priority='batch', status__in=IN_FLIGHT_STATUSES)
+        .values('user_id').annotate(count=Count('id')).order_by().values_list('user_id', 'count')
+    )
+    capacity = queue_depth - sum(in_flight.values())
+    if capacity <= 0:
+        return []
+
+    # No user can get more than the free capacity, so later receipts are not read
+    candidates = Receipt.objects.filter(priority='batch', status='pending').annotate(
+        position=Window(RowNumber(), partition_by=[F('user_id')], order_by=F('id').asc())
+    ).filter(position__lte=capacity).values_list('id', 'user_id', 'position')
+    ordered = sorted(
+        candidates,
+        key=lambda row: (row[2] + in_flight.get(row[1], 0), row[0])
+    )
+    claimed = _set_status([receipt_id for receipt_id, _, _ in ordered[:capacity]], 'pending', 'queued')
+    if claimed:
+        _notify(claimed)
+    return claimed
@@ -1,15 +1,16 @@
 from rest_framework import serializers
 from .models import Receipt, GroceryItem
+from ..sparse_fields import SparseFieldsetSerializerMixin
 
-class ReceiptSerializer(serializers.ModelSerializer):
+class ReceiptSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     image = serializers.ImageField(required=True, write_only=False)
     
     class Meta:
         model = Receipt
-        fields = ('id', 'user', 'image', 'platform', 'status', 'processed_text',
+        fields = ('id', 'user', 'image', 'platform', 'status', 'priority', 'processed_text',
                  'processed_data', 'total_amount', 'created_at', 'updated_at')
-        read_only_fields = ('status', 'processed_text', 'processed_data', 'total_amount',
+        read_only_fields = ('status', 'priority', 'processed_text', 'processed_data', 'total_amount',
                           'created_at', 'updated_at')
         extra_kwargs = {
             'platform': {
@@ -22,7 +23,7 @@ class ReceiptSerializer(serializers.ModelSerializer):
             }
         }
 
-class GroceryItemSerializer(serializers.ModelSerializer):
+class GroceryItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     category_name = serializers.CharField(source='category.name', read_only=True)
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
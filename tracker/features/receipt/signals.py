@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent after GroceryItems are inserted with bulk_create, which skips post_save.
+# Arguments: user, item_ids
+grocery_items_bulk_created = Signal()
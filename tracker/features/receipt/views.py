@@ -1,27 +1,46 @@
+import logging
+
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-import openai
-import base64
-import json
 from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
 from .models import Receipt, GroceryItem
 from .serializers import ReceiptSerializer, GroceryItemSerializer
-from ..category.models import GroceryCategory
+from .export import CSVRenderer, NDJSONRenderer, EXPORT_FORMATS, EXPORTERS, export_queryset
+from .importer import GroceryItemImporter, ImportFormatError, detect_format, IMPORT_FORMATS
+from ..search import search_grocery_items, SEARCH_RESULT_LIMIT, MAX_SEARCH_RESULT_LIMIT
+from ..pagination import KeysetPagination
+from ..sparse_fields import SparseFieldsetViewMixin
+from ..conditional import ConditionalGetViewMixin
+from ..throttling import JobThrottleViewMixin, SlidingWindowRateThrottle, job_throttles, release_job_slot
+from ...tasks import process_receipt_upload, dispatch_batch_receipts
+
+logger = logging.getLogger(__name__)
 
-class ReceiptViewSet(viewsets.ModelViewSet):
+class ReceiptViewSet(JobThrottleViewMixin, ConditionalGetViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing receipts and processing receipt images.
+
+    List responses default to a compact summary; use ``?fields=`` or
+    ``?omit=`` to choose the returned fields.
     """
     serializer_class = ReceiptSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    default_list_fields = ('id', 'platform', 'status', 'total_amount', 'created_at')
     parser_classes = (MultiPartParser, FormParser)
 
     @swagger_auto_schema(
-        operation_description="Upload and process a receipt image",
+        operation_description="Upload a receipt image. It is processed in the background; poll the "
+                              "receipt until its status is 'completed' or 'failed'.",
         manual_parameters=[
             openapi.Parameter(
                 'image',
@@ -41,12 +60,22 @@ class ReceiptViewSet(viewsets.ModelViewSet):
         responses={
             201: ReceiptSerializer(),
             400: 'Bad Request',
-            415: 'Unsupported Media Type'
+            415: 'Unsupported Media Type',
+            429: 'Too Many Requests'
         }
     )
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    def get_throttles(self):
+        # Every upload costs a vision model call
+        if self.action == 'create':
+            return job_throttles('receipt_upload')
+        if self.action == 'batch':
+            # Batch receipts are paced by the dispatcher, so only the uploads are limited
+            return [SlidingWindowRateThrottle('receipt_batch')]
+        return super().get_throttles()
+
     def get_queryset(self):
         """
         Returns receipts for the current user.
@@ -55,136 +84,186 @@ class ReceiptViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         receipt = serializer.save(user=self.request.user)
-        self.process_receipt(receipt.id)
-
-    @staticmethod
-    def process_receipt(receipt_id):
-        receipt = Receipt.objects.get(id=receipt_id)
-        receipt.status = 'processing'
-        receipt.save()
-
         try:
-            # Read the image file and encode it as base64
-            with open(receipt.image.path, 'rb') as image_file:
-                encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
-
-            # Get all available categories
-            categories = GroceryCategory.objects.all()
-            category_names = [cat.name for cat in categories]
-            category_dict = {cat.name: cat for cat in categories}
-
-            # Use OpenAI Vision API to analyze the receipt
-            prompt = f"""
-            You are a receipt analyzer. Look at this receipt image and extract the following information:
-            1. Store/Platform name (if visible)
-            2. Total amount
-            3. List of items with:
-               - Item name
-               - Quantity
-               - Unit price
-               - Total price
-            
-            Also categorize each item into one of these categories: {', '.join(category_names)}
-            
-            Return the data in this exact JSON format:
-            {{
-                "platform": "store name",
-                "total_amount": "numeric total",
-                "items": [
-                    {{
-                        "name": "item name",
-                        "quantity": "numeric quantity",
-                        "unit_price": "numeric price",
-                        "total_price": "numeric total",
-                        "category": "one of the provided category names"
-                    }}
-                ]
-            }}
-
-            Make sure to:
-            1. Return ONLY the JSON, no other text
-            2. Use numeric values without currency symbols
-            3. Assign each item to the most appropriate category
-            4. If unsure about category, use "Others"
-            """
-
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{encoded_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=4096
+            # The upload's job slot is released by the task when it finishes
+            process_receipt_upload.delay(receipt.id, job_slot=getattr(self.request, 'job_slot', None))
+        except Exception as e:
+            logger.error(f"Failed to queue processing of receipt {receipt.id}: {str(e)}", exc_info=True)
+            release_job_slot(getattr(self.request, 'job_slot', None))
+            self.request.job_slot = None
+            # Failed receipts can be requeued with `manage.py requeue_receipts`
+            receipt.status = 'failed'
+            receipt.processed_data = {'error': f'Failed to queue processing: {str(e)}'}
+            receipt.save()
+        else:
+            self.request.job_slot = None
+
+    @swagger_auto_schema(
+        operation_description="Upload many receipt images at once, e.g. to backfill history. "
+                              "Batch receipts are processed after interactive uploads, a few at "
+                              "a time, taking turns between users.",
+        manual_parameters=[
+            openapi.Parameter('images', openapi.IN_FORM, type=openapi.TYPE_ARRAY,
+                              items=openapi.Items(type=openapi.TYPE_FILE), required=True,
+                              description=f'Receipt image files (at most {settings.RECEIPT_BATCH_MAX_FILES})'),
+            openapi.Parameter('platform', openapi.IN_FORM, type=openapi.TYPE_STRING, required=True,
+                              description='Platform name (e.g., Zepto, Blinkit)'),
+        ],
+        responses={
+            202: ReceiptSerializer(many=True),
+            400: 'Bad Request',
+            429: 'Too Many Requests'
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Queue a batch of receipt images for background processing."""
+        images = request.FILES.getlist('images')
+        if not images:
+            return Response(
+                {'error': 'No images provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(images) > settings.RECEIPT_BATCH_MAX_FILES:
+            return Response(
+                {'error': f'Batches are limited to {settings.RECEIPT_BATCH_MAX_FILES} images.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-            structured_data = response.choices[0].message.content
-            print(f"Structured data: {structured_data}")
-            # Clean the response from markdown formatting
-            if structured_data.startswith('```'):
-                # Remove the first line (```json) and the last line (```)
-                structured_data = '\n'.join(structured_data.split('\n')[1:-1])
-            
-            receipt.processed_data = structured_data
-            receipt.status = 'completed'
-
-            # Create GroceryItems from the processed data
-            try:
-                data = json.loads(structured_data)
-                receipt.total_amount = float(data['total_amount'])
-                receipt.save()
-
-                # Create grocery items with categories
-                for item in data['items']:
-                    category = category_dict.get(item['category'], category_dict['Others'])
-                    GroceryItem.objects.create(
-                        user=receipt.user,
-                        name=item['name'],
-                        quantity=float(item['quantity']),
-                        price=float(item['unit_price']),
-                        platform=data['platform'],
-                        category=category
-                    )
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                print(f"Received data: {structured_data}")
-                receipt.status = 'failed'
-                receipt.processed_data = {'error': f'Invalid JSON format: {str(e)}'}
-                receipt.save()
-            except Exception as e:
-                receipt.status = 'failed'
-                receipt.processed_data = {'error': str(e)}
-                print(f"Error in processing receipt: {e}")
-                receipt.save()
+        fields = {'platform': request.data['platform']} if 'platform' in request.data else {}
+        receipt_serializers = [self.get_serializer(data={'image': image, **fields}) for image in images]
+        errors = {index: serializer.errors for index, serializer in enumerate(receipt_serializers)
+                  if not serializer.is_valid()}
+        if errors:
+            return Response(
+                {'error': 'Invalid images', 'images': errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        with transaction.atomic():
+            receipts = [serializer.save(user=request.user, priority='batch') for serializer in receipt_serializers]
+        try:
+            dispatch_batch_receipts.delay()
         except Exception as e:
-            receipt.status = 'failed'
-            receipt.processed_data = {'error': str(e)}
-            print(f"Error in processing receipt: {e}")
-            receipt.save()
+            # The periodic dispatch picks the receipts up once the broker is back
+            logger.warning(f"Failed to queue batch receipt dispatch: {str(e)}")
+
+        serializer = self.get_serializer(receipts, many=True)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-class GroceryItemViewSet(viewsets.ModelViewSet):
+class GroceryItemViewSet(ConditionalGetViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing grocery items.
     """
     serializer_class = GroceryItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    sparse_field_dependencies = {'total_price': ('price', 'quantity')}
 
     def get_queryset(self):
         """
         Returns grocery items for the current user.
         """
-        return GroceryItem.objects.filter(user=self.request.user)
+        return GroceryItem.objects.filter(user=self.request.user).select_related('category')
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user) 
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+    @swagger_auto_schema(
+        operation_description="Search the user's grocery items by name. Matches prefixes and "
+                              "tolerates typos; results are ranked by relevance and recency.",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description='Search text'),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'Maximum results (default {SEARCH_RESULT_LIMIT}, '
+                                          f'max {MAX_SEARCH_RESULT_LIMIT})'),
+        ],
+        responses={
+            200: GroceryItemSerializer(many=True),
+            400: 'Bad Request',
+        }
+    )
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search over grocery item names."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': "The 'q' parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_RESULT_LIMIT))
+        except ValueError:
+            return Response(
+                {'error': 'Invalid limit parameter. Expected an integer.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, MAX_SEARCH_RESULT_LIMIT))
+
+        items = search_grocery_items(request.user, query, limit=limit)
+        serializer = self.get_serializer(items, many=True)
+        return Response(serializer.data)
+
+    @swagger_auto_schema(
+        operation_description="Stream the user's full grocery history as CSV or NDJSON "
+                              "(one JSON object per line), oldest first.",
+        manual_parameters=[
+            openapi.Parameter('format', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              enum=list(EXPORT_FORMATS), description="'csv' (default) or 'ndjson'"),
+        ],
+        responses={200: 'Export file'}
+    )
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """Stream all grocery items of the user without loading them into memory."""
+        export_format = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            EXPORTERS[export_format](export_queryset(request.user)),
+            content_type=f'{EXPORT_FORMATS[export_format]}; charset=utf-8'
+        )
+        filename = f"grocery-items-{timezone.now().strftime('%Y%m%d')}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response 
+
+    @swagger_auto_schema(
+        operation_description="Import grocery items from a CSV or NDJSON file with the columns "
+                              "name, price, quantity, platform and optionally unit, category and "
+                              "created_at. Valid rows are inserted in batches; invalid rows are "
+                              "skipped and listed in the response.",
+        manual_parameters=[
+            openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True,
+                              description='.csv or .ndjson file'),
+            openapi.Parameter('format', openapi.IN_FORM, type=openapi.TYPE_STRING, enum=list(IMPORT_FORMATS),
+                              description='File format (default: from the file extension)'),
+        ],
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'imported': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'failed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'errors': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                }
+            ),
+            400: 'Bad Request',
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_items(self, request):
+        """Bulk import grocery items from an uploaded file."""
+        uploaded_file = request.FILES.get('file')
+        if uploaded_file is None:
+            return Response(
+                {'error': 'No file provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            import_format = detect_format(uploaded_file.name, request.data.get('format'))
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = GroceryItemImporter(request.user).run(uploaded_file, import_format)
+        return Response(report)
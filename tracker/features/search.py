@@ -0,0 +1,180 @@
+import math
+import re
+from datetime import timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .receipt.models import GroceryItem
+
+SEARCH_RESULT_LIMIT = 20
+MAX_SEARCH_RESULT_LIMIT = 100
+# Rows fetched from the text index before ranking
+CANDIDATE_LIMIT = 200
+# Share of the query's trigrams a name must contain to match
+MIN_SIMILARITY = 0.5
+# Queries with only one- or two-letter words scan this many of the user's latest items
+PREFIX_SCAN_ROWS = 5000
+RECENCY_WEIGHT = 0.15
+RECENCY_HALF_LIFE_DAYS = 30
+
+FTS_TABLE = 'tracker_groceryitem_fts'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def query_words(query):
+    return _WORD_RE.findall(query.lower())
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+def similarity(words, name):
+    """
+    Fraction of the query's trigrams found in ``name``, so a typo costs only
+    the trigrams it touches. Words shorter than three characters must appear
+    as a prefix of a word in the name.
+    """
+    name = name.lower()
+    name_words = _WORD_RE.findall(name)
+    matched = total = 0
+    for word in words:
+        grams = trigrams(word)
+        if grams:
+            matched += sum(gram in name for gram in grams)
+            total += len(grams)
+        else:
+            matched += any(name_word.startswith(word) for name_word in name_words)
+            total += 1
+    return matched / total if total else 0.0
+
+def _score(words, name, created_at, now):
+    score = similarity(words, name)
+    if score < MIN_SIMILARITY:
+        return None
+    name_words = _WORD_RE.findall(name.lower())
+    if all(any(name_word.startswith(word) for name_word in name_words) for word in words):
+        score += 0.25
+    age_days = max((now - created_at).total_seconds() / 86400, 0)
+    return score + RECENCY_WEIGHT * math.exp(-age_days * math.log(2) / RECENCY_HALF_LIFE_DAYS)
+
+class SearchBackend:
+    """Finds candidate grocery items for a query using a database text index."""
+
+    def candidates(self, user_id, words, limit):
+        """Return up to ``limit`` ``(id, name, created_at)`` rows, best first."""
+        raise NotImplementedError
+
+    def _prefix_candidates(self, user_id, words, limit):
+        # Words too short for a trigram index: prefix scan over the user's recent rows
+        recent = GroceryItem.objects.filter(user_id=user_id).order_by('-created_at', '-id')
+        queryset = GroceryItem.objects.filter(id__in=recent.values('id')[:PREFIX_SCAN_ROWS])
+        for word in words:
+            queryset = queryset.filter(Q(name__istartswith=word) | Q(name__icontains=f' {word}'))
+        return list(queryset.order_by('-created_at', '-id').values_list('id', 'name', 'created_at')[:limit])
+
+def _fragments(word):
+    """
+    Two substrings of at least three characters covering ``word``. A single
+    typo leaves one of them intact.
+    """
+    if len(word) < 6:
+        return {word[:3], word[-3:]}
+    middle = (len(word) + 1) // 2
+    return {word[:middle], word[middle:]}
+
+def _phrase(text):
+    return '"{}"'.format(text.replace('"', '""'))
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 table with the trigram tokenizer, kept in sync by triggers. The owner
+    is indexed as a ``#<user_id>#`` token so the user filter is part of the match.
+
+    Exact substring matches are tried first; if there are too few, words are
+    matched on fragments so that misspelled names are still found.
+    """
+
+    def _match(self, user_id, expression, limit):
+        with connection.cursor() as cursor:
+            # ORDER BY rowid lets FTS5 stop after ``limit`` rows instead of sorting every match
+            cursor.execute(
+                f"SELECT item.id, item.name, item.created_at "
+                f"FROM {FTS_TABLE} JOIN tracker_groceryitem AS item ON item.id = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s ORDER BY {FTS_TABLE}.rowid DESC LIMIT %s",
+                [f'user_key : "#{int(user_id)}#" AND name : ({expression})', limit]
+            )
+            rows = cursor.fetchall()
+        # Raw cursors return SQLite timestamps as naive UTC datetimes
+        return [
+            (item_id, name, created_at if timezone.is_aware(created_at)
+             else timezone.make_aware(created_at, dt_timezone.utc))
+            for item_id, name, created_at in rows
+        ]
+
+    def candidates(self, user_id, words, limit):
+        indexed = [word for word in words if len(word) >= 3]
+        if not indexed:
+            return self._prefix_candidates(user_id, words, limit)
+
+        rows = self._match(user_id, ' AND '.join(_phrase(word) for word in indexed), limit)
+        if len(rows) >= SEARCH_RESULT_LIMIT:
+            return rows
+        fragments = sorted(set().union(*(_fragments(word) for word in indexed)))
+        fuzzy = self._match(user_id, ' OR '.join(_phrase(fragment) for fragment in fragments), limit)
+        seen = {row[0] for row in rows}
+        return rows + [row for row in fuzzy if row[0] not in seen]
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    pg_trgm word similarity for typos and a ``simple`` tsvector for prefixes,
+    both served by GIN indexes that lead with ``user_id``.
+    """
+
+    def candidates(self, user_id, words, limit):
+        text = ' '.join(words)
+        prefix_query = ' & '.join(f'{word}:*' for word in words)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, name, created_at FROM tracker_groceryitem "
+                "WHERE user_id = %s AND (%s <%% name "
+                "OR to_tsvector('simple', name) @@ to_tsquery('simple', %s)) "
+                "ORDER BY word_similarity(%s, name) DESC, created_at DESC LIMIT %s",
+                [user_id, text, prefix_query, text, limit]
+            )
+            return cursor.fetchall()
+
+class FallbackSearchBackend(SearchBackend):
+    """Unindexed prefix matching for other databases"""
+
+    def candidates(self, user_id, words, limit):
+        return self._prefix_candidates(user_id, words, limit)
+
+def get_search_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+def search_grocery_items(user, query, limit=SEARCH_RESULT_LIMIT):
+    """
+    Return the user's grocery items matching ``query``, ranked by text
+    relevance with a boost for recent purchases.
+    """
+    words = query_words(query)
+    if not words:
+        return []
+    rows = get_search_backend().candidates(user.pk, words, CANDIDATE_LIMIT)
+
+    now = timezone.now()
+    scored = []
+    for item_id, name, created_at in rows:
+        score = _score(words, name, created_at, now)
+        if score is not None:
+            scored.append((score, item_id))
+    scored.sort(reverse=True)
+    ids = [item_id for _, item_id in scored[:limit]]
+
+    items = GroceryItem.objects.select_related('category').in_bulk(ids)
+    return [items[item_id] for item_id in ids if item_id in items]
@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ShoppingListItem
+from .serializers import BulkShoppingListItemSerializer
+from ..category.models import GroceryCategory
+from ..catalog.prices import fill_estimated_prices
+from ..sync.changelog import record_changes
+
+BULK_OPERATIONS = ('create', 'update', 'delete')
+MAX_BULK_OPERATIONS = 500
+
+class BulkOperationError(Exception):
+    def __init__(self, errors):
+        super().__init__('Invalid operations')
+        # {operation index: error}
+        self.errors = errors
+
+def _validate(shopping_list, operations):
+    if not isinstance(operations, list) or not operations:
+        raise BulkOperationError({'operations': 'Expected a non-empty list of operations.'})
+    if len(operations) > MAX_BULK_OPERATIONS:
+        raise BulkOperationError({'operations': f'At most {MAX_BULK_OPERATIONS} operations are allowed.'})
+
+    errors = {}
+    item_ids = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BULK_OPERATIONS:
+            errors[index] = f"Expected an object with 'op' set to one of: {', '.join(BULK_OPERATIONS)}."
+        elif operation['op'] != 'create':
+            item_id = operation.get('id')
+            if not isinstance(item_id, int):
+                errors[index] = "An integer 'id' is required."
+            elif item_id in item_ids:
+                errors[index] = f'Item {item_id} appears in more than one operation.'
+            else:
+                item_ids.add(item_id)
+    if errors:
+        raise BulkOperationError(errors)
+
+    items = {item.id: item for item in shopping_list.items.filter(id__in=item_ids)}
+    validated = []
+    category_ids = set()
+    for index, operation in enumerate(operations):
+        item = None
+        if operation['op'] != 'create':
+            item = items.get(operation['id'])
+            if item is None:
+                errors[index] = f"Item {operation['id']} is not in this shopping list."
+                continue
+        data = None
+        if operation['op'] != 'delete':
+            serializer = BulkShoppingListItemSerializer(
+                item, data=operation.get('data') or {}, partial=operation['op'] == 'update'
+            )
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+            data = serializer.validated_data
+            if data.get('category_id') is not None:
+                category_ids.add(data['category_id'])
+        validated.append((index, operation['op'], item, data))
+
+    if category_ids:
+        existing = set(GroceryCategory.objects.filter(id__in=category_ids).values_list('id', flat=True))
+        for index, _, _, data in validated:
+            if data and data.get('category_id') is not None and data['category_id'] not in existing:
+                errors[index] = {'category': [f"Invalid pk \"{data['category_id']}\" - object does not exist."]}
+    if errors:
+        raise BulkOperationError(errors)
+    return validated
+
+def apply_item_operations(shopping_list, operations):
+    """
+    Validate and apply a list of create/update/delete operations to the
+    items of ``shopping_list`` in one transaction.
+
+    Each operation is ``{"op": "create", "data": {...}}``,
+    ``{"op": "update", "id": 1, "data": {...}}`` or ``{"op": "delete", "id": 1}``.
+    Nothing is written if any operation is invalid.
+    """
+    validated = _validate(shopping_list, operations)
+    user_id = shopping_list.user_id
+
+    now = timezone.now()
+    creates, updates, delete_ids = [], [], []
+    update_fields = set()
+    for _, op, item, data in validated:
+        if op == 'create':
+            creates.append(ShoppingListItem(shopping_list=shopping_list, **data))
+        elif op == 'update':
+            for field, value in data.items():
+                setattr(item, field, value)
+            item.updated_at = now
+            update_fields.update(data)
+            updates.append(item)
+        else:
+            delete_ids.append(item.id)
+
+    unpriced = [item for item in updates if item.estimated_price is None]
+    fill_estimated_prices(user_id, creates + unpriced)
+    if any(item.estimated_price is not None for item in unpriced):
+        update_fields.add('estimated_price')
+
+    with transaction.atomic():
+        if delete_ids:
+            # Nothing references list items, so one DELETE without the
+            # per-row collector and signals is safe; the list save below
+            # bumps the ETag version
+            deleted = ShoppingListItem.objects.filter(id__in=delete_ids)
+            deleted._raw_delete(deleted.db)
+            record_changes(user_id, 'shopping_list_item', delete_ids, action='delete')
+        if updates and update_fields:
+            # bulk_update and bulk_create send no signals
+            ShoppingListItem.objects.bulk_update(updates, list(update_fields) + ['updated_at'])
+            record_changes(user_id, 'shopping_list_item', [item.id for item in updates])
+        if creates:
+            creates = ShoppingListItem.objects.bulk_create(creates)
+            record_changes(user_id, 'shopping_list_item', [item.id for item in creates])
+        # Touch the list once, which also invalidates its ETag
+        shopping_list.save(update_fields=['updated_at'])
+
+    return {'created': len(creates), 'updated': len(updates), 'deleted': len(delete_ids)}
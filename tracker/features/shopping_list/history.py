@@ -0,0 +1,257 @@
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Avg, Max, Min
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from itertools import chain
+
+from ..receipt.models import GroceryItem
+from ..catalog.models import Product
+from .models import PurchaseHistoryFeature
+
+# Purchase history window covered by the feature table
+HISTORY_WINDOW_DAYS = 90
+
+# Number of users aggregated per query during the nightly rebuild
+REBUILD_CHUNK_SIZE = 500
+
+def _mean_interval_days(first_purchased, last_purchased, purchase_count):
+    if purchase_count < 2:
+        return None
+    return (last_purchased - first_purchased).total_seconds() / 86400 / (purchase_count - 1)
+
+def _merge_rows(a, b):
+    # Combine two aggregate rows for the same feature (a product name also used unlinked)
+    count = a['purchase_count'] + b['purchase_count']
+    return {
+        **a,
+        'category_id': a['category_id'] or b['category_id'],
+        'purchase_count': count,
+        'avg_quantity': (Decimal(str(a['avg_quantity'])) * a['purchase_count']
+                         + Decimal(str(b['avg_quantity'])) * b['purchase_count']) / count,
+        'avg_price': (Decimal(str(a['avg_price'])) * a['purchase_count']
+                      + Decimal(str(b['avg_price'])) * b['purchase_count']) / count,
+        'first_purchased': min(a['first_purchased'], b['first_purchased']),
+        'last_purchased': max(a['last_purchased'], b['last_purchased']),
+    }
+
+def record_purchase(item):
+    """
+    Incrementally fold a newly created GroceryItem into the user's feature row.
+    """
+    quantity = Decimal(str(item.quantity))
+    price = Decimal(str(item.price))
+    purchased_at = item.created_at or timezone.now()
+    # Differently worded names of one product share a feature row
+    name = item.product.name if item.product_id else item.name
+
+    # The first purchase of a name can race with another: the losing insert
+    # rolls back to its savepoint and is folded into the row that won
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                _fold_purchase(item, name, quantity, price, purchased_at)
+            return
+        except IntegrityError:
+            if attempt:
+                raise
+
+def _fold_purchase(item, name, quantity, price, purchased_at):
+    feature = PurchaseHistoryFeature.objects.select_for_update().filter(
+        user_id=item.user_id, name=name, unit=item.unit
+    ).first()
+
+    if feature is None:
+        PurchaseHistoryFeature.objects.create(
+            user_id=item.user_id,
+            name=name,
+            unit=item.unit,
+            category_id=item.category_id,
+            purchase_count=1,
+            avg_quantity=quantity,
+            avg_price=price,
+            first_purchased=purchased_at,
+            last_purchased=purchased_at
+        )
+        return
+
+    count = feature.purchase_count
+    feature.avg_quantity = (feature.avg_quantity * count + quantity) / (count + 1)
+    feature.avg_price = (feature.avg_price * count + price) / (count + 1)
+    feature.purchase_count = count + 1
+    feature.first_purchased = min(feature.first_purchased, purchased_at)
+    feature.last_purchased = max(feature.last_purchased, purchased_at)
+    feature.mean_interval_days = _mean_interval_days(
+        feature.first_purchased, feature.last_purchased, feature.purchase_count
+    )
+    if item.category_id:
+        feature.category_id = item.category_id
+    feature.save()
+
+def _purchase_row(item, name):
+    created_at = item.created_at
+    return {
+        'user_id': item.user_id,
+        'name': name,
+        'unit': item.unit,
+        'category_id': item.category_id,
+        'purchase_count': 1,
+        'avg_quantity': Decimal(str(item.quantity)),
+        'avg_price': Decimal(str(item.price)),
+        'first_purchased': created_at,
+        'last_purchased': created_at,
+    }
+
+def record_purchases(items):
+    """
+    Fold a batch of newly created GroceryItems into their users' feature
+    rows, as ``record_purchase`` does one at a time. The batch is aggregated
+    in memory first, so it costs a few queries however many items it has.
+    Items older than the history window are left out, as in the rebuild.
+    """
+    start_date = timezone.now() - timedelta(days=HISTORY_WINDOW_DAYS)
+    items = [item for item in items if item.created_at >= start_date]
+    if not items:
+        return
+    product_names = dict(
+        Product.objects.filter(id__in={item.product_id for item in items if item.product_id})
+        .values_list('id', 'name')
+    )
+    rows = {}
+    for item in items:
+        row = _purchase_row(item, product_names.get(item.product_id, item.name))
+        key = (row['user_id'], row['name'], row['unit'])
+        rows[key] = _merge_rows(rows[key], row) if key in rows else row
+
+    # As in record_purchase, a feature row created concurrently is merged on retry
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                _fold_purchases(rows)
+            return
+        except IntegrityError:
+            if attempt:
+                raise
+
+def _fold_purchases(rows):
+    existing = {
+        (feature.user_id, feature.name, feature.unit): feature
+        for feature in PurchaseHistoryFeature.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _, _ in rows}, name__in={name for _, name, _ in rows}
+        )
+    }
+    cents = Decimal('0.01')
+    creates, updates = [], []
+    for key, row in rows.items():
+        feature = existing.get(key)
+        if feature is None:
+            feature = PurchaseHistoryFeature(user_id=row['user_id'], name=row['name'], unit=row['unit'])
+            creates.append(feature)
+        else:
+            category_id = row['category_id'] or feature.category_id
+            row = _merge_rows(row, {
+                'category_id': feature.category_id,
+                'purchase_count': feature.purchase_count,
+                'avg_quantity': feature.avg_quantity,
+                'avg_price': feature.avg_price,
+                'first_purchased': feature.first_purchased,
+                'last_purchased': feature.last_purchased,
+            })
+            row['category_id'] = category_id
+            # bulk_update() does not apply auto_now
+            feature.updated_at = timezone.now()
+            updates.append(feature)
+        feature.category_id = row['category_id']
+        feature.purchase_count = row['purchase_count']
+        feature.avg_quantity = Decimal(str(row['avg_quantity'])).quantize(cents)
+        feature.avg_price = Decimal(str(row['avg_price'])).quantize(cents)
+        feature.first_purchased = row['first_purchased']
+        feature.last_purchased = row['last_purchased']
+        feature.mean_interval_days = _mean_interval_days(
+            row['first_purchased'], row['last_purchased'], row['purchase_count']
+        )
+    PurchaseHistoryFeature.objects.bulk_create(creates, batch_size=1000)
+    PurchaseHistoryFeature.objects.bulk_update(updates, [
+        'category_id', 'purchase_count', 'avg_quantity', 'avg_price',
+        'first_purchased', 'last_purchased', 'mean_interval_days', 'updated_at'
+    ], batch_size=1000)
+
+def rebuild_purchase_history(user_ids):
+    """
+    Recompute the feature rows of ``user_ids`` from their GroceryItems, grouped
+    by product where items are linked to one and by name otherwise. Returns
+    the number of feature rows written.
+    """
+    start_date = timezone.now() - timedelta(days=HISTORY_WINDOW_DAYS)
+    items = GroceryItem.objects.filter(user_id__in=user_ids, created_at__gte=start_date)
+    aggregates = dict(
+        category_id=Max('category_id'),
+        purchase_count=Count('id'),
+        avg_quantity=Avg('quantity'),
+        avg_price=Avg('price'),
+        first_purchased=Min('created_at'),
+        last_purchased=Max('created_at')
+    )
+    # Items linked to a product are grouped on the integer product id
+    product_rows = list(
+        items.filter(product__isnull=False).values('user_id', 'product_id', 'unit')
+        .annotate(**aggregates).order_by()
+    )
+    product_names = dict(
+        Product.objects.filter(id__in={row['product_id'] for row in product_rows}).values_list('id', 'name')
+    )
+    for row in product_rows:
+        row['name'] = product_names[row['product_id']]
+    name_rows = items.filter(product__isnull=True).values('user_id', 'name', 'unit').annotate(
+        **aggregates
+    ).order_by()
+
+    merged = {}
+    for row in chain(product_rows, name_rows):
+        key = (row['user_id'], row['name'], row['unit'])
+        merged[key] = _merge_rows(merged[key], row) if key in merged else row
+
+    cents = Decimal('0.01')
+    features = [
+        PurchaseHistoryFeature(
+            user_id=row['user_id'],
+            name=row['name'],
+            unit=row['unit'],
+            category_id=row['category_id'],
+            purchase_count=row['purchase_count'],
+            avg_quantity=Decimal(str(row['avg_quantity'])).quantize(cents),
+            avg_price=Decimal(str(row['avg_price'])).quantize(cents),
+            first_purchased=row['first_purchased'],
+            last_purchased=row['last_purchased'],
+            mean_interval_days=_mean_interval_days(
+                row['first_purchased'], row['last_purchased'], row['purchase_count']
+            )
+        )
+        for row in merged.values()
+    ]
+
+    with transaction.atomic():
+        PurchaseHistoryFeature.objects.filter(user_id__in=user_ids).delete()
+        PurchaseHistoryFeature.objects.bulk_create(features, batch_size=1000)
+    return len(features)
+
+def rebuild_all_purchase_history(chunk_size=REBUILD_CHUNK_SIZE, lease=None):
+    """
+    Rebuild the feature table for every user, ``chunk_size`` users at a time.
+    Stops between chunks if ``lease`` is lost, since another node is then
+    free to start over. Returns ``(users_processed, features_written)``.
+    """
+    users_processed = 0
+    features_written = 0
+    last_id = 0
+    while not (lease and lease.lost):
+        user_ids = list(
+            User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            break
+        features_written += rebuild_purchase_history(user_ids)
+        users_processed += len(user_ids)
+        last_id = user_ids[-1]
+    return users_processed, features_written
@@ -8,10 +8,12 @@ from ..budget.models import Budget
 
 class ShoppingList(models.Model):
     STATUS_CHOICES = [
+        ('generating', 'Generating'),
         ('draft', 'Draft'),
         ('active', 'Active'),
         ('completed', 'Completed'),
-        ('archived', 'Archived')
+        ('archived', 'Archived'),
+        ('failed', 'Failed')
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shopping_lists')
@@ -27,6 +29,9 @@ class ShoppingList(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='shoppinglist_user_created_idx'),
+        ]
 
 class ShoppingListItem(models.Model):
     PRIORITY_CHOICES = [
@@ -53,4 +58,58 @@ class ShoppingListItem(models.Model):
         return f"{self.name} ({self.quantity} {self.unit})"
 
     class Meta:
-        ordering = ['-priority', 'name'] 
\ No newline at end of file
+        ordering = ['-priority', 'name']
+
+class ShoppingListGenerationJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('retrying', 'Retrying'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+
+    shopping_list = models.OneToOneField(ShoppingList, on_delete=models.CASCADE, related_name='generation_job')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shopping_list_jobs')
+    task_id = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    options = models.JSONField(default=dict, blank=True)  # Parameters the list was requested with
+    attempts = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Generation job {self.id} for list {self.shopping_list_id} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+
+class PurchaseHistoryFeature(models.Model):
+    """
+    Precomputed per-user purchase statistics for one item, read by the smart
+    shopping list generator instead of aggregating GroceryItem on every call.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchase_history_features')
+    name = models.CharField(max_length=200)
+    category = models.ForeignKey(GroceryCategory, on_delete=models.SET_NULL, null=True, related_name='+')
+    unit = models.CharField(max_length=50, default='piece')
+    purchase_count = models.PositiveIntegerField(default=0)
+    avg_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    avg_price = models.DecimalField(max_digits=10, decimal_places=2)
+    first_purchased = models.DateTimeField()
+    last_purchased = models.DateTimeField()
+    mean_interval_days = models.FloatField(null=True, blank=True)  # Mean days between purchases
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.unit}) - {self.purchase_count} purchases"
+
+    class Meta:
+        unique_together = ['user', 'name', 'unit']
+        indexes = [
+            models.Index(fields=['user', '-purchase_count'], name='purchasefeature_user_count_idx'),
+        ]
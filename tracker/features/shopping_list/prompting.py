@@ -0,0 +1,153 @@
+import json
+import math
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List
+
+from django.conf import settings
+
+from .replenishment import ReplenishmentCandidate
+
+# Bump when the prompt changes so cached model responses are not reused
+SHOPPING_LIST_PROMPT_VERSION = 'shopping-list-v2'
+
+# Rough characters-per-token ratio for GPT-4 class tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+SYSTEM_PROMPT = """You are a smart shopping assistant that helps users create optimized grocery lists.
+The items due for replenishment have already been selected from the user's purchase history,
+with quantities, estimated prices and priorities computed from past purchases.
+Candidates are given as a pipe-separated table; items that did not fit are summarized per category.
+For the candidate items in the table:
+1. Suggest a name for the shopping list
+2. Include a brief note about why each item is suggested
+3. Assign each item to a category
+4. Give shopping tips that help the user stay within budget constraints
+Only return items from the candidate table, keeping their names unchanged.
+If there are no candidates, suggest a short list of common staples instead.
+
+Return the response in this exact JSON format:
+{
+    "list_name": "suggested name based on current month/season",
+    "items": [
+        {
+            "name": "item name",
+            "category": "category name",
+            "quantity": numeric quantity,
+            "unit": "unit of measurement",
+            "estimated_price": numeric price,
+            "priority": "low/medium/high",
+            "notes": "reason for suggestion"
+        }
+    ],
+    "total_estimated_cost": numeric total,
+    "suggestions": ["list of shopping tips based on analysis"]
+}"""
+
+# Maximum number of per-category summary lines for items that do not fit in the table
+MAX_SUMMARY_LINES = 12
+
+TABLE_HEADER = "name|category|qty|unit|price|priority|times_bought|every_days|last_bought"
+
+def estimate_tokens(text):
+    """Estimate the number of model tokens in ``text``."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+@dataclass
+class ShoppingListPrompt:
+    messages: list
+    prompt_tokens: int
+    candidates: List[ReplenishmentCandidate] = field(default_factory=list)
+    # Due items only described by the per-category summary lines
+    summarized: List[ReplenishmentCandidate] = field(default_factory=list)
+
+    @property
+    def summarized_count(self):
+        return len(self.summarized)
+
+class ShoppingListPromptBuilder:
+    """
+    Build the shopping list prompt within a fixed token budget.
+
+    Candidates arrive ranked by urgency. As many as fit are encoded one row
+    each in a compact table; the long tail is collapsed into one summary line
+    per category, so the prompt size stays flat as a user's history grows.
+    """
+
+    def __init__(self, token_budget=None):
+        self.token_budget = token_budget or settings.SHOPPING_LIST_PROMPT_TOKEN_BUDGET
+
+    def _row(self, candidate):
+        return "|".join([
+            candidate.name.replace("|", "/"),
+            (candidate.category_name or "").replace("|", "/"),
+            f"{candidate.quantity.normalize():f}",
+            candidate.unit,
+            f"{candidate.estimated_price:f}",
+            candidate.priority,
+            str(candidate.purchase_count),
+            f"{candidate.cadence_days:.0f}",
+            candidate.last_purchased.date().isoformat(),
+        ])
+
+    def _summaries(self, candidates):
+        groups = OrderedDict()
+        for candidate in candidates:
+            category = candidate.category_name or "Uncategorized"
+            count, cost = groups.get(category, (0, 0))
+            groups[category] = (count + 1, cost + candidate.estimated_price * candidate.quantity)
+        ordered = sorted(groups.items(), key=lambda group: -group[1][0])
+        if len(ordered) > MAX_SUMMARY_LINES:
+            head, tail = ordered[:MAX_SUMMARY_LINES - 1], ordered[MAX_SUMMARY_LINES - 1:]
+            ordered = head + [("Other categories", (
+                sum(count for _, (count, _) in tail),
+                sum(cost for _, (_, cost) in tail)
+            ))]
+        return [
+            f"{category}: {count} more items, about {cost:.2f} total"
+            for category, (count, cost) in ordered
+        ]
+
+    def _user_content(self, rows, summaries, budget_info):
+        table = "\n".join([TABLE_HEADER] + rows) if rows else "(none)"
+        content = f"Candidate Items:\n{table}\n"
+        if summaries:
+            content += "Other Items Due (summarized):\n" + "\n".join(summaries) + "\n"
+        content += f"Budget Information: {json.dumps(budget_info) if budget_info else 'No budget set'}\n"
+        content += "Please generate a smart shopping list from the candidate table."
+        return content
+
+    def build(self, candidates, budget_info=None):
+        """Return a :class:`ShoppingListPrompt` that fits the token budget."""
+        base_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(
+            self._user_content([], [], budget_info)
+        )
+        tail_summaries = self._summaries(candidates)
+        # Keep room for the category summaries of whatever does not fit in the table
+        available = self.token_budget - base_tokens - estimate_tokens("\n".join(tail_summaries))
+        available -= estimate_tokens(TABLE_HEADER)
+
+        rows = []
+        for candidate in candidates:
+            row = self._row(candidate)
+            row_tokens = estimate_tokens(row) + 1
+            if row_tokens > available:
+                break
+            rows.append(row)
+            available -= row_tokens
+
+        included = candidates[:len(rows)]
+        remaining = candidates[len(rows):]
+        summaries = self._summaries(remaining)
+
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": self._user_content(rows, summaries, budget_info)},
+        ]
+        prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        return ShoppingListPrompt(
+            messages=messages,
+            prompt_tokens=prompt_tokens,
+            candidates=included,
+            summarized=remaining,
+        )
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import ShoppingList, ShoppingListItem
+from .models import ShoppingList, ShoppingListItem, ShoppingListGenerationJob
+from ..sparse_fields import SparseFieldsetSerializerMixin
 
 class ShoppingListItemSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -11,8 +12,23 @@ class ShoppingListItemSerializer(serializers.ModelSerializer):
                  'last_purchase_date', 'notes', 'created_at', 'updated_at')
         read_only_fields = ('purchase_frequency', 'last_purchase_date', 'created_at', 'updated_at')
 
-class ShoppingListSerializer(serializers.ModelSerializer):
+class BulkShoppingListItemSerializer(ShoppingListItemSerializer):
+    """
+    Validates one item of a bulk operation. The category is taken as a plain
+    id so that all ids in a request can be checked with a single query.
+    """
+    category = serializers.IntegerField(source='category_id', allow_null=True, required=False)
+
+class ShoppingListGenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShoppingListGenerationJob
+        fields = ('id', 'status', 'attempts', 'prompt_tokens', 'error', 'started_at', 'finished_at',
+                 'created_at', 'updated_at')
+        read_only_fields = fields
+
+class ShoppingListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     items = ShoppingListItemSerializer(many=True, read_only=True)
+    generation_job = ShoppingListGenerationJobSerializer(read_only=True)
     total_estimated_cost = serializers.SerializerMethodField()
     total_items = serializers.SerializerMethodField()
     completed_items = serializers.SerializerMethodField()
@@ -22,17 +38,24 @@ class ShoppingListSerializer(serializers.ModelSerializer):
         model = ShoppingList
         fields = ('id', 'user', 'name', 'status', 'budget', 'notes',
                  'items', 'total_estimated_cost', 'total_items',
-                 'completed_items', 'created_at', 'updated_at')
+                 'completed_items', 'generation_job', 'created_at', 'updated_at')
         read_only_fields = ('created_at', 'updated_at')
 
     def get_total_estimated_cost(self, obj):
+        # Lists from ShoppingListViewSet.get_queryset carry these totals as SQL annotations
+        if hasattr(obj, 'annotated_total_estimated_cost'):
+            return obj.annotated_total_estimated_cost
         return sum(
             (item.estimated_price or 0) * item.quantity 
             for item in obj.items.all()
         )
 
     def get_total_items(self, obj):
+        if hasattr(obj, 'annotated_total_items'):
+            return obj.annotated_total_items
         return obj.items.count()
 
     def get_completed_items(self, obj):
-        return obj.items.filter(is_purchased=True).count() 
\ No newline at end of file
+        if hasattr(obj, 'annotated_completed_items'):
+            return obj.annotated_completed_items
+        return obj.items.filter(is_purchased=True).count()
@@ -1,39 +1,25 @@
-import openai
-from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Count, Avg, Max
-from datetime import timedelta
 import json
+import logging
 
 from ..category.models import GroceryCategory
 from ..budget.models import Budget
-from ..receipt.models import GroceryItem
 from .models import ShoppingList, ShoppingListItem
+from .replenishment import ReplenishmentEngine
+from .prompting import ShoppingListPromptBuilder, SHOPPING_LIST_PROMPT_VERSION
+from ..llm import chat_completion, achat_completion
+from ..data_versions import bump_global_version
+from ..sync.changelog import record_changes
+from ..catalog.prices import fill_estimated_prices
+
+logger = logging.getLogger(__name__)
 
 class SmartShoppingListGenerator:
     def __init__(self, user):
         self.user = user
-        openai.api_key = settings.OPENAI_API_KEY
-
-    def _get_purchase_history(self, days=90):
-        """Get user's purchase history for analysis"""
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get frequently bought items
-        frequent_items = GroceryItem.objects.filter(
-            user=self.user,
-            created_at__range=(start_date, end_date)
-        ).values(
-            'name', 'category__name', 'unit'
-        ).annotate(
-            purchase_count=Count('id'),
-            avg_quantity=Avg('quantity'),
-            avg_price=Avg('price'),
-            last_purchased=Max('created_at')
-        ).order_by('-purchase_count')
-
-        return list(frequent_items)
+        self.prompt_tokens = None
 
     def _get_budget_info(self):
         """Get user's current budget information"""
@@ -48,125 +34,203 @@ class SmartShoppingListGenerator:
         except Budget.DoesNotExist:
             return None
 
-    def generate_list(self, name=None):
-        """Generate a smart shopping list based on user's history and preferences"""
-        purchase_history = self._get_purchase_history()
-        budget_info = self._get_budget_info()
+    def generate_local_list(self, name=None, shopping_list=None):
+        """
+        Generate a shopping list with the local replenishment engine only.
+
+        Items, quantities, prices and priorities come straight from the user's
+        purchase cadence, so the result is deterministic and needs no model call.
+        """
+        candidates = ReplenishmentEngine(self.user).suggest()
+        notes = ("Suggested from your purchase history" if candidates
+                 else "No items are due for replenishment yet")
+        list_name = name or f"Restock - {timezone.now().strftime('%B %d, %Y')}"
+        return self._save_list(
+            shopping_list, list_name, notes,
+            [self._candidate_item(candidate) for candidate in candidates]
+        )
 
-        # Prepare the prompt for OpenAI
-        prompt = {
-            "role": "system",
-            "content": """You are a smart shopping assistant that helps users create optimized grocery lists. 
-            Analyze the purchase history and create a suggested shopping list that:
-            1. Includes frequently bought items that might need replenishment
-            2. Suggests quantities based on past purchase patterns
-            3. Estimates prices based on past purchases
-            4. Prioritizes items based on purchase frequency and last purchase date
-            5. Groups items by category
-            6. Stays within budget constraints
-            7. Includes brief notes about why each item is suggested
-
-            Return the response in this exact JSON format:
-            {
-                "list_name": "suggested name based on current month/season",
-                "items": [
-                    {
-                        "name": "item name",
-                        "category": "category name",
-                        "quantity": numeric quantity,
-                        "unit": "unit of measurement",
-                        "estimated_price": numeric price,
-                        "priority": "low/medium/high",
-                        "notes": "reason for suggestion"
-                    }
-                ],
-                "total_estimated_cost": numeric total,
-                "suggestions": ["list of shopping tips based on analysis"]
-            }"""
-        }
+    def generate_list(self, name=None, shopping_list=None, use_cache=True):
+        """
+        Generate a smart shopping list based on user's history and preferences.
+
+        The replenishment engine pre-selects the items due for restocking and
+        fills in their quantities and prices; only the top candidates that fit
+        the prompt token budget are sent to the model, which names the list
+        and adds notes and shopping tips. The rest are only summarized in the
+        prompt and saved as the engine suggested them.
+
+        When ``shopping_list`` is given (a placeholder created by the generate
+        endpoint), it is filled in place instead of creating a new list.
+        Identical prompts reuse the cached model response unless ``use_cache``
+        is False.
+        """
+        prompt = self._build_prompt()
+        try:
+            content = chat_completion(**self._completion_kwargs(prompt, use_cache))
+            return self._save_suggestions(content, prompt, name, shopping_list)
+        except Exception as e:
+            raise Exception(f"Failed to generate shopping list: {str(e)}")
 
-        # Add user context
-        prompt_content = {
-            "role": "user",
-            "content": f"""
-            Purchase History (last 90 days): {json.dumps(purchase_history, default=str)}
-            Budget Information: {json.dumps(budget_info) if budget_info else 'No budget set'}
-            
-            Please generate a smart shopping list based on this data.
-            Consider:
-            - Frequently bought items
-            - Items that might need replenishment based on last purchase date
-            - Seasonal items
-            - Budget constraints
-            - Shopping patterns
-            """
+    async def agenerate_list(self, name=None, shopping_list=None, use_cache=True):
+        """
+        ``generate_list`` for async views: the model call is awaited instead
+        of blocking a thread, and the database work runs in sync threads.
+        """
+        prompt = await sync_to_async(self._build_prompt)()
+        try:
+            content = await achat_completion(**self._completion_kwargs(prompt, use_cache))
+            return await sync_to_async(self._save_suggestions)(content, prompt, name, shopping_list)
+        except Exception as e:
+            raise Exception(f"Failed to generate shopping list: {str(e)}")
+
+    def _build_prompt(self):
+        budget_info = self._get_budget_info()
+        prompt = ShoppingListPromptBuilder().build(
+            ReplenishmentEngine(self.user).suggest(), budget_info
+        )
+        self.prompt_tokens = prompt.prompt_tokens
+        logger.debug(f"Shopping list prompt: {prompt.prompt_tokens} tokens, {len(prompt.candidates)} items, "
+                     f"{prompt.summarized_count} summarized")
+        return prompt
+
+    def _completion_kwargs(self, prompt, use_cache):
+        return {
+            'model': "gpt-4o",
+            'messages': prompt.messages,
+            'prompt_version': SHOPPING_LIST_PROMPT_VERSION,
+            'use_cache': use_cache,
+            'temperature': 0,
+            'max_tokens': 2000,
         }
 
+    def _save_suggestions(self, content, prompt, name, shopping_list):
+        """Parse the model response and save the list."""
         try:
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-4o",
-                messages=[prompt, prompt_content],
-                temperature=0.7,
-                max_tokens=2000
-            )
+            # Remove markdown code blocks if present
+            if content.startswith('```') and content.endswith('```'):
+                # Extract content between first ``` and last ```
+                content = content.split('```')[1]
+                # Remove language identifier if present (e.g., 'json\n')
+                if '\n' in content:
+                    content = content.split('\n', 1)[1]
+
+            suggestion_data = json.loads(content)
+            print(f"Parsed suggestion data: {suggestion_data}")
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse content: {content}")
+            raise Exception(f"Failed to parse OpenAI response: {str(e)}")
+
+        if not isinstance(suggestion_data, dict):
+            raise Exception("Invalid response format from OpenAI")
+
+        # Validate required fields
+        required_fields = ['list_name', 'items']
+        for field in required_fields:
+            if field not in suggestion_data:
+                raise Exception(f"Missing required field: {field}")
+
+        return self._save_list(
+            shopping_list,
+            name or suggestion_data['list_name'],
+            "\n".join(suggestion_data.get('suggestions', [])),
+            # Items only summarized in the prompt are due too and keep the engine's notes
+            self._merge_suggestions(prompt.candidates + prompt.summarized, suggestion_data['items'])
+        )
 
-            # Parse the response
-            try:
-                content = response.choices[0].message.content
-                # Remove markdown code blocks if present
-                if content.startswith('```') and content.endswith('```'):
-                    # Extract content between first ``` and last ```
-                    content = content.split('```')[1]
-                    # Remove language identifier if present (e.g., 'json\n')
-                    if '\n' in content:
-                        content = content.split('\n', 1)[1]
-                
-                suggestion_data = json.loads(content)
-                print(f"Parsed suggestion data: {suggestion_data}")
-            except json.JSONDecodeError as e:
-                print(f"Failed to parse content: {content}")
-                raise Exception(f"Failed to parse OpenAI response: {str(e)}")
-
-            if not isinstance(suggestion_data, dict):
-                raise Exception("Invalid response format from OpenAI")
-
-            # Validate required fields
-            required_fields = ['list_name', 'items']
-            for field in required_fields:
-                if field not in suggestion_data:
-                    raise Exception(f"Missing required field: {field}")
-
-            # Create shopping list
-            shopping_list = ShoppingList.objects.create(
-                user=self.user,
-                name=name or suggestion_data['list_name'],
-                status='draft',
-                notes="\n".join(suggestion_data.get('suggestions', []))
-            )
+    def _candidate_item(self, candidate):
+        return {
+            'name': candidate.name,
+            'category_id': candidate.category_id,
+            'quantity': candidate.quantity,
+            'unit': candidate.unit,
+            'estimated_price': candidate.estimated_price,
+            'priority': candidate.priority,
+            'notes': candidate.notes,
+        }
 
-            # Create shopping list items
-            for item_data in suggestion_data['items']:
-                ShoppingListItem.objects.create(
+    def _merge_suggestions(self, candidates, suggested_items):
+        """
+        Keep the engine's items, quantities and prices, taking only the notes
+        from the model. Without any history, the model's items are used as-is.
+        """
+        if not candidates:
+            return suggested_items
+
+        notes_by_name = {
+            str(item_data.get('name', '')).strip().lower(): item_data.get('notes')
+            for item_data in suggested_items
+            if isinstance(item_data, dict)
+        }
+        items = []
+        for candidate in candidates:
+            item = self._candidate_item(candidate)
+            item['notes'] = notes_by_name.get(candidate.name.strip().lower()) or item['notes']
+            items.append(item)
+        return items
+
+    def _save_list(self, shopping_list, name, notes, items):
+        """
+        Create (or fill in) the shopping list and insert all of its items at once.
+
+        Items carry either a ``category_id`` or a ``category`` name to resolve.
+        """
+        with transaction.atomic():
+            if shopping_list is None:
+                shopping_list = ShoppingList.objects.create(
+                    user=self.user,
+                    name=name,
+                    status='draft',
+                    notes=notes
+                )
+            else:
+                shopping_list.name = name
+                shopping_list.status = 'draft'
+                shopping_list.notes = notes
+                shopping_list.save()
+
+            # Create shopping list items in a single insert
+            category_ids = self._resolve_categories(
+                item_data['category'] for item_data in items if 'category_id' not in item_data
+            )
+            list_items = [
+                ShoppingListItem(
                     shopping_list=shopping_list,
                     name=item_data['name'],
-                    category_id=self._get_or_create_category(item_data['category']),
+                    category_id=(item_data['category_id'] if 'category_id' in item_data
+                                 else category_ids[item_data['category']]),
                     quantity=item_data['quantity'],
                     unit=item_data['unit'],
                     estimated_price=item_data['estimated_price'],
                     priority=item_data['priority'],
                     notes=item_data['notes']
                 )
-
-            return shopping_list
-
-        except Exception as e:
-            raise Exception(f"Failed to generate shopping list: {str(e)}")
-
-    def _get_or_create_category(self, category_name):
-        """Get or create a category by name"""
-        category, _ = GroceryCategory.objects.get_or_create(
-            name=category_name,
-            defaults={'description': f'Category for {category_name} items'}
+                for item_data in items
+            ]
+            # Prices actually paid are better estimates than averages or model guesses
+            fill_estimated_prices(self.user.pk, list_items, overwrite=True)
+            created_items = ShoppingListItem.objects.bulk_create(list_items)
+            # bulk_create sends no signals
+            record_changes(self.user.pk, 'shopping_list_item', [item.pk for item in created_items])
+
+        return shopping_list
+
+    def _resolve_categories(self, category_names):
+        """Map category names to ids, creating any missing categories"""
+        names = set(category_names)
+        if not names:
+            return {}
+        categories = dict(
+            GroceryCategory.objects.filter(name__in=names).values_list('name', 'id')
         )
-        return category.id 
\ No newline at end of file
+        missing = names - categories.keys()
+        if missing:
+            GroceryCategory.objects.bulk_create([
+                GroceryCategory(name=category_name, description=f'Category for {category_name} items')
+                for category_name in missing
+            ])
+            bump_global_version()
+            categories.update(
+                GroceryCategory.objects.filter(name__in=missing).values_list('name', 'id')
+            )
+        return categories
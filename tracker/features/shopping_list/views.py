@@ -1,75 +1,162 @@
+import logging
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from decimal import Decimal
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import ShoppingList, ShoppingListItem
+from .models import ShoppingList, ShoppingListItem, ShoppingListGenerationJob
 from .serializers import ShoppingListSerializer, ShoppingListItemSerializer
 from .services import SmartShoppingListGenerator
+from .bulk import apply_item_operations, BulkOperationError, BULK_OPERATIONS
+from ..catalog.prices import compare_platforms, MAX_PRICE_HISTORY_DAYS
+from ..catalog.views import parse_days
+from ..pagination import KeysetPagination
+from ..sparse_fields import SparseFieldsetViewMixin
+from ..conditional import ConditionalGetViewMixin
+from ..throttling import JobThrottleViewMixin, job_throttles, release_job_slot
+from ..data_versions import bump_user_version
+from ..sync.changelog import record_changes
+from ...tasks import generate_shopping_list
+
+logger = logging.getLogger(__name__)
 
-class ShoppingListViewSet(viewsets.ModelViewSet):
+GENERATION_MODES = ['llm', 'local']
+
+class ShoppingListViewSet(JobThrottleViewMixin, ConditionalGetViewMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing shopping lists and generating smart suggestions.
     """
     serializer_class = ShoppingListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        """Returns shopping lists for the current user."""
-        return ShoppingList.objects.filter(user=self.request.user)
+        """
+        Returns shopping lists for the current user, with item totals computed
+        in SQL and items prefetched so serialization costs a constant number
+        of queries.
+        """
+        queryset = ShoppingList.objects.filter(user=self.request.user).annotate(
+            annotated_total_estimated_cost=Coalesce(
+                models.Sum(
+                    models.F('items__estimated_price') * models.F('items__quantity'),
+                    output_field=models.DecimalField(max_digits=20, decimal_places=4)
+                ),
+                models.Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=20, decimal_places=4)
+            ),
+            annotated_total_items=models.Count('items'),
+            annotated_completed_items=models.Count('items', filter=models.Q(items__is_purchased=True)),
+        ).select_related('generation_job')
+
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is None or 'items' in sparse_fields:
+            queryset = queryset.prefetch_related('items__category')
+        return queryset
+
+    def get_throttles(self):
+        # Only model-backed generation is limited; 'local' mode is cheap
+        if self.action == 'generate':
+            data = self.request.data
+            if not isinstance(data, dict) or data.get('mode', 'llm') != 'local':
+                return job_throttles('list_generation')
+        return super().get_throttles()
 
     @swagger_auto_schema(
-        operation_description="Generate a smart shopping list based on purchase history",
+        operation_description="Generate a smart shopping list based on purchase history. "
+                              "In 'llm' mode (default) this returns a placeholder list with status "
+                              "'generating'; poll it until its generation_job completes. In 'local' "
+                              "mode the list is built immediately from purchase cadence without a "
+                              "model call.",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
                 'name': openapi.Schema(type=openapi.TYPE_STRING, description='Optional name for the shopping list'),
+                'mode': openapi.Schema(type=openapi.TYPE_STRING, enum=GENERATION_MODES,
+                                       description="'llm' (default) or 'local'"),
             }
         ),
         responses={
-            200: ShoppingListSerializer(),
+            201: ShoppingListSerializer(),
+            202: ShoppingListSerializer(),
             400: 'Bad Request',
+            429: 'Too Many Requests',
         }
     )
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """Generate a smart shopping list based on user's purchase history."""
-        try:
-            # Validate request data
-            if not isinstance(request.data, dict):
-                return Response(
-                    {'error': 'Invalid request format. Expected JSON object.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Get optional name parameter
-            name = request.data.get('name', '')
-            if name and not isinstance(name, str):
-                return Response(
-                    {'error': 'Invalid name parameter. Expected string.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Generate shopping list
-            generator = SmartShoppingListGenerator(request.user)
-            shopping_list = generator.generate_list(name=name)
-            serializer = self.get_serializer(shopping_list)
-            return Response(serializer.data)
+        """Queue generation of a smart shopping list based on user's purchase history."""
+        # Validate request data
+        if not isinstance(request.data, dict):
+            return Response(
+                {'error': 'Invalid request format. Expected JSON object.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        except Exception as e:
-            import traceback
-            print(f"Error generating shopping list: {str(e)}")
-            print(f"Traceback: {traceback.format_exc()}")
+        # Get optional name parameter
+        name = request.data.get('name', '')
+        if name and not isinstance(name, str):
+            return Response(
+                {'error': 'Invalid name parameter. Expected string.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        mode = request.data.get('mode', 'llm')
+        if mode not in GENERATION_MODES:
             return Response(
-                {'error': f'Failed to generate shopping list: {str(e)}'},
+                {'error': f"Invalid mode parameter. Expected one of: {', '.join(GENERATION_MODES)}."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        if mode == 'local':
+            # Deterministic and fast enough to build within the request
+            generator = SmartShoppingListGenerator(request.user)
+            shopping_list = generator.generate_local_list(name=name)
+            serializer = self.get_serializer(self.get_queryset().get(pk=shopping_list.pk))
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        # Create the placeholder list and its job; the worker fills in the items
+        shopping_list = ShoppingList.objects.create(
+            user=request.user,
+            name=name or 'Smart Shopping List',
+            status='generating'
+        )
+        job = ShoppingListGenerationJob.objects.create(
+            shopping_list=shopping_list,
+            user=request.user,
+            options={'name': name}
+        )
+
+        try:
+            # The job's slot is released by the task when it finishes
+            result = generate_shopping_list.delay(job.id, job_slot=getattr(request, 'job_slot', None))
+        except Exception as e:
+            logger.error(f"Failed to queue shopping list generation for job {job.id}: {str(e)}", exc_info=True)
+            release_job_slot(getattr(request, 'job_slot', None))
+            request.job_slot = None
+            job.status = 'failed'
+            job.error = f'Failed to queue generation: {str(e)}'
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+            shopping_list.status = 'failed'
+            shopping_list.save(update_fields=['status', 'updated_at'])
+        else:
+            request.job_slot = None
+            job.task_id = result.id
+            job.save(update_fields=['task_id', 'updated_at'])
+
+        serializer = self.get_serializer(self.get_queryset().get(pk=shopping_list.pk))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
     @swagger_auto_schema(
         operation_description="Mark items as purchased in a shopping list",
         request_body=openapi.Schema(
@@ -102,16 +189,99 @@ class ShoppingListViewSet(viewsets.ModelViewSet):
             )
 
         # Update items
-        items_updated = shopping_list.items.filter(id__in=item_ids).update(
+        items = shopping_list.items.filter(id__in=item_ids)
+        updated_ids = list(items.values_list('id', flat=True))
+        items_updated = items.update(
             is_purchased=True,
             purchase_frequency=models.F('purchase_frequency') + 1,
             last_purchase_date=timezone.now()
         )
+        # update() sends no signals
+        bump_user_version(request.user.pk)
+        record_changes(request.user.pk, 'shopping_list_item', updated_ids)
 
         # If all items are purchased, mark the list as completed
         if not shopping_list.items.filter(is_purchased=False).exists():
             shopping_list.status = 'completed'
             shopping_list.save()
 
+        # Reload so the annotated totals and prefetched items reflect the update
+        shopping_list = self.get_queryset().get(pk=shopping_list.pk)
         serializer = self.get_serializer(shopping_list)
         return Response(serializer.data)
+
+    @swagger_auto_schema(
+        operation_description="Create, update and delete items of a shopping list in one request. "
+                              "All operations are applied in a single transaction, or none if any "
+                              "operation is invalid.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'operations': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'op': openapi.Schema(type=openapi.TYPE_STRING, enum=list(BULK_OPERATIONS)),
+                            'id': openapi.Schema(type=openapi.TYPE_INTEGER,
+                                                 description='Item ID (update and delete)'),
+                            'data': openapi.Schema(type=openapi.TYPE_OBJECT,
+                                                   description='Item fields (create and update)'),
+                        },
+                        required=['op']
+                    ),
+                ),
+            },
+            required=['operations']
+        ),
+        responses={
+            200: ShoppingListSerializer(),
+            400: 'Bad Request',
+            404: 'Not Found',
+        }
+    )
+    @action(detail=True, methods=['post'], url_path='items/bulk')
+    def bulk_items(self, request, pk=None):
+        """Apply a batch of item changes to the shopping list."""
+        shopping_list = self.get_object()
+        if not isinstance(request.data, dict):
+            return Response(
+                {'error': 'Invalid request format. Expected JSON object.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            apply_item_operations(shopping_list, request.data.get('operations'))
+        except BulkOperationError as e:
+            return Response(
+                {'error': 'Invalid operations', 'operations': e.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        shopping_list = self.get_queryset().get(pk=shopping_list.pk)
+        serializer = self.get_serializer(shopping_list)
+        return Response(serializer.data)
+
+    @swagger_auto_schema(
+        operation_description="Compare what the items of a shopping list cost on each platform, "
+                              "from the prices the user paid over the last `days` days.",
+        manual_parameters=[
+            openapi.Parameter('days', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description=f'Days of history (default 30, max {MAX_PRICE_HISTORY_DAYS})'),
+        ],
+        responses={200: 'Platform comparison', 400: 'Bad Request', 404: 'Not Found'}
+    )
+    @action(detail=True, methods=['get'], url_path='compare-platforms')
+    def compare_platforms(self, request, pk=None):
+        """Price the list's items on every platform they were bought on."""
+        days = parse_days(request)
+        if days is None:
+            return Response(
+                {'error': f'Invalid days parameter. Expected an integer from 1 to {MAX_PRICE_HISTORY_DAYS}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # The annotated list queryset is not needed here
+        shopping_list = get_object_or_404(ShoppingList.objects.filter(user=request.user), pk=pk)
+        items = list(shopping_list.items.only('id', 'shopping_list', 'name', 'quantity'))
+        comparison = compare_platforms(request.user, items, days)
+        return Response({'shopping_list': shopping_list.pk, 'days': days, **comparison})
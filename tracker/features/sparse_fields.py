@@ -0,0 +1,100 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+def _split_param(value):
+    return [name.strip() for name in value.split(',') if name.strip()] if value else []
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer mixin that only renders the field names in the
+    ``sparse_fields`` serializer context entry (set by SparseFieldsetViewMixin).
+
+    Nested serializers are left untouched.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('sparse_fields')
+        if selected is None:
+            return fields
+        root = self.root
+        is_top_level = self is root or (
+            self.parent is root and isinstance(root, serializers.ListSerializer)
+        )
+        if not is_top_level:
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+class SparseFieldsetViewMixin:
+    """
+    ViewSet mixin adding ``?fields=a,b`` and ``?omit=c`` to read endpoints.
+
+    The selection trims the serializer output and defers the model columns
+    that no selected field needs. ``default_list_fields`` is the compact
+    representation returned by ``list`` when neither parameter is given.
+    Serializer fields computed from several columns declare them in
+    ``sparse_field_dependencies``.
+    """
+    default_list_fields = None
+    sparse_field_dependencies = {}
+    # Columns that are always loaded (primary key, pagination order)
+    sparse_required_columns = ('id', 'created_at')
+
+    def get_sparse_fields(self):
+        """Return the selected serializer field names, or None for all fields."""
+        if self.request is None or self.request.method not in ('GET', 'HEAD'):
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            params = self.request.query_params
+            fields = _split_param(params.get('fields'))
+            omit = _split_param(params.get('omit'))
+            available = [
+                name for name, field in self.get_serializer_class()().fields.items()
+                if not field.write_only
+            ]
+
+            unknown = [name for name in fields + omit if name not in available]
+            if unknown:
+                raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+
+            if fields:
+                selected = set(fields)
+            elif omit:
+                selected = set(available)
+            elif self.action == 'list' and self.default_list_fields:
+                selected = set(self.default_list_fields)
+            else:
+                selected = None
+
+            if selected is not None:
+                selected -= set(omit)
+            self._sparse_fields = selected
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        selected = self.get_sparse_fields()
+        if selected is None:
+            return queryset
+
+        needed = set(self.sparse_required_columns)
+        # Relations followed with select_related cannot be deferred
+        if isinstance(queryset.query.select_related, dict):
+            needed.update(queryset.query.select_related)
+        for name, field in self.get_serializer_class()().fields.items():
+            if name not in selected:
+                continue
+            needed.update(self.sparse_field_dependencies.get(name, ()))
+            if field.source != '*':
+                needed.add(field.source.split('.')[0])
+
+        deferred = [
+            model_field.name for model_field in queryset.model._meta.concrete_fields
+            if model_field.name not in needed and not model_field.primary_key
+        ]
+        return queryset.defer(*deferred) if deferred else queryset
@@ -0,0 +1,3 @@
+"""
+Sync Feature Package
+"""
\ No newline at end of file
@@ -0,0 +1,73 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .models import SyncChange, SyncHorizon
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_BATCH_SIZE = 5000
+
+def record_change(user_id, model, object_id, action='upsert'):
+    """Log a change to one row for the user's sync feed."""
+    SyncChange.objects.create(user_id=user_id, model=model, object_id=object_id, action=action)
+
+def record_changes(user_id, model, object_ids, action='upsert'):
+    """Log changes to many rows of one model, for bulk_create and update() paths."""
+    SyncChange.objects.bulk_create([
+        SyncChange(user_id=user_id, model=model, object_id=object_id, action=action)
+        for object_id in object_ids
+    ])
+
+def _delete_in_batches(queryset, lease=None):
+    deleted = 0
+    while not (lease and lease.lost):
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:COMPACTION_BATCH_SIZE])
+        if not ids:
+            break
+        deleted += SyncChange.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+def compact_changes(retention_days, lease=None):
+    """
+    Drop change log entries older than ``retention_days`` that no client
+    starting from ``since=0`` needs: upserts superseded by a later entry for
+    the same row, then deletions. Each row still alive keeps its latest
+    entry, so a full sync stays complete.
+
+    Dropping a deletion means clients with an older token would never see
+    it, so the user's SyncHorizon is raised past it first. Stops between
+    batches if ``lease`` is lost. Returns the number of entries deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    superseded = SyncChange.objects.filter(created_at__lt=cutoff).filter(Exists(
+        SyncChange.objects.filter(
+            user_id=OuterRef('user_id'), model=OuterRef('model'),
+            object_id=OuterRef('object_id'), id__gt=OuterRef('id')
+        )
+    ))
+    deleted = _delete_in_batches(superseded, lease)
+
+    while not (lease and lease.lost):
+        ids = list(
+            SyncChange.objects.filter(created_at__lt=cutoff, action='delete')
+            .order_by('id').values_list('id', flat=True)[:COMPACTION_BATCH_SIZE]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            batch = SyncChange.objects.filter(id__in=ids)
+            for user_id, token in batch.values('user_id').annotate(token=Max('id')).order_by().values_list(
+                'user_id', 'token'
+            ):
+                horizon, _ = SyncHorizon.objects.select_for_update().get_or_create(user_id=user_id)
+                if token > horizon.token:
+                    horizon.token = token
+                    horizon.save(update_fields=['token', 'updated_at'])
+            deleted += batch.delete()[0]
+
+    logger.info(f"Compacted {deleted} sync changes older than {retention_days} days")
+    return deleted
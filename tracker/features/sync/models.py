@@ -0,0 +1,46 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+class SyncChange(models.Model):
+    """
+    Log of row changes per user. The id doubles as the sync token. Entries
+    are compacted after SYNC_CHANGE_RETENTION_DAYS; see changelog.compact_changes.
+    """
+    MODEL_CHOICES = [
+        ('grocery_item', 'Grocery Item'),
+        ('receipt', 'Receipt'),
+        ('budget', 'Budget'),
+        ('shopping_list', 'Shopping List'),
+        ('shopping_list_item', 'Shopping List Item')
+    ]
+    ACTION_CHOICES = [
+        ('upsert', 'Created or Updated'),
+        ('delete', 'Deleted')
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_changes')
+    model = models.CharField(max_length=30, choices=MODEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} {self.action} ({self.user.username})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='syncchange_user_id_idx'),
+        ]
+
+class SyncHorizon(models.Model):
+    """
+    Highest token among the user's entries that have been compacted away.
+    Clients holding an older token have missed deletions and must resync.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='sync_horizon')
+    token = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} compacted through {self.token}"
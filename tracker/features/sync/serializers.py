@@ -0,0 +1,16 @@
+from rest_framework import serializers
+from ..shopping_list.models import ShoppingListItem
+from ..shopping_list.serializers import ShoppingListItemSerializer
+
+class SyncShoppingListItemSerializer(ShoppingListItemSerializer):
+    """List items are synced on their own, so they carry their list's id"""
+
+    class Meta(ShoppingListItemSerializer.Meta):
+        model = ShoppingListItem
+        fields = ShoppingListItemSerializer.Meta.fields + ('shopping_list',)
+
+class SyncResponseSerializer(serializers.Serializer):
+    token = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+    changes = serializers.DictField(child=serializers.ListField(child=serializers.DictField()))
+    deleted = serializers.DictField(child=serializers.ListField(child=serializers.IntegerField()))
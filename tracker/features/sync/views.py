@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+
+from .models import SyncChange, SyncHorizon
+from .serializers import SyncShoppingListItemSerializer, SyncResponseSerializer
+from ..budget.models import Budget
+from ..budget.serializers import BudgetSerializer
+from ..receipt.models import Receipt, GroceryItem
+from ..receipt.serializers import ReceiptSerializer, GroceryItemSerializer
+from ..shopping_list.models import ShoppingList, ShoppingListItem
+from ..shopping_list.serializers import ShoppingListSerializer
+
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+# Items are synced separately, and the totals can be computed from them
+SYNC_SHOPPING_LIST_FIELDS = {
+    'id', 'name', 'status', 'budget', 'notes', 'generation_job', 'created_at', 'updated_at'
+}
+
+def _sync_querysets(user):
+    return {
+        'grocery_item': (GroceryItem.objects.filter(user=user).select_related('category'),
+                         GroceryItemSerializer),
+        'receipt': (Receipt.objects.filter(user=user), ReceiptSerializer),
+        'budget': (Budget.objects.filter(user=user), BudgetSerializer),
+        'shopping_list': (ShoppingList.objects.filter(user=user).select_related('generation_job'),
+                          ShoppingListSerializer),
+        'shopping_list_item': (ShoppingListItem.objects.filter(shopping_list__user=user)
+                               .select_related('category'), SyncShoppingListItemSerializer),
+    }
+
+def _parse_int(value, default):
+    if value in (None, ''):
+        return default
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Return rows created, updated or deleted after the `since` token. "
+                          "Start with since=0, then pass the returned token on the next call; "
+                          "repeat while has_more is true. Changes are served once they are "
+                          "SYNC_COMMIT_LAG_SECONDS old. A 410 response means the token predates "
+                          "the compacted change log; start again with since=0.",
+    manual_parameters=[
+        openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description='Token from the previous sync (0 for a full sync)'),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description=f'Maximum changes per call (default {SYNC_PAGE_SIZE})'),
+    ],
+    responses={
+        200: SyncResponseSerializer(),
+        400: 'Bad Request',
+        410: 'Sync token expired; resync with since=0',
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync(request):
+    """Return the user's changes since a sync token."""
+    try:
+        since = _parse_int(request.query_params.get('since'), 0)
+        limit = _parse_int(request.query_params.get('limit'), SYNC_PAGE_SIZE)
+    except ValueError:
+        return Response(
+            {'error': 'Invalid since or limit parameter. Expected a non-negative integer.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Deletions before the horizon have been compacted away
+    horizon = SyncHorizon.objects.filter(user=request.user).values_list('token', flat=True).first()
+    if since and horizon and since < horizon:
+        return Response(
+            {'error': 'Sync token has expired. Start a full sync with since=0.', 'resync_required': True},
+            status=status.HTTP_410_GONE
+        )
+
+    limit = max(1, min(limit, MAX_SYNC_PAGE_SIZE))
+    entries = list(
+        SyncChange.objects.filter(user=request.user, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'model', 'object_id', 'action', 'created_at')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Ids are assigned at insert but become visible at commit, so a later id can
+    # be read while an earlier one is uncommitted. Entries are served once
+    # SYNC_COMMIT_LAG_SECONDS old, by when any earlier one has committed, so the
+    # token never moves past a change the client has not seen.
+    settled_before = timezone.now() - timedelta(seconds=settings.SYNC_COMMIT_LAG_SECONDS)
+    for position, entry in enumerate(entries):
+        if entry[4] > settled_before:
+            entries, has_more = entries[:position], False
+            break
+
+    # Only the last change to each row in this batch matters
+    latest = {}
+    for _, model, object_id, action, _ in entries:
+        latest[(model, object_id)] = action
+
+    changes, deleted = {}, {}
+    upserts = {}
+    for (model, object_id), action in latest.items():
+        if action == 'delete':
+            deleted.setdefault(model, []).append(object_id)
+        else:
+            upserts.setdefault(model, []).append(object_id)
+
+    context = {'request': request, 'sparse_fields': None}
+    for model, (queryset, serializer_class) in _sync_querysets(request.user).items():
+        if model not in upserts:
+            continue
+        # Rows deleted since they were logged show up as tombstones in a later batch
+        rows = queryset.filter(pk__in=upserts[model]).order_by('pk')
+        model_context = context
+        if model == 'shopping_list':
+            model_context = {**context, 'sparse_fields': SYNC_SHOPPING_LIST_FIELDS}
+        changes[model] = serializer_class(rows, many=True, context=model_context).data
+
+    return Response({
+        'token': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': deleted,
+    })
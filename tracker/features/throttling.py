@@ -0,0 +1,202 @@
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# After a failed call, Redis is left alone for this many seconds
+REDIS_RETRY_SECONDS = 30
+
+_redis_down_until = 0.0
+
+def _shared_cache():
+    """
+    The throttle cache shared with the Celery workers, or None when Redis is
+    not configured or was unreachable within the last REDIS_RETRY_SECONDS.
+    """
+    if settings.THROTTLE_CACHE_BACKEND != 'redis' or time.monotonic() < _redis_down_until:
+        return None
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+def _redis_failed(what, error):
+    global _redis_down_until
+    logger.warning(f"{what} unavailable, falling back for {REDIS_RETRY_SECONDS}s: {str(error)}")
+    _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+def _get_cache():
+    # Rate counters fall back to this process's memory, which is only per process
+    return _shared_cache() or caches['default']
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Per-user limit of ``DEFAULT_THROTTLE_RATES[scope]`` requests over a
+    sliding window.
+
+    The window is approximated from two counters, the current fixed window
+    and the previous one weighted by how much of it still overlaps, so each
+    request costs one cache read and, when allowed, one increment. Rejected
+    requests are not counted.
+    """
+
+    def __init__(self, scope=None):
+        if scope is not None:
+            self.scope = scope
+        super().__init__()
+        self.retry_after = None
+
+    @property
+    def cache(self):
+        return _get_cache()
+
+    def get_cache_key(self, request, view):
+        # The user id comes from the token, so this never loads the user
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return f'rate:{self.scope}:{request.user.pk}'
+
+    def _estimate(self, previous, current, elapsed):
+        return previous * (1 - elapsed / self.duration) + current
+
+    def _wait(self, previous, current, elapsed):
+        """Seconds until one more request fits in the window."""
+        remaining = self.duration - elapsed
+        if current + 1 > self.num_requests:
+            # Only possible once the current window has become the previous one
+            return remaining + self.duration * (1 - (self.num_requests - 1) / current)
+        return max(remaining - (self.num_requests - 1 - current) * self.duration / previous, 0)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        elapsed = now - window * self.duration
+        current_key, previous_key = f'{key}:{window}', f'{key}:{window - 1}'
+        cache = self.cache
+        try:
+            counts = cache.get_many([previous_key, current_key])
+            previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+            if self._estimate(previous, current, elapsed) + 1 > self.num_requests:
+                self.retry_after = self._wait(previous, current, elapsed)
+                return False
+            # Kept for two windows, while it is the current or the previous one
+            if cache.add(current_key, 1, timeout=2 * self.duration):
+                current = 1
+            else:
+                current = cache.incr(current_key)
+            if self._estimate(previous, current, elapsed) > self.num_requests:
+                # Another request took the last place since the read
+                cache.decr(current_key)
+                self.retry_after = self._wait(previous, current - 1, elapsed)
+                return False
+        except Exception as e:
+            # Throttling is best effort; an unavailable cache does not fail requests
+            _redis_failed(f"Rate throttle {self.scope}", e)
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+def job_slots_enforced():
+    """
+    Whether in-flight job slots can be enforced. The Celery worker releases
+    a job's slot, so slots are only taken in a cache it shares; a slot kept
+    in the web process's memory would never be released.
+    """
+    return _shared_cache() is not None
+
+def acquire_job_slot(scope, user_id, limit):
+    """
+    Take one of the user's ``limit`` in-flight job slots for ``scope``.
+    Returns the slot's key, or None when every slot is taken. Check
+    ``job_slots_enforced`` first.
+
+    Slots expire after JOB_SLOT_TTL seconds, so a worker that dies without
+    releasing its slot only blocks the user until then.
+    """
+    cache = caches[settings.THROTTLE_CACHE_ALIAS]
+    keys = [f'jobs:{scope}:{user_id}:{slot}' for slot in range(limit)]
+    taken = cache.get_many(keys)
+    for key in keys:
+        if key not in taken and cache.add(key, 1, timeout=settings.JOB_SLOT_TTL):
+            return key
+    return None
+
+def release_job_slot(slot):
+    """Free a slot returned by ``acquire_job_slot``. Accepts None."""
+    if not slot:
+        return
+    try:
+        caches[settings.THROTTLE_CACHE_ALIAS].delete(slot)
+    except Exception as e:
+        logger.warning(f"Failed to release job slot {slot}: {str(e)}")
+
+class ConcurrentJobThrottle(BaseThrottle):
+    """
+    Caps the jobs of ``scope`` a user can have in flight at once, as set in
+    JOB_CONCURRENCY_LIMITS. The slot taken is stored as ``request.job_slot``
+    and must be released when the job ends; see JobThrottleViewMixin. Not
+    enforced while no cache is shared with the workers.
+    """
+
+    def __init__(self, scope):
+        self.scope = scope
+
+    def allow_request(self, request, view):
+        limit = settings.JOB_CONCURRENCY_LIMITS.get(self.scope)
+        if not limit or not request.user or not request.user.is_authenticated or not job_slots_enforced():
+            return True
+        try:
+            slot = acquire_job_slot(self.scope, request.user.pk, limit)
+        except Exception as e:
+            _redis_failed(f"Job throttle {self.scope}", e)
+            return True
+        if slot is None:
+            return False
+        request.job_slot = slot
+        return True
+
+    def wait(self):
+        return settings.JOB_SLOT_RETRY_AFTER
+
+def job_throttles(scope):
+    """Throttles for an endpoint that starts a model call: in-flight cap, then burst and sustained rates."""
+    return [
+        ConcurrentJobThrottle(scope),
+        SlidingWindowRateThrottle(scope),
+        SlidingWindowRateThrottle(f'{scope}_sustained'),
+    ]
+
+def check_throttles(request, throttles, view=None):
+    """Return the seconds to wait if a throttle rejects the request, else None."""
+    for throttle in throttles:
+        if not throttle.allow_request(request, view):
+            # Whole seconds for Retry-After, and never 0, which DRF would leave out
+            return max(math.ceil(throttle.wait() or 0), 1)
+    return None
+
+class JobThrottleViewMixin:
+    """
+    ViewSet mixin that stops at the first throttle rejecting the request,
+    and releases the job slot taken by ConcurrentJobThrottle when the
+    response is sent. A view that hands the job to a task passes the slot on
+    and sets ``request.job_slot = None``.
+    """
+
+    def check_throttles(self, request):
+        wait = check_throttles(request, self.get_throttles(), self)
+        if wait is not None:
+            self.throttled(request, wait)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        release_job_slot(getattr(request, 'job_slot', None))
+        request.job_slot = None
+        return super().finalize_response(request, response, *args, **kwargs)
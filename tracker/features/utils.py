@@ -1,20 +1,45 @@
 from django.core.mail import send_mail
 from django.conf import settings
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 
-def send_budget_notification(user, budget, spent_amount):
+def date_range_bounds(start_date, end_date):
     """
-    Send a notification email when budget threshold is reached.
+    Convert an inclusive date range into a timezone-aware, half-open datetime
+    range ``[start, end)``.
+
+    Filtering with ``created_at__gte=start, created_at__lt=end`` lets the
+    database use the ``(user, created_at)`` indexes, unlike ``created_at__date``
+    which wraps the column in a function.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+    return start, end
+
+def send_budget_notification(user, budget, spent_amount, forecast=None):
+    """
+    Send a notification email when budget threshold is reached, or when the
+    forecast projects the budget to be exceeded before the period ends.
     """
     subject = f'Budget Alert: {budget.currency_symbol}{spent_amount} spent of {budget.currency_symbol}{budget.amount}'
+    if spent_amount >= budget.notification_threshold or forecast is None:
+        summary = "has reached the notification threshold."
+        projection = ""
+    else:
+        summary = "is projected to be exceeded before the end of the period."
+        projection = f"""
+    - Projected Spend: {budget.currency_symbol}{forecast.projected_spent}
+    - Projected Breach Date: {forecast.projected_breach_date}"""
     message = f"""
     Hello {user.username},
 
-    Your {budget.period} grocery budget has reached the notification threshold.
+    Your {budget.period} grocery budget {summary}
 
     Budget Details:
     - Total Budget: {budget.currency_symbol}{budget.amount}
     - Amount Spent: {budget.currency_symbol}{spent_amount}
-    - Notification Threshold: {budget.currency_symbol}{budget.notification_threshold}
+    - Notification Threshold: {budget.currency_symbol}{budget.notification_threshold}{projection}
 
     Please review your spending and adjust accordingly.
 
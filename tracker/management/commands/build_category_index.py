@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from tracker.features.category.suggest import build_index
+
+class Command(BaseCommand):
+    help = 'Build the category suggestion index from categorized item names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild from scratch instead of adding new items to the current index')
+
+    def handle(self, *args, **options):
+        index = build_index(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {index.meta['build']}: {len(index.category_ids)} categories, "
+            f"{index.meta['documents']} documents"
+        ))
@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tracker.features.receipt.export import EXPORTERS, EXPORT_CHUNK_SIZE, export_queryset
+
+class Command(BaseCommand):
+    help = 'Export grocery items as CSV or NDJSON without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(EXPORTERS), default='csv',
+                            help='Output format')
+        parser.add_argument('--user', help='Username to export (default: all users)')
+        parser.add_argument('--output', help='File to write to (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Number of rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        chunks = EXPORTERS[options['format']](export_queryset(user), chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Exported grocery items to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from tracker.features.catalog.matcher import get_matcher
+from tracker.features.receipt.models import GroceryItem
+
+LINK_CHUNK_SIZE = 2000
+
+class Command(BaseCommand):
+    help = 'Link grocery items that have no product to the canonical product catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=LINK_CHUNK_SIZE,
+                            help='Number of items linked per query')
+
+    def handle(self, *args, **options):
+        matcher = get_matcher()
+        linked = 0
+        last_id = 0
+        while True:
+            items = list(
+                GroceryItem.objects.filter(product__isnull=True, id__gt=last_id)
+                .order_by('id').only('id', 'name', 'category_id')[:options['chunk_size']]
+            )
+            if not items:
+                break
+            last_id = items[-1].pk
+            products = matcher.resolve_many((item.name, item.category_id) for item in items)
+            for item in items:
+                item.product_id = products.get(item.name)
+            with transaction.atomic():
+                GroceryItem.objects.bulk_update([item for item in items if item.product_id], ['product'])
+            linked += sum(1 for item in items if item.product_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Linked {linked} grocery items; run rebuild_purchase_history to regroup purchase history'
+        ))
@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from tracker.features.catalog.prices import rebuild_daily_prices, rebuild_latest_prices
+
+REBUILD_CHUNK_SIZE = 500
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily product price series and latest prices from grocery items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help='Number of users aggregated per query')
+
+    def handle(self, *args, **options):
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        daily_rows = latest_rows = 0
+        for start in range(0, len(user_ids), options['chunk_size']):
+            chunk = user_ids[start:start + options['chunk_size']]
+            daily_rows += rebuild_daily_prices(chunk)
+            latest_rows += rebuild_latest_prices(chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {daily_rows} daily price rows and {latest_rows} latest prices for {len(user_ids)} users'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from tracker.features.shopping_list.history import rebuild_all_purchase_history, REBUILD_CHUNK_SIZE
+
+class Command(BaseCommand):
+    help = 'Rebuild the purchase history feature table used for shopping list generation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help='Number of users aggregated per query')
+
+    def handle(self, *args, **options):
+        users_processed, features_written = rebuild_all_purchase_history(options['chunk_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {features_written} feature rows for {users_processed} users')
+        )
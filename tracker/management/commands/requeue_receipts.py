@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from tracker.features.data_versions import bump_user_version
+from tracker.features.receipt.models import Receipt
+from tracker.features.sync.changelog import record_changes
+from tracker.tasks import dispatch_batch_receipts
+
+class Command(BaseCommand):
+    help = 'Reprocess failed receipts as batch work, behind interactive uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only requeue receipts of this user id')
+
+    def handle(self, *args, **options):
+        # Completed receipts already created their items, so only failed ones are retried
+        receipts = Receipt.objects.filter(status='failed')
+        if options['user']:
+            receipts = receipts.filter(user_id=options['user'])
+        by_user = {}
+        for receipt_id, user_id in receipts.values_list('id', 'user_id'):
+            by_user.setdefault(user_id, []).append(receipt_id)
+        requeued = Receipt.objects.filter(
+            id__in=[receipt_id for ids in by_user.values() for receipt_id in ids], status='failed'
+        ).update(status='pending', priority='batch', updated_at=timezone.now())
+        # update() sends no signals
+        for user_id, ids in by_user.items():
+            bump_user_version(user_id)
+            record_changes(user_id, 'receipt', ids)
+
+        dispatch_batch_receipts.delay()
+        self.stdout.write(self.style.SUCCESS(
+            f'Requeued {requeued} receipts; they are dispatched round-robin across users'
+        ))
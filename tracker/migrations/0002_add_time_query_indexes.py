@@ -0,0 +1,33 @@
+# Generated by Django 4.2.21 on 2026-10-19 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['notification_sent', 'period'], name='budget_notif_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groceryitem',
+            index=models.Index(fields=['user', 'created_at'], name='groceryitem_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['user', 'created_at'], name='receipt_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['status'], name='receipt_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['user', 'created_at'], name='shoppinglist_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.21 on 2026-10-19 10:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracker', '0002_add_time_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoppinglist',
+            name='status',
+            field=models.CharField(choices=[('generating', 'Generating'), ('draft', 'Draft'), ('active', 'Active'), ('completed', 'Completed'), ('archived', 'Archived'), ('failed', 'Failed')], default='draft', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ShoppingListGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('retrying', 'Retrying'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('options', models.JSONField(blank=True, default=dict)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('shopping_list', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='generation_job', to='tracker.shoppinglist')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.21 on 2026-10-19 10:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracker', '0003_shoppinglistgenerationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseHistoryFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('unit', models.CharField(default='piece', max_length=50)),
+                ('purchase_count', models.PositiveIntegerField(default=0)),
+                ('avg_quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('avg_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('first_purchased', models.DateTimeField()),
+                ('last_purchased', models.DateTimeField()),
+                ('mean_interval_days', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tracker.grocerycategory')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchase_history_features', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-purchase_count'], name='purchasefeature_user_count_idx')],
+                'unique_together': {('user', 'name', 'unit')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_purchasehistoryfeature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglistgenerationjob',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
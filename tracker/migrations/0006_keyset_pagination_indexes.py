@@ -0,0 +1,37 @@
+# Generated by Django 4.2.21 on 2026-10-19 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_generationjob_prompt_tokens'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='groceryitem',
+            name='groceryitem_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='receipt',
+            name='receipt_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='shoppinglist',
+            name='shoppinglist_user_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='groceryitem',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='groceryitem_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='receipt_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='shoppinglist_user_created_idx'),
+        ),
+    ]
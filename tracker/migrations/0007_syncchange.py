@@ -0,0 +1,51 @@
+# Generated by Django 4.2.21 on 2026-10-19 10:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+SYNC_MODELS = [
+    ('Receipt', 'receipt', 'user_id'),
+    ('GroceryItem', 'grocery_item', 'user_id'),
+    ('Budget', 'budget', 'user_id'),
+    ('ShoppingList', 'shopping_list', 'user_id'),
+    ('ShoppingListItem', 'shopping_list_item', 'shopping_list__user_id'),
+]
+
+def backfill_sync_changes(apps, schema_editor):
+    """Log existing rows so a sync from token 0 returns them"""
+    SyncChange = apps.get_model('tracker', 'SyncChange')
+    for model_name, label, user_field in SYNC_MODELS:
+        rows = apps.get_model('tracker', model_name).objects.order_by('pk').values_list(user_field, 'pk')
+        batch = []
+        for user_id, object_id in rows.iterator(chunk_size=2000):
+            batch.append(SyncChange(user_id=user_id, model=label, object_id=object_id, action='upsert'))
+            if len(batch) >= 2000:
+                SyncChange.objects.bulk_create(batch)
+                batch = []
+        SyncChange.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracker', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('grocery_item', 'Grocery Item'), ('receipt', 'Receipt'), ('budget', 'Budget'), ('shopping_list', 'Shopping List'), ('shopping_list_item', 'Shopping List Item')], max_length=30)),
+                ('object_id', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Created or Updated'), ('delete', 'Deleted')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='syncchange_user_id_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_sync_changes, migrations.RunPython.noop),
+    ]
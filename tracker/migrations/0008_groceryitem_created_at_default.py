@@ -0,0 +1,19 @@
+# Generated by Django 4.2.21 on 2026-10-19 10:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_syncchange'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='groceryitem',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
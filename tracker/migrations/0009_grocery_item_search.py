@@ -0,0 +1,63 @@
+"""
+Text search indexes for grocery item names (see tracker/features/search.py).
+
+On SQLite, a migration that rebuilds tracker_groceryitem (Django does this for
+most AlterField operations) drops the triggers below; recreate them after it.
+"""
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE tracker_groceryitem_fts USING fts5(name, user_key, tokenize='trigram')",
+    "INSERT INTO tracker_groceryitem_fts (rowid, name, user_key) "
+    "SELECT id, name, '#' || user_id || '#' FROM tracker_groceryitem",
+    "CREATE TRIGGER tracker_groceryitem_fts_insert AFTER INSERT ON tracker_groceryitem BEGIN "
+    "INSERT INTO tracker_groceryitem_fts (rowid, name, user_key) VALUES (new.id, new.name, '#' || new.user_id || '#'); "
+    "END",
+    "CREATE TRIGGER tracker_groceryitem_fts_update AFTER UPDATE OF name, user_id ON tracker_groceryitem BEGIN "
+    "UPDATE tracker_groceryitem_fts SET name = new.name, user_key = '#' || new.user_id || '#' WHERE rowid = old.id; "
+    "END",
+    "CREATE TRIGGER tracker_groceryitem_fts_delete AFTER DELETE ON tracker_groceryitem BEGIN "
+    "DELETE FROM tracker_groceryitem_fts WHERE rowid = old.id; "
+    "END",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS tracker_groceryitem_fts_insert",
+    "DROP TRIGGER IF EXISTS tracker_groceryitem_fts_update",
+    "DROP TRIGGER IF EXISTS tracker_groceryitem_fts_delete",
+    "DROP TABLE IF EXISTS tracker_groceryitem_fts",
+]
+
+# btree_gin lets the trigram index lead with user_id
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    "CREATE INDEX IF NOT EXISTS groceryitem_name_trgm_idx ON tracker_groceryitem "
+    "USING gin (user_id, name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS groceryitem_name_tsv_idx ON tracker_groceryitem "
+    "USING gin (user_id, to_tsvector('simple', name))",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS groceryitem_name_trgm_idx",
+    "DROP INDEX IF EXISTS groceryitem_name_tsv_idx",
+]
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_groceryitem_created_at_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.21 on 2026-10-19 11:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_grocery_item_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('normalized_key', models.CharField(max_length=255, unique=True)),
+                ('size_value', models.DecimalField(blank=True, decimal_places=3, max_digits=12, null=True)),
+                ('size_unit', models.CharField(blank=True, max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='tracker.grocerycategory')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='groceryitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='items', to='tracker.product'),
+        ),
+        migrations.AddIndex(
+            model_name='groceryitem',
+            index=models.Index(fields=['user', 'product'], name='groceryitem_user_product_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.21 on 2026-10-19 11:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracker', '0010_product_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('platform', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_total', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('observations', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_prices', to='tracker.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_prices', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyprice',
+            constraint=models.UniqueConstraint(fields=('user', 'product', 'date', 'platform'), name='dailyprice_unique_day'),
+        ),
+    ]
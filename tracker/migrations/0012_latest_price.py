@@ -0,0 +1,32 @@
+# Generated by Django 4.2.21 on 2026-10-19 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tracker', '0011_daily_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('platform', models.CharField(max_length=100)),
+                ('observed_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_prices', to='tracker.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_prices', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='latestprice',
+            constraint=models.UniqueConstraint(fields=('user', 'product', 'unit'), name='latestprice_unique_unit'),
+        ),
+    ]
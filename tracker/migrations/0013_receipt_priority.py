@@ -0,0 +1,27 @@
+# Generated by Django 4.2.21 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0012_latest_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='priority',
+            field=models.CharField(choices=[('interactive', 'Interactive'), ('batch', 'Batch')], default='interactive', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='receipt',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['priority', 'status', 'user', 'id'], name='receipt_dispatch_idx'),
+        ),
+    ]
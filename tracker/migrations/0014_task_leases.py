@@ -0,0 +1,42 @@
+# Generated by Django 4.2.21 on 2026-10-19 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_receipt_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('owner', models.CharField(max_length=255)),
+                ('acquired_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=200)),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('owner', models.CharField(max_length=255)),
+                ('backend', models.CharField(choices=[('redis', 'Redis'), ('db', 'Database')], max_length=10)),
+                ('status', models.CharField(choices=[('completed', 'Completed'), ('failed', 'Failed'), ('skipped', 'Skipped'), ('lost', 'Lease Lost')], max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['task_name', 'started_at'], name='taskrun_task_started_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.21 on 2026-10-19 11:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tracker', '0014_task_leases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncHorizon',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_horizon', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('token', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-19 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_sync_horizon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='claim_attempt',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,180 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .features.budget.models import Budget
+from .features.category.models import GroceryCategory
+from .features.receipt.models import Receipt, GroceryItem
+from .features.shopping_list.models import ShoppingList, ShoppingListItem, ShoppingListGenerationJob
+from .features.receipt.signals import grocery_items_bulk_created
+from .features.shopping_list.history import record_purchase, record_purchases
+from .features.catalog.matcher import get_matcher
+from .features.catalog.prices import (
+    record_prices, record_item_prices, refresh_day, record_latest_prices, refresh_latest_prices
+)
+from .features.data_versions import bump_user_version, bump_global_version
+from .features.auth.authentication import invalidate_cached_user
+from .features.sync.changelog import record_change, record_changes
+
+SYNC_MODEL_LABELS = {
+    GroceryItem: 'grocery_item',
+    Receipt: 'receipt',
+    Budget: 'budget',
+    ShoppingList: 'shopping_list',
+}
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_cache(sender, instance, **kwargs):
+    """
+    Drop the user cached for JWT authentication, e.g. after deactivation
+    """
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+
+@receiver(pre_save, sender=GroceryItem)
+def link_product(sender, instance, **kwargs):
+    """
+    Resolve new grocery items to their canonical product
+    """
+    if instance._state.adding and instance.product_id is None and not kwargs.get('raw'):
+        instance.product_id = get_matcher().resolve(instance.name, instance.category_id)
+
+@receiver(post_save, sender=GroceryItem)
+def update_purchase_history(sender, instance, created, **kwargs):
+    """
+    Fold new grocery items into the purchase history feature table
+    """
+    if created and not kwargs.get('raw'):
+        record_purchase(instance)
+
+@receiver(post_save, sender=GroceryItem)
+def update_daily_prices(sender, instance, created, **kwargs):
+    """
+    Keep the product's daily price series in step with the item
+    """
+    if kwargs.get('raw') or instance.product_id is None:
+        return
+    if created:
+        record_prices([(instance.user_id, instance.product_id, instance.platform,
+                        instance.created_at, instance.price)])
+    else:
+        # The price or platform may have changed; min/max cannot be undone incrementally
+        refresh_day(instance.user_id, instance.product_id, timezone.localdate(instance.created_at))
+
+@receiver(post_delete, sender=GroceryItem)
+def remove_daily_price(sender, instance, **kwargs):
+    # The user's series are deleted along with the user
+    if instance.product_id is not None and not isinstance(kwargs.get('origin'), User):
+        refresh_day(instance.user_id, instance.product_id, timezone.localdate(instance.created_at))
+
+@receiver(post_save, sender=GroceryItem)
+def update_latest_price(sender, instance, created, **kwargs):
+    """
+    Keep the latest-price index used for shopping list estimates current
+    """
+    if kwargs.get('raw') or instance.product_id is None:
+        return
+    if created:
+        record_latest_prices([(instance.user_id, instance.product_id, instance.platform,
+                               instance.created_at, instance.price, instance.unit)])
+    else:
+        refresh_latest_prices(instance.user_id, instance.product_id)
+
+@receiver(post_delete, sender=GroceryItem)
+def remove_latest_price(sender, instance, **kwargs):
+    if instance.product_id is not None and not isinstance(kwargs.get('origin'), User):
+        refresh_latest_prices(instance.user_id, instance.product_id)
+
+@receiver(post_save, sender=GroceryItem)
+@receiver(post_delete, sender=GroceryItem)
+@receiver(post_save, sender=Receipt)
+@receiver(post_delete, sender=Receipt)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_save, sender=ShoppingListGenerationJob)
+@receiver(post_delete, sender=ShoppingListGenerationJob)
+def bump_user_data_version(sender, instance, **kwargs):
+    """
+    Invalidate the owner's ETags
+    """
+    bump_user_version(instance.user_id)
+
+@receiver(post_save, sender=ShoppingListItem)
+@receiver(post_delete, sender=ShoppingListItem)
+def bump_shopping_list_item_version(sender, instance, **kwargs):
+    """
+    Invalidate the list owner's ETags
+    """
+    if isinstance(kwargs.get('origin'), ShoppingList):
+        # Cascaded from the list's own delete, which already bumps the version
+        return
+    bump_user_version(instance.shopping_list.user_id)
+
+@receiver(post_save, sender=GroceryCategory)
+@receiver(post_delete, sender=GroceryCategory)
+def bump_category_version(sender, instance, **kwargs):
+    """
+    Invalidate every user's ETags, since all responses may include category names
+    """
+    bump_global_version()
+
+@receiver(post_save, sender=GroceryItem)
+@receiver(post_save, sender=Receipt)
+@receiver(post_save, sender=Budget)
+@receiver(post_save, sender=ShoppingList)
+def log_sync_upsert(sender, instance, **kwargs):
+    """
+    Add saved rows to the owner's sync feed
+    """
+    if not kwargs.get('raw'):
+        record_change(instance.user_id, SYNC_MODEL_LABELS[sender], instance.pk)
+
+@receiver(post_delete, sender=GroceryItem)
+@receiver(post_delete, sender=Receipt)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=ShoppingList)
+def log_sync_delete(sender, instance, **kwargs):
+    """
+    Leave a tombstone in the owner's sync feed
+    """
+    # The user's feed is deleted along with the user
+    if not isinstance(kwargs.get('origin'), User):
+        record_change(instance.user_id, SYNC_MODEL_LABELS[sender], instance.pk, action='delete')
+
+@receiver(post_save, sender=ShoppingListItem)
+def log_sync_list_item_upsert(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        record_change(instance.shopping_list.user_id, 'shopping_list_item', instance.pk)
+
+@receiver(post_delete, sender=ShoppingListItem)
+def log_sync_list_item_delete(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    if isinstance(origin, User):
+        return
+    user_id = origin.user_id if isinstance(origin, ShoppingList) else instance.shopping_list.user_id
+    record_change(user_id, 'shopping_list_item', instance.pk, action='delete')
+
+@receiver(post_save, sender=ShoppingListGenerationJob)
+def log_sync_generation_job(sender, instance, **kwargs):
+    """
+    The job is part of its shopping list's representation
+    """
+    if not kwargs.get('raw'):
+        record_change(instance.user_id, 'shopping_list', instance.shopping_list_id)
+
+@receiver(grocery_items_bulk_created)
+def handle_grocery_items_bulk_created(sender, user, item_ids, **kwargs):
+    """
+    Apply what post_save does per item once for a whole bulk insert
+    """
+    record_purchases(GroceryItem.objects.filter(id__in=item_ids).only(
+        'user_id', 'name', 'unit', 'product_id', 'category_id', 'quantity', 'price', 'created_at'
+    ))
+    record_item_prices(item_ids)
+    bump_user_version(user.pk)
+    record_changes(user.pk, 'grocery_item', item_ids)
@@ -1,19 +1,28 @@
 # tasks.py
 import logging
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
-from django.db.models import Sum
-from datetime import timedelta
-from decimal import Decimal
 
 from .features.budget.models import Budget
-from .features.receipt.models import GroceryItem
+from .features.budget.forecasting import forecast_budgets
+from .features.category.suggest import build_index
+from .features.leases.lease import leased_task
+from .features.llm import cache_metrics
+from .features.receipt.processing import process_receipt
+from .features.receipt.scheduling import claim_batch_receipts, requeue_stale_receipts
+from .features.shopping_list.models import ShoppingListGenerationJob
+from .features.shopping_list.history import rebuild_all_purchase_history
+from .features.shopping_list.services import SmartShoppingListGenerator
+from .features.sync.changelog import compact_changes
+from .features.throttling import release_job_slot
 from .features.utils import send_budget_notification
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
 @shared_task(bind=True)
+@leased_task()
 def check_budget_thresholds(self):
     """
     Periodic task to check budget thresholds and send notifications
@@ -24,43 +33,41 @@ def check_budget_thresholds(self):
     logger.info(f"Checking budgets for date: {today}")
     
     # Get all budgets where notification hasn't been sent yet
-    budgets = Budget.objects.filter(notification_sent=False)
-    budget_count = budgets.count()
+    budgets = list(Budget.objects.filter(notification_sent=False).select_related('user'))
+    budget_count = len(budgets)
     logger.info(f"Found {budget_count} budgets pending notification check")
+
+    # Spent so far and end-of-period projections for every budget in one batch
+    forecasts = forecast_budgets(budgets, today=today)
     
     notifications_sent = 0
     errors = 0
     
     for budget in budgets:
+        if self.request.lease.lost:
+            # Another worker may now be sending the same notifications
+            logger.error(f"Lease lost, stopping budget check after {notifications_sent} notifications")
+            break
         try:
             logger.info(f"Processing budget for user {budget.user.username} "
                        f"(user_id: {budget.user.id}, budget_id: {budget.id})")
             
-            # Calculate period start date
-            if budget.period == 'weekly':
-                start_date = today - timedelta(days=today.weekday())
-                logger.debug(f"Weekly budget: Start date calculated as {start_date}")
-            else:  # monthly
-                start_date = today.replace(day=1)
-                logger.debug(f"Monthly budget: Start date calculated as {start_date}")
-            
-            # Calculate spent amount
-            spent = GroceryItem.objects.filter(
-                user=budget.user,
-                created_at__date__gte=start_date,
-                created_at__date__lte=today
-            ).aggregate(total=Sum('price'))['total'] or Decimal('0')
+            forecast = forecasts[budget.id]
+            spent = forecast.spent
             
             logger.info(f"User {budget.user.username} has spent {budget.currency_symbol}{spent} "
-                       f"out of {budget.currency_symbol}{budget.amount} ({budget.period} budget)")
+                       f"out of {budget.currency_symbol}{budget.amount} ({budget.period} budget), "
+                       f"projected {budget.currency_symbol}{forecast.projected_spent} "
+                       f"by {forecast.period_end}")
             
             # Check if notification should be sent
-            if budget.should_send_notification(spent):
-                logger.info(f"Threshold reached for user {budget.user.username}: "
-                          f"Spent {budget.currency_symbol}{spent} >= "
-                          f"Threshold {budget.currency_symbol}{budget.notification_threshold}")
+            if budget.should_send_notification(spent, forecast.projected_spent):
+                logger.info(f"Notification due for user {budget.user.username}: "
+                          f"Spent {budget.currency_symbol}{spent}, "
+                          f"Threshold {budget.currency_symbol}{budget.notification_threshold}, "
+                          f"Projected breach date {forecast.projected_breach_date}")
                 try:
-                    send_budget_notification(budget.user, budget, spent)
+                    send_budget_notification(budget.user, budget, spent, forecast)
                     budget.notification_sent = True
                     budget.save()
                     notifications_sent += 1
@@ -91,4 +98,172 @@ def check_budget_thresholds(self):
         'budgets_processed': budget_count,
         'notifications_sent': notifications_sent,
         'errors': errors
-    }
\ No newline at end of file
+    }
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def generate_shopping_list(self, job_id, job_slot=None):
+    """
+    Fill in a placeholder shopping list from the user's purchase history.
+
+    Progress, retries and failures are recorded on the ShoppingListGenerationJob
+    so that clients can poll the list instead of waiting on the HTTP request.
+    ``job_slot`` is the user's in-flight job slot, released once the job ends.
+    """
+    retrying = False
+    try:
+        job = ShoppingListGenerationJob.objects.select_related('shopping_list', 'user').get(id=job_id)
+        logger.info(f"Starting shopping list generation job {job.id} for user {job.user.username} "
+                    f"(attempt {job.attempts + 1}, task_id: {self.request.id})")
+
+        job.status = 'running'
+        job.attempts += 1
+        job.started_at = job.started_at or timezone.now()
+        job.save(update_fields=['status', 'attempts', 'started_at', 'updated_at'])
+
+        generator = SmartShoppingListGenerator(job.user)
+        try:
+            # Retries bypass the response cache in case the cached response is what failed
+            generator.generate_list(
+                name=job.options.get('name'),
+                shopping_list=job.shopping_list,
+                use_cache=self.request.retries == 0
+            )
+        except Exception as e:
+            job.error = str(e)
+            job.prompt_tokens = generator.prompt_tokens
+            if self.request.retries < self.max_retries:
+                logger.warning(f"Shopping list generation job {job.id} failed, retrying: {str(e)}")
+                job.status = 'retrying'
+                job.save(update_fields=['status', 'error', 'prompt_tokens', 'updated_at'])
+                # The retry keeps the slot
+                retrying = True
+                raise self.retry(exc=e)
+
+            logger.error(f"Shopping list generation job {job.id} failed: {str(e)}", exc_info=True)
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'prompt_tokens', 'finished_at', 'updated_at'])
+            job.shopping_list.status = 'failed'
+            job.shopping_list.save(update_fields=['status', 'updated_at'])
+            return {'job_id': job.id, 'status': job.status}
+
+        job.status = 'completed'
+        job.error = ''
+        job.prompt_tokens = generator.prompt_tokens
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'prompt_tokens', 'finished_at', 'updated_at'])
+        logger.info(f"Shopping list generation job {job.id} completed ({job.prompt_tokens} prompt tokens)")
+        return {'job_id': job.id, 'status': job.status}
+    finally:
+        if not retrying:
+            release_job_slot(job_slot)
+
+@shared_task(bind=True)
+@leased_task()
+def rebuild_purchase_history_features(self):
+    """
+    Nightly task to rebuild the purchase history feature table in chunks of users
+    """
+    logger.info(f"Starting purchase history rebuild task (task_id: {self.request.id})")
+    users_processed, features_written = rebuild_all_purchase_history(lease=self.request.lease)
+    logger.info(f"Purchase history rebuild completed. Processed {users_processed} users, "
+                f"wrote {features_written} feature rows")
+    return {
+        'task_id': self.request.id,
+        'users_processed': users_processed,
+        'features_written': features_written
+    }
+
+@shared_task(bind=True)
+@leased_task()
+def refresh_category_index(self, full=False):
+    """
+    Extend the category suggestion index with newly categorized items, or
+    rebuild it from scratch so edits and deletions are reflected too
+    """
+    index = build_index(full=full, lease=self.request.lease)
+    if index is None:
+        return {'task_id': self.request.id, 'build': None}
+    return {
+        'task_id': self.request.id,
+        'build': index.meta['build'],
+        'documents': index.meta['documents']
+    }
+
+@shared_task(bind=True)
+@leased_task()
+def compact_sync_changes(self):
+    """
+    Nightly task to drop change log entries older than
+    SYNC_CHANGE_RETENTION_DAYS that a full sync does not need
+    """
+    deleted = compact_changes(settings.SYNC_CHANGE_RETENTION_DAYS, lease=self.request.lease)
+    return {
+        'task_id': self.request.id,
+        'deleted': deleted
+    }
+
+@shared_task(bind=True)
+def log_llm_cache_metrics(self):
+    """
+    Hourly task to log the LLM response cache hit rate
+    """
+    metrics = cache_metrics()
+    logger.info(f"LLM cache: {metrics['hits']} hits, {metrics['misses']} misses, "
+                f"hit rate {metrics['hit_rate']:.1%}")
+    return {
+        'task_id': self.request.id,
+        **metrics
+    }
+
+@shared_task(bind=True)
+def process_receipt_upload(self, receipt_id, job_slot=None):
+    """
+    Process a receipt uploaded through the API. Routed to the interactive
+    queue; ``job_slot`` is the user's in-flight upload slot.
+    """
+    try:
+        process_receipt(receipt_id)
+    finally:
+        release_job_slot(job_slot)
+    return {'receipt_id': receipt_id}
+
+@shared_task(bind=True)
+def process_batch_receipt(self, receipt_id):
+    """
+    Process a receipt of a batch upload, then hand the freed place in the
+    batch queue to the next user in turn
+    """
+    try:
+        process_receipt(receipt_id)
+    finally:
+        dispatch_batch_receipts.delay()
+    return {'receipt_id': receipt_id}
+
+@shared_task(bind=True)
+@leased_task()
+def dispatch_batch_receipts(self):
+    """
+    Queue pending batch receipts round-robin across users, keeping at most
+    RECEIPT_BATCH_QUEUE_DEPTH in flight so a large backfill never builds a
+    deep backlog in the batch queue. Leased, so two dispatchers never count
+    the same free capacity; a dispatch skipped while another runs is made
+    up by the next one, at the latest from beat a minute later. Stale
+    interactive uploads are sent again as well
+    """
+    requeued = requeue_stale_receipts(settings.RECEIPT_BATCH_STALE_SECONDS)
+    resent = requeue_stale_receipts(settings.RECEIPT_INTERACTIVE_STALE_SECONDS, priority='interactive')
+    for receipt_id in resent:
+        # The upload's job slot was released when its first run ended or expired
+        process_receipt_upload.delay(receipt_id)
+    receipt_ids = claim_batch_receipts(settings.RECEIPT_BATCH_QUEUE_DEPTH)
+    for receipt_id in receipt_ids:
+        process_batch_receipt.delay(receipt_id)
+    if receipt_ids:
+        logger.info(f"Dispatched {len(receipt_ids)} batch receipts (task_id: {self.request.id})")
+    return {
+        'task_id': self.request.id,
+        'dispatched': len(receipt_ids),
+        'requeued': len(requeued),
+        'resent': len(resent)
+    }
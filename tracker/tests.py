@@ -1,3 +1,1288 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.query import QuerySet
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import numpy as np
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .features.auth.authentication import load_user
+from .features import llm
+from .features.budget import forecasting
+from .features.budget.models import Budget
+from .features.catalog import matcher
+from .features.catalog.models import DailyPrice
+from .features.catalog.prices import (
+    MAX_PRICE_HISTORY_DAYS, PRICE_HISTORY_DAYS, fill_estimated_prices, rebuild_daily_prices, record_prices,
+    refresh_day
+)
+from .features.catalog.views import parse_days
+from .features.category import suggest
+from .features.leases import lease as lease_module
+from .features.leases.lease import Lease
+from .features.leases.models import TaskLease, TaskRun
+from .features.category.models import GroceryCategory
+from .features.receipt.importer import GroceryItemImporter
+from .features.receipt.processing import _claim, _save_result, process_receipt
+from .features.receipt.signals import grocery_items_bulk_created
+from .features.receipt.scheduling import requeue_stale_receipts
+from .features.receipt.models import GroceryItem, Receipt
+from .features.shopping_list.history import rebuild_purchase_history, record_purchase
+from .features.shopping_list.models import (
+    PurchaseHistoryFeature, ShoppingList, ShoppingListGenerationJob, ShoppingListItem
+)
+from .features.shopping_list.replenishment import ReplenishmentCandidate, ReplenishmentEngine
+from .features.shopping_list.services import SmartShoppingListGenerator
+from .features.sync.changelog import compact_changes
+from .features.sync.models import SyncChange, SyncHorizon
+from .features import throttling
+from .features.search import (
+    FTS_TABLE, FallbackSearchBackend, PostgresSearchBackend, SQLiteSearchBackend, get_search_backend,
+    search_grocery_items
+)
+from .tasks import (
+    compact_sync_changes, dispatch_batch_receipts, generate_shopping_list, log_llm_cache_metrics,
+    process_batch_receipt, process_receipt_upload, refresh_category_index
+)
+from .features.utils import date_range_bounds
+
+# Job slots are only taken in a cache shared with the workers; a separate
+# in-memory cache stands in for Redis
+SHARED_THROTTLE_CACHE = {
+    'THROTTLE_CACHE_BACKEND': 'redis',
+    'CACHES': {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle'},
+    },
+}
+
+class TrackerTestCase(TestCase):
+    """Drops the process-wide product index, which would keep products rolled back by earlier tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        matcher._matcher = None
+        super().setUpClass()
+
+    def setUp(self):
+        matcher._matcher = None
+
+class TimeQueryIndexTests(TrackerTestCase):
+    """The per-user time queries behind the dashboards range-scan the (user, created_at) indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        cls.start, cls.end = date_range_bounds(date(2026, 1, 1), date(2026, 1, 31))
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn(f'USING INDEX {index_name}', plan)
+        else:
+            self.assertIn(index_name, plan)
+        return plan
+
+    def test_period_spend_uses_user_created_index(self):
+        queryset = GroceryItem.objects.filter(
+            user=self.user, created_at__gte=self.start, created_at__lt=self.end
+        )
+        plan = self.assertUsesIndex(queryset, 'groceryitem_user_created_idx')
+        # Both bounds are part of the index search, not a filter after it
+        if connection.vendor == 'sqlite':
+            self.assertIn('created_at>? AND created_at<?', plan)
+
+    def test_category_breakdown_uses_user_created_index(self):
+        queryset = GroceryItem.objects.filter(
+            user=self.user, created_at__gte=self.start, created_at__lt=self.end
+        ).values('category__name').annotate(total=Sum('price')).order_by('-total')
+        self.assertUsesIndex(queryset, 'groceryitem_user_created_idx')
+
+    def test_receipt_list_is_read_in_index_order(self):
+        queryset = Receipt.objects.filter(user=self.user).order_by('-created_at', '-id')[:20]
+        plan = self.assertUsesIndex(queryset, 'receipt_user_created_idx')
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_shopping_list_list_is_read_in_index_order(self):
+        queryset = ShoppingList.objects.filter(user=self.user).order_by('-created_at', '-id')[:20]
+        plan = self.assertUsesIndex(queryset, 'shoppinglist_user_created_idx')
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_date_range_bounds_are_half_open(self):
+        GroceryItem.objects.bulk_create([
+            GroceryItem(user=self.user, name='milk', price=Decimal('1.00'), quantity=1, platform='x',
+                        created_at=created_at)
+            for created_at in (self.start, self.end)
+        ])
+        in_range = GroceryItem.objects.filter(user=self.user, created_at__gte=self.start, created_at__lt=self.end)
+        self.assertEqual(list(in_range.values_list('created_at', flat=True)), [self.start])
+
+class KeysetPaginationTests(TrackerTestCase):
+    """Pages follow (created_at, id) cursors, newest first, without gaps or repeats."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        items = GroceryItem.objects.bulk_create([
+            GroceryItem(user=cls.user, name=f'Item {i}', price=Decimal('1.00'), quantity=1, platform='x')
+            for i in range(7)
+        ])
+        # Five items share a timestamp, so pages split inside the tie
+        created_at = timezone.now() - timedelta(days=1)
+        GroceryItem.objects.filter(pk__in=[item.pk for item in items[1:6]]).update(created_at=created_at)
+        GroceryItem.objects.filter(pk=items[0].pk).update(created_at=created_at - timedelta(hours=1))
+        GroceryItem.objects.filter(pk=items[6].pk).update(created_at=created_at + timedelta(hours=1))
+        cls.expected_ids = [items[6].pk] + [item.pk for item in reversed(items[1:6])] + [items[0].pk]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, page):
+        return [item['id'] for item in page['results']]
+
+    def test_pages_walk_forward_and_back_through_ties(self):
+        pages = [self.get('/api/grocery-items/?page_size=2&fields=id')]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        self.assertEqual([item_id for page in pages for item_id in self.ids(page)], self.expected_ids)
+        self.assertIsNone(pages[0]['previous'])
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.get(page['previous'])
+            self.assertEqual(self.ids(page), self.ids(expected))
+
+    def test_cursor_encodes_the_last_row(self):
+        page = self.get('/api/grocery-items/?page_size=3&fields=id')
+        cursor = parse_qs(urlparse(page['next']).query)['cursor'][0]
+        payload = json.loads(base64.urlsafe_b64decode(cursor))
+        last = GroceryItem.objects.get(pk=self.ids(page)[-1])
+        self.assertEqual(payload, {'t': last.created_at.isoformat(), 'i': last.pk, 'r': 0})
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not-base64!', base64.urlsafe_b64encode(b'{"t": "yesterday", "i": 1}').decode()):
+            response = self.client.get(f'/api/grocery-items/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_clamped(self):
+        self.assertEqual(len(self.get('/api/grocery-items/?page_size=0')['results']), 1)
+        self.assertEqual(len(self.get('/api/grocery-items/?page_size=abc')['results']), 7)
+
+class GroceryItemSearchTests(TrackerTestCase):
+    """Item search reads a text index kept in step with the items table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        cls.other = User.objects.create_user('other')
+
+    def create_item(self, name, user=None):
+        return GroceryItem.objects.create(user=user or self.user, name=name, price=Decimal('1.00'),
+                                          quantity=1, platform='x')
+
+    def search(self, query, user=None):
+        return [item.name for item in search_grocery_items(user or self.user, query)]
+
+    def fts_rows(self, item):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT name, user_key FROM {FTS_TABLE} WHERE rowid = %s', [item.pk])
+            return cursor.fetchall()
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 triggers are SQLite only')
+    def test_fts_index_follows_inserts_updates_and_deletes(self):
+        item = self.create_item('Amul Toned Milk')
+        self.assertEqual(self.fts_rows(item), [('Amul Toned Milk', f'#{self.user.pk}#')])
+        self.assertEqual(self.search('toned milk'), ['Amul Toned Milk'])
+
+        item.name = 'Brown Bread'
+        item.save()
+        self.assertEqual(self.search('toned milk'), [])
+        self.assertEqual(self.search('bread'), ['Brown Bread'])
+
+        GroceryItem.objects.filter(pk=item.pk).update(user=self.other)
+        self.assertEqual(self.search('bread'), [])
+        self.assertEqual(self.search('bread', user=self.other), ['Brown Bread'])
+
+        item.delete()
+        self.assertEqual(self.fts_rows(item), [])
+        self.assertEqual(self.search('bread', user=self.other), [])
+
+    def test_misspelled_and_short_queries_match(self):
+        self.create_item('Amul Toned Milk')
+        self.create_item('Eggs')
+        self.create_item('Toned Milk', user=self.other)
+        self.assertEqual(self.search('tonde milk'), ['Amul Toned Milk'])
+        self.assertEqual(self.search('eg'), ['Eggs'])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_backend_follows_the_database_vendor(self):
+        for vendor, backend in (('sqlite', SQLiteSearchBackend), ('postgresql', PostgresSearchBackend),
+                                ('mysql', FallbackSearchBackend)):
+            with mock.patch.object(connection, 'vendor', vendor):
+                self.assertIsInstance(get_search_backend(), backend)
+
+    def test_fallback_backend_matches_word_prefixes(self):
+        milk = self.create_item('Amul Toned Milk')
+        self.create_item('Milkshake', user=self.other)
+        self.create_item('Buttermilk')
+        rows = FallbackSearchBackend().candidates(self.user.pk, ['mil'], 10)
+        self.assertEqual([row[0] for row in rows], [milk.pk])
+
+    @skipUnless(connection.vendor == 'postgresql', 'pg_trgm search is PostgreSQL only')
+    def test_postgres_backend_matches_typos_and_prefixes(self):
+        milk = self.create_item('Amul Toned Milk')
+        self.create_item('Toned Milk', user=self.other)
+        backend = PostgresSearchBackend()
+        self.assertEqual([row[0] for row in backend.candidates(self.user.pk, ['tonde', 'milk'], 10)], [milk.pk])
+        self.assertEqual([row[0] for row in backend.candidates(self.user.pk, ['am'], 10)], [milk.pk])
+
+class ShoppingListQueryCountTests(TrackerTestCase):
+    """
+    List and detail responses cost a constant number of queries however many
+    lists and items there are: the lists with their SQL totals, then the
+    prefetched items and their categories.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        cls.categories = [GroceryCategory.objects.create(name=name) for name in ('Dairy', 'Bakery')]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_lists(self, count, items_per_list=3):
+        lists = []
+        for i in range(count):
+            shopping_list = ShoppingList.objects.create(user=self.user, name=f'List {i}')
+            ShoppingListItem.objects.bulk_create([
+                ShoppingListItem(shopping_list=shopping_list, name=f'Item {j}', quantity=2,
+                                 estimated_price=Decimal('1.50'), category=self.categories[j % 2],
+                                 is_purchased=j == 0)
+                for j in range(items_per_list)
+            ])
+            lists.append(shopping_list)
+        return lists
+
+    def test_list_query_count_does_not_grow_with_lists(self):
+        self.create_lists(1)
+        with self.assertNumQueries(3):
+            self.client.get('/api/shopping-lists/')
+        self.create_lists(5, items_per_list=6)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/shopping-lists/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_detail_query_count_does_not_grow_with_items(self):
+        small, large = self.create_lists(1)[0], self.create_lists(1, items_per_list=20)[0]
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/shopping-lists/{small.pk}/')
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/shopping-lists/{large.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 20)
+
+    def test_totals_come_from_sql_annotations(self):
+        shopping_list = self.create_lists(1, items_per_list=4)[0]
+        response = self.client.get(f'/api/shopping-lists/{shopping_list.pk}/')
+        self.assertEqual(response.data['total_items'], 4)
+        self.assertEqual(response.data['completed_items'], 1)
+        self.assertEqual(Decimal(str(response.data['total_estimated_cost'])), Decimal('12.00'))
+
+class ShoppingListPromptTests(TrackerTestCase):
+    """A long history is summarized to fit the prompt budget without losing items."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+
+    def candidates(self, count):
+        now = timezone.now()
+        return [
+            ReplenishmentCandidate(
+                name=f'Item {i:03}', category_id=None, category_name=f'Category {i % 20}', unit='piece',
+                quantity=Decimal('2'), estimated_price=Decimal('1.50'), priority='medium', urgency=1.0,
+                purchase_count=5, cadence_days=7.0, last_purchased=now - timedelta(days=7), due_date=now
+            )
+            for i in range(count)
+        ]
+
+    @override_settings(SHOPPING_LIST_PROMPT_TOKEN_BUDGET=800)
+    def test_long_history_stays_within_budget_and_keeps_the_tail(self):
+        response = json.dumps({'list_name': 'Weekly', 'items': [
+            {'name': 'Item 000', 'notes': 'Running low'},
+        ]})
+        with mock.patch.object(ReplenishmentEngine, 'suggest', return_value=self.candidates(300)), \
+                mock.patch('tracker.features.shopping_list.services.chat_completion',
+                           return_value=response) as completion:
+            generator = SmartShoppingListGenerator(self.user)
+            shopping_list = generator.generate_list()
+
+        self.assertLessEqual(generator.prompt_tokens, 800)
+        prompt = completion.call_args.kwargs['messages'][1]['content']
+        self.assertIn('Item 000', prompt)
+        self.assertNotIn('Item 299', prompt)
+        self.assertIn('more items', prompt)
+
+        items = {item.name: item for item in shopping_list.items.all()}
+        self.assertEqual(len(items), 300)
+        self.assertEqual(items['Item 000'].notes, 'Running low')
+        self.assertTrue(items['Item 299'].notes.startswith('Bought 5 times'))
+
+class ShoppingListBulkItemsTests(TrackerTestCase):
+    """Bulk item changes are validated up front and applied together."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        cls.category = GroceryCategory.objects.create(name='Dairy')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.shopping_list = ShoppingList.objects.create(user=self.user, name='Weekly')
+
+    def create_items(self, count):
+        return ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(shopping_list=self.shopping_list, name=f'Item {i}', estimated_price=Decimal('1.00'))
+            for i in range(count)
+        ])
+
+    def post(self, operations):
+        return self.client.post(f'/api/shopping-lists/{self.shopping_list.pk}/items/bulk/',
+                                {'operations': operations}, format='json')
+
+    def test_invalid_operations_are_reported_by_index(self):
+        item = self.create_items(1)[0]
+        other = ShoppingListItem.objects.create(
+            shopping_list=ShoppingList.objects.create(user=self.user, name='Other'), name='Bread')
+        response = self.post([
+            {'op': 'create', 'data': {'name': 'Milk'}},
+            {'op': 'rename', 'id': item.pk},
+            {'op': 'update', 'id': other.pk, 'data': {'name': 'Eggs'}},
+            {'op': 'create', 'data': {'name': 'Curd', 'category': 999}},
+            {'op': 'delete'},
+        ])
+        # Malformed operations are rejected before any item is looked up
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data['operations']), [1, 4])
+
+        response = self.post([
+            {'op': 'update', 'id': other.pk, 'data': {'name': 'Eggs'}},
+            {'op': 'create', 'data': {'name': 'Curd', 'category': 999}},
+            {'op': 'create', 'data': {'quantity': 'lots'}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data['operations']), [0, 1, 2])
+        self.assertIn('operations', self.post([]).data['operations'])
+
+    def test_nothing_is_written_when_an_operation_is_invalid(self):
+        items = self.create_items(2)
+        response = self.post([
+            {'op': 'create', 'data': {'name': 'Milk'}},
+            {'op': 'update', 'id': items[0].pk, 'data': {'name': 'Butter'}},
+            {'op': 'delete', 'id': items[1].pk},
+            {'op': 'create', 'data': {'name': 'Curd', 'category': 999}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(self.shopping_list.items.values_list('name', flat=True)), ['Item 0', 'Item 1'])
+        self.assertFalse(SyncChange.objects.filter(model='shopping_list_item').exists())
+
+    def test_changes_are_applied_and_logged(self):
+        items = self.create_items(2)
+        response = self.post([
+            {'op': 'create', 'data': {'name': 'Milk', 'category': self.category.pk}},
+            {'op': 'update', 'id': items[0].pk, 'data': {'name': 'Butter'}},
+            {'op': 'delete', 'id': items[1].pk},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(item['name'] for item in response.data['items']), ['Butter', 'Milk'])
+        changes = SyncChange.objects.filter(model='shopping_list_item')
+        self.assertEqual(changes.filter(action='delete').get().object_id, items[1].pk)
+        self.assertEqual(changes.filter(action='upsert').count(), 2)
+
+    def test_query_count_does_not_grow_with_operations(self):
+        def apply(count):
+            items = self.create_items(2 * count)
+            operations = (
+                [{'op': 'create', 'data': {'name': f'New {i}'}} for i in range(count)]
+                + [{'op': 'update', 'id': item.pk, 'data': {'quantity': 2}} for item in items[:count]]
+                + [{'op': 'delete', 'id': item.pk} for item in items[count:]]
+            )
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(operations).status_code, 200)
+            return len(queries.captured_queries)
+        # The first request loads the product index
+        apply(1)
+        self.assertEqual(apply(2), apply(20))
+
+class SparseFieldsetTests(TrackerTestCase):
+    """``?fields=`` and ``?omit=`` trim the response and defer the unused columns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        GroceryItem.objects.create(user=cls.user, name='Milk', price=Decimal('2.50'), quantity=2, platform='Zepto')
+        Receipt.objects.create(user=cls.user, image='receipts/receipt.png', platform='Zepto',
+                               processed_data={'items': []})
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fields_selects_fields_and_defers_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/grocery-items/?fields=id,name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [{'id': response.data['results'][0]['id'], 'name': 'Milk'}])
+        item_query = next(query['sql'] for query in queries.captured_queries if 'tracker_groceryitem' in query['sql'])
+        self.assertIn('"name"', item_query)
+        self.assertNotIn('"platform"', item_query)
+        self.assertNotIn('"price"', item_query)
+
+    def test_computed_field_loads_its_dependencies(self):
+        response = self.client.get('/api/grocery-items/?fields=total_price')
+        self.assertEqual(response.data['results'], [{'total_price': '5.00'}])
+
+    def test_omit_drops_fields(self):
+        response = self.client.get('/api/grocery-items/?omit=platform,created_at')
+        item = response.data['results'][0]
+        self.assertNotIn('platform', item)
+        self.assertNotIn('created_at', item)
+        self.assertIn('price', item)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/grocery-items/?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', str(response.data['fields']))
+
+    def test_receipt_list_defaults_to_compact_fields(self):
+        response = self.client.get('/api/receipts/')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'platform', 'status', 'total_amount', 'created_at'})
+        response = self.client.get(f"/api/receipts/{response.data['results'][0]['id']}/")
+        self.assertIn('processed_data', response.data)
+
+@override_settings(SYNC_COMMIT_LAG_SECONDS=5)
+class DeltaSyncTests(TrackerTestCase):
+    """The sync token never skips a change, and survives change log compaction."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_item(self, name, age):
+        item = GroceryItem.objects.create(user=self.user, name=name, price=Decimal('1.00'), quantity=1, platform='x')
+        SyncChange.objects.filter(model='grocery_item', object_id=item.pk).update(
+            created_at=timezone.now() - age
+        )
+        return item
+
+    def test_recent_changes_are_held_back(self):
+        settled = self.create_item('Milk', timedelta(minutes=1))
+        self.create_item('Bread', timedelta(0))
+        self.create_item('Eggs', timedelta(minutes=1))
+        response = self.client.get('/api/sync/?since=0')
+        self.assertEqual([item['id'] for item in response.data['changes']['grocery_item']], [settled.pk])
+        self.assertFalse(response.data['has_more'])
+        # The held back change and everything after it come with the next token
+        SyncChange.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+        response = self.client.get(f"/api/sync/?since={response.data['token']}")
+        self.assertEqual(len(response.data['changes']['grocery_item']), 2)
+
+    def test_compaction_keeps_a_full_sync_complete(self):
+        old = timedelta(days=40)
+        kept, deleted = self.create_item('Milk', old), self.create_item('Bread', old)
+        kept.name = 'Toned Milk'
+        kept.save()
+        deleted.delete()
+        SyncChange.objects.update(created_at=timezone.now() - old)
+        tombstone = SyncChange.objects.get(action='delete').pk
+        token = self.client.get('/api/sync/?since=0').data['token']
+
+        self.assertEqual(compact_changes(retention_days=30), 3)
+        self.assertEqual(list(SyncChange.objects.values_list('model', 'object_id', 'action')),
+                         [('grocery_item', kept.pk, 'upsert')])
+        self.assertEqual(SyncHorizon.objects.get(user=self.user).token, tombstone)
+
+        response = self.client.get('/api/sync/?since=0')
+        self.assertEqual([item['name'] for item in response.data['changes']['grocery_item']], ['Toned Milk'])
+        self.assertEqual(self.client.get(f'/api/sync/?since={token}').status_code, 200)
+        # This token predates the deletion the compaction dropped
+        response = self.client.get(f'/api/sync/?since={tombstone - 1}')
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['resync_required'])
+
+class ReceiptReprocessingTests(TrackerTestCase):
+    """A receipt requeued while its first run is still going gets its items once."""
+
+    RESULT = ('{"platform": "Zepto", "total_amount": "5", "items": [{"name": "Milk", "quantity": "2", '
+              '"unit_price": "2.50", "total_price": "5", "category": "Dairy"}]}')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        cls.categories = {name: GroceryCategory.objects.create(name=name) for name in ('Dairy', 'Others')}
+
+    def create_receipt(self, **fields):
+        return Receipt.objects.create(user=self.user, image='receipts/receipt.png', platform='Zepto', **fields)
+
+    def make_stale(self, receipt):
+        Receipt.objects.filter(pk=receipt.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def test_stale_run_result_is_discarded(self):
+        receipt = self.create_receipt(status='queued', priority='batch')
+        first = _claim(receipt.pk)
+        self.assertIsNone(_claim(receipt.pk))
+
+        self.make_stale(receipt)
+        self.assertEqual(requeue_stale_receipts(stale_after=60), [receipt.pk])
+        Receipt.objects.filter(pk=receipt.pk).update(status='queued')
+        second = _claim(receipt.pk)
+
+        _save_result(first, first.claim_attempt, self.RESULT, self.categories)
+        self.assertFalse(GroceryItem.objects.exists())
+        _save_result(second, second.claim_attempt, self.RESULT, self.categories)
+        self.assertEqual(GroceryItem.objects.count(), 1)
+        receipt.refresh_from_db()
+        self.assertEqual(receipt.status, 'completed')
+        self.assertIsNone(_claim(receipt.pk))
+
+    def test_other_saves_keep_the_claim(self):
+        receipt = _claim(self.create_receipt().pk)
+        other = Receipt.objects.get(pk=receipt.pk)
+        other.platform = 'Blinkit'
+        other.save()
+        _save_result(receipt, receipt.claim_attempt, self.RESULT, self.categories)
+        self.assertEqual(Receipt.objects.get(pk=receipt.pk).status, 'completed')
+        self.assertEqual(GroceryItem.objects.count(), 1)
+
+    def test_stale_interactive_uploads_are_sent_again(self):
+        lost = self.create_receipt()
+        crashed = self.create_receipt()
+        _claim(crashed.pk)
+        fresh = self.create_receipt()
+        for receipt in (lost, crashed):
+            self.make_stale(receipt)
+
+        with mock.patch.object(process_receipt_upload, 'delay') as delay, \
+                mock.patch.object(process_batch_receipt, 'delay'):
+            result = dispatch_batch_receipts.apply().get()
+        self.assertEqual(result['resent'], 2)
+        self.assertEqual(sorted(call.args[0] for call in delay.call_args_list), [lost.pk, crashed.pk])
+        self.assertEqual(Receipt.objects.get(pk=crashed.pk).status, 'pending')
+        self.assertEqual(Receipt.objects.get(pk=fresh.pk).updated_at, fresh.updated_at)
+        # Sent once per stale period, not on every dispatch
+        self.assertEqual(requeue_stale_receipts(stale_after=60, priority='interactive'), [])
+
+@override_settings(CACHES={**settings.CACHES, 'llm': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                      'LOCATION': 'llm'}}, LLM_CACHE_TTL=60)
+class LLMResponseCacheTests(TrackerTestCase):
+    """Model responses are reused for identical prompts until they expire."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        for name in ('Dairy', 'Others'):
+            GroceryCategory.objects.create(name=name)
+
+    def setUp(self):
+        super().setUp()
+        caches['llm'].clear()
+        patcher = mock.patch('openai.ChatCompletion.create', side_effect=lambda **kwargs: self.response())
+        self.create = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.content = ReceiptReprocessingTests.RESULT
+
+    def response(self):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+    def complete(self, text='Name this list'):
+        return llm.chat_completion(model='gpt-4o', messages=[{'role': 'user', 'content': text}],
+                                   prompt_version='test-v1')
+
+    def test_identical_prompts_hit_the_cache(self):
+        self.assertEqual(self.complete(), self.content)
+        self.assertEqual(self.complete('  Name   this list '), self.content)
+        self.complete('Name another list')
+        self.assertEqual(self.create.call_count, 2)
+        self.assertEqual(llm.cache_metrics(), {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3})
+        with self.assertLogs('tracker.tasks', 'INFO') as logs:
+            log_llm_cache_metrics.apply()
+        self.assertIn('1 hits, 2 misses, hit rate 33.3%', logs.output[0])
+
+    def test_cached_response_expires(self):
+        now = time.time()
+        self.complete()
+        with mock.patch('time.time', return_value=now + 61):
+            self.complete()
+        self.assertEqual(self.create.call_count, 2)
+
+    def process(self, receipt):
+        with mock.patch('tracker.features.receipt.processing._encode_image', return_value='image'):
+            process_receipt(receipt.pk)
+        receipt.refresh_from_db()
+        return receipt
+
+    def test_unparseable_receipt_response_is_not_cached(self):
+        self.content = 'Sorry, I cannot read this receipt.'
+        receipt = Receipt.objects.create(user=self.user, image='receipts/receipt.png', platform='Zepto')
+        self.assertEqual(self.process(receipt).status, 'failed')
+        self.assertEqual(llm.cache_metrics()['misses'], 1)
+
+        self.content = ReceiptReprocessingTests.RESULT
+        other = Receipt.objects.create(user=self.user, image='receipts/receipt.png', platform='Zepto')
+        self.assertEqual(self.process(other).status, 'completed')
+        self.assertEqual(self.create.call_count, 2)
+
+    def test_reprocessing_bypasses_the_cache(self):
+        first = Receipt.objects.create(user=self.user, image='receipts/receipt.png', platform='Zepto')
+        self.process(first)
+        second = Receipt.objects.create(user=self.user, image='receipts/receipt.png', platform='Zepto')
+        self.assertEqual(self.process(second).status, 'completed')
+        self.assertEqual(self.create.call_count, 1)
+
+        Receipt.objects.filter(pk=second.pk).update(status='pending')
+        self.process(second)
+        self.assertEqual(self.create.call_count, 2)
+
+class GroceryItemImportTests(TrackerTestCase):
+    """Each committed import batch is processed on its own."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+
+    def test_bulk_created_is_sent_per_committed_batch(self):
+        sent = []
+        def receiver(sender, user, item_ids, **kwargs):
+            sent.append(item_ids)
+        grocery_items_bulk_created.connect(receiver)
+        self.addCleanup(grocery_items_bulk_created.disconnect, receiver)
+
+        upload = io.BytesIO(b'name,price,quantity,platform\nMilk,2.50,1,Zepto\nBread,1.00,1,Zepto\nEggs,3.00,1,Zepto\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            report = GroceryItemImporter(self.user, batch_size=2).run(upload, 'csv')
+        self.assertEqual(report['imported'], 3)
+        self.assertEqual([len(item_ids) for item_ids in sent], [2, 1])
+        self.assertEqual(SyncChange.objects.filter(model='grocery_item').count(), 3)
+
+    def test_batches_fold_into_purchase_history_incrementally(self):
+        rows = ''.join(f'{name},{price},{quantity},Zepto\n' for name, price, quantity in (
+            ('Milk', '2.00', '1'), ('Bread', '1.00', '2'), ('Milk', '4.00', '3'),
+            ('Eggs', '3.00', '1'), ('Milk', '3.00', '2'), ('Bread', '1.50', '1'),
+        ))
+        upload = io.BytesIO(f'name,price,quantity,platform\n{rows}'.encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            GroceryItemImporter(self.user, batch_size=4).run(upload, 'csv')
+        fields = ('name', 'unit', 'purchase_count', 'avg_quantity', 'avg_price', 'first_purchased', 'last_purchased')
+        folded = sorted(PurchaseHistoryFeature.objects.filter(user=self.user).values_list(*fields))
+        self.assertEqual([row[:3] for row in folded], [('Bread', 'piece', 2), ('Eggs', 'piece', 1), ('Milk', 'piece', 3)])
+
+        rebuild_purchase_history([self.user.pk])
+        self.assertEqual(sorted(PurchaseHistoryFeature.objects.filter(user=self.user).values_list(*fields)), folded)
+
+    def test_batch_cost_does_not_grow_with_history(self):
+        def import_rows(count):
+            rows = ''.join(f'Item {i % 50},1.00,1,Zepto\n' for i in range(count))
+            upload = io.BytesIO(f'name,price,quantity,platform\n{rows}'.encode())
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                GroceryItemImporter(self.user, batch_size=100).run(upload, 'csv')
+            return len(queries.captured_queries)
+        import_rows(100)
+        self.assertEqual(import_rows(100), import_rows(100))
+
+class ProductMatcherTests(TrackerTestCase):
+    """Item names resolve to catalog products without merging different ones."""
+
+    def setUp(self):
+        super().setUp()
+        self.matcher = matcher.get_matcher()
+
+    def test_spellings_of_one_product_share_it(self):
+        product_id = self.matcher.resolve('Amul Taaza Toned Milk 500 ml')
+        self.assertEqual(self.matcher.resolve('amul taaza toned milk 0.5L'), product_id)
+        self.assertEqual(self.matcher.resolve('Amul Toned Milk 500ml'), product_id)
+
+    def test_shorter_name_does_not_merge_into_a_brand(self):
+        product_id = self.matcher.resolve('Amul Taaza Toned Milk')
+        self.assertNotEqual(self.matcher.resolve('Toned Milk'), product_id)
+
+    def test_different_sizes_do_not_match(self):
+        product_id = self.matcher.resolve('Amul Toned Milk 500 ml')
+        self.assertNotEqual(self.matcher.resolve('Amul Toned Milk 1 L'), product_id)
+
+    def test_frequent_tokens_do_not_widen_the_search(self):
+        self.matcher.resolve_many([(f'Brand{i} milk', None) for i in range(300)])
+        product_id = self.matcher.resolve('Brand7 toned milk')
+        self.assertNotIn(product_id, self.matcher.lookup(['Brand8 milk']).values())
+        with mock.patch.object(matcher.ProductMatcher, '_score', autospec=True, return_value=0.0) as score:
+            self.matcher.match(matcher.normalize_name('Brand7 fresh toned milk'))
+        self.assertLessEqual(score.call_count, 2)
+
+    def test_candidates_are_capped(self):
+        self.matcher.resolve_many([(f'fresh milk {i}', None) for i in range(matcher.MAX_CANDIDATES + 50)])
+        with mock.patch.object(matcher.ProductMatcher, '_score', autospec=True, return_value=0.0) as score:
+            self.matcher.match(matcher.normalize_name('fresh milk'))
+        self.assertEqual(score.call_count, matcher.MAX_CANDIDATES)
+
+class PriceHistoryTests(TrackerTestCase):
+    """Grocery items are folded into per-product daily price series."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+
+    def test_float_prices_fold_into_the_day(self):
+        # As created by receipt processing
+        for price in (2.5, 3.0):
+            GroceryItem.objects.create(user=self.user, name='Milk', price=price, quantity=1.0, platform='Zepto')
+        day = DailyPrice.objects.get(user=self.user)
+        self.assertEqual((day.observations, day.price_total, day.min_price, day.max_price),
+                         (2, Decimal('5.50'), Decimal('2.50'), Decimal('3.00')))
+
+    def create_item(self, price, days_ago=0, platform='Zepto', name='Toned Milk'):
+        return GroceryItem.objects.create(
+            user=self.user, name=name, price=Decimal(price), quantity=1, platform=platform,
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+
+    def series(self):
+        fields = ('product_id', 'date', 'platform', 'min_price', 'max_price', 'price_total', 'observations')
+        return sorted(DailyPrice.objects.filter(user=self.user).values_list(*fields))
+
+    def test_incremental_series_matches_a_rebuild(self):
+        for price, days_ago, platform in (('2.00', 0, 'Zepto'), ('3.00', 0, 'Zepto'), ('2.50', 0, 'Blinkit'),
+                                          ('1.75', 3, 'Zepto'), ('4.00', 0, 'Zepto')):
+            self.create_item(price, days_ago, platform)
+        self.create_item('1.00', name='Brown Bread')
+        incremental = self.series()
+        self.assertEqual(len(incremental), 4)
+        rebuild_daily_prices([self.user.pk])
+        self.assertEqual(self.series(), incremental)
+
+    def test_record_prices_merges_into_existing_days(self):
+        item = self.create_item('2.00')
+        key = (self.user.pk, item.product_id, 'Zepto', item.created_at)
+        record_prices([key + (Decimal('4.00'),), key + (Decimal('1.00'),)])
+        record_prices([key + (Decimal('3.00'),), (self.user.pk, None, 'Zepto', item.created_at, Decimal('9.00'))])
+        day = DailyPrice.objects.get(user=self.user)
+        self.assertEqual((day.min_price, day.max_price, day.price_total, day.observations),
+                         (Decimal('1.00'), Decimal('4.00'), Decimal('10.00'), 4))
+
+    def test_edits_and_deletes_refresh_the_day(self):
+        low, high = self.create_item('2.00'), self.create_item('5.00')
+        high.price = Decimal('3.00')
+        high.save()
+        day = DailyPrice.objects.get(user=self.user)
+        self.assertEqual((day.max_price, day.price_total, day.observations), (Decimal('3.00'), Decimal('5.00'), 2))
+
+        low.delete()
+        day = DailyPrice.objects.get(user=self.user)
+        self.assertEqual((day.min_price, day.observations), (Decimal('3.00'), 1))
+        high.delete()
+        self.assertFalse(DailyPrice.objects.exists())
+
+    def test_refresh_day_only_touches_that_day(self):
+        today, earlier = self.create_item('2.00'), self.create_item('3.00', days_ago=2)
+        DailyPrice.objects.filter(user=self.user).update(observations=99)
+        refresh_day(self.user.pk, today.product_id, timezone.localdate(today.created_at))
+        observations = dict(DailyPrice.objects.filter(user=self.user).values_list('date', 'observations'))
+        self.assertEqual(observations, {timezone.localdate(today.created_at): 1,
+                                        timezone.localdate(earlier.created_at): 99})
+
+    def test_days_parameter_is_bounded(self):
+        cases = ((None, PRICE_HISTORY_DAYS), ('1', 1), (str(MAX_PRICE_HISTORY_DAYS), MAX_PRICE_HISTORY_DAYS),
+                 ('0', None), (str(MAX_PRICE_HISTORY_DAYS + 1), None), ('-5', None), ('week', None))
+        for value, expected in cases:
+            params = {} if value is None else {'days': value}
+            self.assertEqual(parse_days(SimpleNamespace(query_params=params)), expected, value)
+
+class EstimatedPriceTests(TrackerTestCase):
+    """Shopping list items are priced from the latest price the user paid."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        other = User.objects.create_user('other')
+        now = timezone.now()
+        for user, name, unit, price, days_ago in (
+            (cls.user, 'Toned Milk', 'litre', '3.00', 2),
+            (cls.user, 'Toned Milk', 'piece', '2.00', 0),
+            (cls.user, 'Brown Bread', 'piece', '1.50', 1),
+            (other, 'Caviar', 'piece', '99.00', 0),
+        ):
+            GroceryItem.objects.create(user=user, name=name, unit=unit, price=Decimal(price), quantity=1,
+                                       platform='Zepto', created_at=now - timedelta(days=days_ago))
+
+    def estimate(self, *items, overwrite=False):
+        list_items = [ShoppingListItem(name=name, unit=unit, estimated_price=price) for name, unit, price in items]
+        fill_estimated_prices(self.user.pk, list_items, overwrite=overwrite)
+        return [item.estimated_price for item in list_items]
+
+    def test_same_unit_price_is_preferred(self):
+        self.assertEqual(self.estimate(('toned milk', ' Litre', None), ('Toned Milk', 'piece', None)),
+                         [Decimal('3.00'), Decimal('2.00')])
+
+    def test_other_units_fall_back_to_the_newest_price(self):
+        self.assertEqual(self.estimate(('Toned Milk', 'pack', None)), [Decimal('2.00')])
+
+    def test_unknown_products_are_left_unpriced(self):
+        self.assertEqual(self.estimate(('Caviar', 'piece', None), ('Saffron', 'g', None)), [None, None])
+
+    def test_existing_prices_are_kept_unless_overwritten(self):
+        item = ('Brown Bread', 'piece', Decimal('9.99'))
+        self.assertEqual(self.estimate(item), [Decimal('9.99')])
+        self.assertEqual(self.estimate(item, overwrite=True), [Decimal('1.50')])
+
+class ExportItemsCommandTests(TrackerTestCase):
+    """The export command streams one user's items in (created_at, id) order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        other = User.objects.create_user('other')
+        items = GroceryItem.objects.bulk_create(
+            [GroceryItem(user=cls.user, name=f'Item {i}', price=Decimal('1.25'), quantity=2, platform='Zepto')
+             for i in range(5)]
+            + [GroceryItem(user=cls.user, name='=SUM(A1)', price=Decimal('1.00'), quantity=1, platform='Zepto'),
+               GroceryItem(user=other, name='Bread', price=Decimal('1.00'), quantity=1, platform='Zepto')]
+        )
+        # Ties on created_at span chunk boundaries and are broken by id
+        created_at = timezone.now() - timedelta(days=1)
+        GroceryItem.objects.filter(pk__in=[item.pk for item in items[:5]]).update(created_at=created_at)
+        GroceryItem.objects.filter(pk=items[5].pk).update(created_at=created_at - timedelta(hours=1))
+        cls.expected_ids = [items[5].pk] + [item.pk for item in items[:5]]
+
+    def export(self, **options):
+        out = io.StringIO()
+        call_command('export_items', user='shopper', chunk_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_csv_export_streams_every_row_in_order(self):
+        rows = list(csv.DictReader(io.StringIO(self.export())))
+        self.assertEqual([int(row['id']) for row in rows], self.expected_ids)
+        self.assertEqual(rows[0]['name'], "'=SUM(A1)")
+        self.assertEqual((rows[1]['price'], rows[1]['quantity']), ('1.25', '2.00'))
+
+    def test_ndjson_export_streams_every_row_in_order(self):
+        rows = [json.loads(line) for line in self.export(format='ndjson').splitlines()]
+        self.assertEqual([row['id'] for row in rows], self.expected_ids)
+        self.assertEqual(rows[0]['name'], '=SUM(A1)')
+        self.assertEqual(rows[1]['price'], '1.25')
+
+    def test_chunk_size_does_not_change_the_export(self):
+        out = io.StringIO()
+        call_command('export_items', user='shopper', stdout=out)
+        self.assertEqual(self.export(), out.getvalue())
+
+    def test_unknown_user_is_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('export_items', user='nobody', stdout=io.StringIO())
+
+class BudgetForecastTests(TrackerTestCase):
+    """Spend so far is exact, and every user is filtered however many there are."""
+
+    def test_spent_is_exact_across_user_chunks(self):
+        today = timezone.localdate()
+        users = [User.objects.create_user(f'shopper{i}') for i in range(3)]
+        outsider = User.objects.create_user('outsider')
+        for user in users + [outsider]:
+            GroceryItem.objects.bulk_create([
+                GroceryItem(user=user, name='Candy', price=Decimal('0.10'), quantity=1, platform='x')
+                for _ in range(3)
+            ])
+        budgets = [
+            Budget.objects.create(user=user, amount=Decimal('0.30'), period='monthly',
+                                  notification_threshold=Decimal('80'))
+            for user in users
+        ]
+
+        with mock.patch.object(forecasting, 'USER_FILTER_LIMIT', 2), CaptureQueriesContext(connection) as queries:
+            forecasts = forecasting.forecast_budgets(budgets, today=today)
+        # Daily history and spend so far, each for two chunks of users
+        item_queries = [query['sql'] for query in queries.captured_queries if 'tracker_groceryitem' in query['sql']]
+        self.assertEqual(len(item_queries), 4)
+        self.assertTrue(all('"user_id" IN' in sql for sql in item_queries))
+        for budget in budgets:
+            self.assertEqual(forecasts[budget.id].spent, Decimal('0.30'))
+            # Exactly at the amount, which float sums of 0.10 can miss either way
+            self.assertEqual(forecasts[budget.id].projected_breach_date, today)
+
+class PurchaseHistoryTests(TrackerTestCase):
+    """A first purchase that loses the race to create the feature row is folded into it."""
+
+    def test_racing_first_purchase_is_folded_in(self):
+        user = User.objects.create_user('shopper')
+        # Without signals, so only the calls below touch the feature table
+        first, second = GroceryItem.objects.bulk_create([
+            GroceryItem(user=user, name='Milk', price=price, quantity=1, platform='x')
+            for price in (Decimal('2.00'), Decimal('4.00'))
+        ])
+        record_purchase(first)
+
+        real_first = QuerySet.first
+        lookups = []
+        def stale_first(queryset):
+            # The other transaction's row is not visible yet on the first lookup
+            lookups.append(queryset.model)
+            return None if len(lookups) == 1 else real_first(queryset)
+        with mock.patch.object(QuerySet, 'first', stale_first):
+            record_purchase(second)
+
+        feature = PurchaseHistoryFeature.objects.get(user=user)
+        self.assertEqual(feature.purchase_count, 2)
+        self.assertEqual(feature.avg_price, Decimal('3.00'))
+
+@override_settings(MEDIA_ROOT='/tmp/spend_smart_test_media', **SHARED_THROTTLE_CACHE)
+class AsyncReceiptUploadTests(TransactionTestCase):
+    """
+    The async upload queues the receipt like the sync one, handing over the
+    job slot. Image validation runs on another thread and connection, so
+    the data is committed rather than kept in a test transaction.
+    """
+
+    def setUp(self):
+        matcher._matcher = None
+        self.user = User.objects.create_user('shopper')
+
+    async def test_upload_is_queued(self):
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, 'PNG')
+        upload = SimpleUploadedFile('receipt.png', image.getvalue(), content_type='image/png')
+        token = RefreshToken.for_user(self.user).access_token
+
+        with mock.patch('tracker.features.async_api.views.process_receipt_upload') as task:
+            response = await self.async_client.post('/api/async/receipts/', {'image': upload, 'platform': 'Zepto'},
+                                                    headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 201)
+        receipt_id = response.json()['id']
+        self.assertEqual((await Receipt.objects.aget(pk=receipt_id)).status, 'pending')
+        task.delay.assert_called_once()
+        self.assertEqual(task.delay.call_args.args, (receipt_id,))
+        self.assertIsNotNone(task.delay.call_args.kwargs['job_slot'])
+
+@override_settings(LEASE_BACKEND='db')
+class LeaseTests(TransactionTestCase):
+    """
+    Leases are exclusive, kept alive while held and recorded per task run.
+    The keep-alive thread has its own connection, so the data is committed.
+    """
+
+    def wait_until(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return condition()
+
+    def acquire(self, name='task', ttl=None):
+        lease = Lease(name, ttl)
+        self.assertTrue(lease.acquire())
+        self.addCleanup(lease.release)
+        return lease
+
+    def test_lease_is_exclusive_until_released(self):
+        first = self.acquire()
+        second = Lease('task')
+        self.assertFalse(second.acquire())
+        self.assertEqual(second.holder(), first.owner)
+        first.release()
+        self.assertTrue(second.acquire())
+        second.release()
+
+    def test_expired_lease_is_taken_over(self):
+        first = self.acquire(ttl=60)
+        TaskLease.objects.filter(name='task').update(expires_at=timezone.now() - timedelta(seconds=1))
+        second = self.acquire()
+        self.assertEqual(second.holder(), second.owner)
+        # The old holder's release leaves the new lease alone
+        first.release()
+        self.assertEqual(second.holder(), second.owner)
+
+    def test_lease_is_renewed_while_held(self):
+        lease = self.acquire(ttl=0.3)
+        first_expiry = TaskLease.objects.get(name='task').expires_at
+        self.assertTrue(self.wait_until(lambda: TaskLease.objects.get(name='task').expires_at > first_expiry))
+        self.assertFalse(lease.lost)
+
+    def test_lease_taken_over_is_lost(self):
+        lease = self.acquire(ttl=0.3)
+        TaskLease.objects.filter(name='task').update(owner='another-node')
+        self.assertTrue(self.wait_until(lambda: lease.lost))
+
+    @override_settings(LEASE_BACKEND='redis', LEASE_REDIS_URL='redis://127.0.0.1:1/0')
+    def test_unreachable_redis_falls_back_to_the_database(self):
+        lease_module._client = None
+        self.addCleanup(setattr, lease_module, '_client', None)
+        with self.assertLogs('tracker.features.leases.lease', 'WARNING'):
+            lease = self.acquire()
+        self.assertEqual(lease.backend.name, 'db')
+        self.assertEqual(TaskLease.objects.get(name='task').owner, lease.owner)
+
+    def run_task(self, **compact):
+        with mock.patch('tracker.tasks.compact_changes', **compact):
+            return compact_sync_changes.apply()
+
+    def test_leased_task_runs_are_recorded(self):
+        name = 'tracker.tasks.compact_sync_changes'
+        holder = self.acquire(name)
+        self.assertEqual(self.run_task(return_value=0).get(), {'task_id': mock.ANY, 'skipped': True})
+        skipped = TaskRun.objects.get(status='skipped')
+        self.assertEqual((skipped.task_name, skipped.owner), (name, holder.owner))
+        holder.release()
+
+        self.assertEqual(self.run_task(return_value=3).get()['deleted'], 3)
+        completed = TaskRun.objects.get(status='completed')
+        self.assertEqual(completed.backend, 'db')
+        self.assertIsNotNone(completed.duration)
+
+        def lose(retention_days, lease):
+            lease.lost = True
+            return 0
+        self.run_task(side_effect=lose)
+        self.assertTrue(TaskRun.objects.filter(status='lost').exists())
+
+        self.assertTrue(self.run_task(side_effect=RuntimeError('disk full')).failed())
+        self.assertEqual(TaskRun.objects.get(status='failed').error, 'disk full')
+        # Every run released the lease
+        self.acquire(name)
+
+class CategorySuggestionTests(TrackerTestCase):
+    """Category suggestions come from an index built off the request path."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+        cls.dairy, cls.bakery = (GroceryCategory.objects.create(name=name) for name in ('Dairy', 'Bakery'))
+        cls.add_items([('Amul Toned Milk', cls.dairy), ('Mother Dairy Full Cream Milk', cls.dairy),
+                       ('Brown Bread', cls.bakery), ('Multigrain Bread', cls.bakery)])
+
+    @classmethod
+    def add_items(cls, items):
+        GroceryItem.objects.bulk_create([
+            GroceryItem(user=cls.user, name=name, category=category, price=Decimal('1.00'), quantity=1, platform='x')
+            for name, category in items
+        ])
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patcher = override_settings(CATEGORY_INDEX_DIR=directory)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        suggest._index, suggest._checked_at = None, float('-inf')
+        self.addCleanup(setattr, suggest, '_index', None)
+
+    def test_missing_index_is_queued_instead_of_built(self):
+        with mock.patch.object(refresh_category_index, 'delay') as delay:
+            self.assertEqual(suggest.suggest_categories('toned milk'), [])
+            self.assertEqual(suggest.suggest_categories('toned milk'), [])
+        delay.assert_called_once_with(full=True)
+        self.assertIsNone(suggest.load_index())
+
+    def test_suggest_ranks_categories_by_item_names(self):
+        suggest.build_index(full=True)
+        suggestions = suggest.suggest_categories('toned milk', limit=2)
+        self.assertEqual(suggestions[0][0], self.dairy)
+        self.assertEqual(suggest.suggest_categories('bread')[0][0], self.bakery)
+        self.assertEqual(suggest.suggest_categories('!!'), [])
+
+    def test_incremental_build_matches_a_full_build(self):
+        first = suggest.build_index(full=True)
+        fruit = GroceryCategory.objects.create(name='Fruit')
+        self.add_items([('Banana Robusta', fruit), ('Toned Milk Pouch', self.dairy)])
+
+        incremental = suggest.build_index()
+        self.assertEqual(incremental.meta['documents'], first.meta['documents'] + 3)
+        self.assertEqual(incremental.category_ids, [self.dairy.pk, self.bakery.pk, fruit.pk])
+        self.assertEqual(incremental.suggest('banana')[0][0], fruit.pk)
+
+        full = suggest.build_index(full=True)
+        self.assertEqual(full.meta['documents'], incremental.meta['documents'])
+        np.testing.assert_allclose(incremental.weights, full.weights, atol=1e-6)
+
+class CachedUserTests(TrackerTestCase):
+    """Requests never share the cached user instance."""
+
+    def test_load_user_returns_a_copy(self):
+        user = User.objects.create_user('shopper')
+        first = load_user(user.pk)
+        first.first_name = 'Changed'
+        first._state.fields_cache['marker'] = True
+        second = load_user(user.pk)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.first_name, '')
+        self.assertNotIn('marker', second._state.fields_cache)
+
+@override_settings(**SHARED_THROTTLE_CACHE)
+class JobSlotTests(TrackerTestCase):
+    """In-flight job slots are taken per request and always released by the job."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+
+    def setUp(self):
+        super().setUp()
+        throttling._redis_down_until = 0.0
+        self.addCleanup(setattr, throttling, '_redis_down_until', 0.0)
+        throttling.caches['throttle'].clear()
+
+    def test_slots_are_limited_and_released(self):
+        first = throttling.acquire_job_slot('list_generation', self.user.pk, 2)
+        second = throttling.acquire_job_slot('list_generation', self.user.pk, 2)
+        self.assertNotEqual(first, second)
+        self.assertIsNone(throttling.acquire_job_slot('list_generation', self.user.pk, 2))
+        throttling.release_job_slot(first)
+        self.assertEqual(throttling.acquire_job_slot('list_generation', self.user.pk, 2), first)
+
+    def test_throttle_stores_the_slot_on_the_request(self):
+        request = SimpleNamespace(user=self.user)
+        throttle = throttling.ConcurrentJobThrottle('list_generation')
+        with override_settings(JOB_CONCURRENCY_LIMITS={'list_generation': 1}):
+            self.assertTrue(throttle.allow_request(request, None))
+            self.assertFalse(throttle.allow_request(SimpleNamespace(user=self.user), None))
+        self.assertTrue(request.job_slot)
+
+    def test_failed_job_releases_its_slot(self):
+        shopping_list = ShoppingList.objects.create(user=self.user, name='List', status='generating')
+        job = ShoppingListGenerationJob.objects.create(shopping_list=shopping_list, user=self.user)
+        slot = throttling.acquire_job_slot('list_generation', self.user.pk, 1)
+        with mock.patch('tracker.tasks.SmartShoppingListGenerator') as generator:
+            generator.return_value.generate_list.side_effect = RuntimeError('model unavailable')
+            generator.return_value.prompt_tokens = None
+            # The last attempt, so the job fails instead of retrying
+            generate_shopping_list.apply(args=(job.pk,), kwargs={'job_slot': slot}, retries=3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(throttling.acquire_job_slot('list_generation', self.user.pk, 1), slot)
+
+    @override_settings(JOB_CONCURRENCY_LIMITS={'list_generation': 1})
+    def test_failed_queueing_fails_the_job_and_releases_its_slot(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(generate_shopping_list, 'delay', side_effect=ConnectionError('broker down')), \
+                self.assertLogs('tracker.features.shopping_list.views', 'ERROR'):
+            response = client.post('/api/shopping-lists/generate/', {}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'failed')
+        job = ShoppingListGenerationJob.objects.get(shopping_list_id=response.data['id'])
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(throttling.acquire_job_slot('list_generation', self.user.pk, 1))
+
+    @override_settings(JOB_CONCURRENCY_LIMITS={'receipt_upload': 1}, MEDIA_ROOT='/tmp/spend_smart_test_media')
+    def test_failed_queueing_fails_the_receipt_and_releases_its_slot(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(image, 'PNG')
+        upload = SimpleUploadedFile('receipt.png', image.getvalue(), content_type='image/png')
+        with mock.patch.object(process_receipt_upload, 'delay', side_effect=ConnectionError('broker down')), \
+                self.assertLogs('tracker.features.receipt.views', 'ERROR'):
+            response = client.post('/api/receipts/', {'image': upload, 'platform': 'Zepto'}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Receipt.objects.get(pk=response.data['id']).status, 'failed')
+        self.assertIsNotNone(throttling.acquire_job_slot('receipt_upload', self.user.pk, 1))
+
+    def test_missing_job_releases_its_slot(self):
+        slot = throttling.acquire_job_slot('list_generation', self.user.pk, 1)
+        result = generate_shopping_list.apply(args=(0,), kwargs={'job_slot': slot})
+        self.assertTrue(result.failed())
+        self.assertEqual(throttling.acquire_job_slot('list_generation', self.user.pk, 1), slot)
+
+    @override_settings(THROTTLE_CACHE_BACKEND='default')
+    def test_slots_are_not_enforced_without_a_shared_cache(self):
+        request = SimpleNamespace(user=self.user)
+        throttle = throttling.ConcurrentJobThrottle('list_generation')
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertFalse(hasattr(request, 'job_slot'))
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'throttle': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:1/0',
+                     'OPTIONS': {'socket_connect_timeout': 1}},
+    })
+    def test_unreachable_redis_falls_back(self):
+        request = SimpleNamespace(user=self.user)
+        self.assertTrue(throttling.ConcurrentJobThrottle('list_generation').allow_request(request, None))
+        self.assertFalse(throttling.job_slots_enforced())
+        # Rates are counted in this process until Redis is retried
+        throttle = throttling.SlidingWindowRateThrottle('list_generation')
+        self.assertTrue(throttle.allow_request(request, None))
+        self.assertEqual(throttle.cache, throttling.caches['default'])
+
+class ConditionalGetTests(TrackerTestCase):
+    """List responses are revalidated with ETags from the shared data versions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(DATA_VERSION_CACHE_BACKEND='redis', DATA_VERSION_CACHE_ALIAS='data_versions', CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'data_versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'data_versions'},
+    })
+    def test_not_modified_until_a_write(self):
+        response = self.client.get('/api/grocery-items/')
+        etag = response['ETag']
+        response = self.client.get('/api/grocery-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GroceryItem.objects.create(user=self.user, name='Milk', price=Decimal('2.50'), quantity=1, platform='x')
+        response = self.client.get('/api/grocery-items/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_no_etag_without_a_shared_cache(self):
+        response = self.client.get('/api/grocery-items/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        response = self.client.get('/api/grocery-items/', HTTP_IF_NONE_MATCH='"1.1.0"')
+        self.assertEqual(response.status_code, 200)